@@ -1,18 +1,22 @@
 import sys
+from contextlib import asynccontextmanager
 
 sys.path.append("..")
-from dotenv import load_dotenv
+from services import startup
 from google.adk.agents import LlmAgent
-import uvicorn
 from tools.hr_tools import (
+    calculate_annual_leave,
     query_hr_policy,
     get_onboarding_checklist,
+    get_onboarding_progress,
     search_employee_handbook,
+    update_onboarding_checklist,
 )
 from google.adk.a2a.utils.agent_to_a2a import to_a2a
+from services import telemetry
+from services.serving import serve
 
-load_dotenv()  # 加載 .env 文件中的 API Key
-
+startup.checkpoint("imports")
 
 # 建立HR代理
 hr_agent = LlmAgent(
@@ -38,18 +42,38 @@ hr_agent = LlmAgent(
 
                 請使用繁體中文回應。""",
     model="gemini-2.0-flash",
-    tools=[query_hr_policy, get_onboarding_checklist, search_employee_handbook],
+    tools=[
+        query_hr_policy,
+        get_onboarding_checklist,
+        search_employee_handbook,
+        calculate_annual_leave,
+        update_onboarding_checklist,
+        get_onboarding_progress,
+    ],
+)
+
+startup.checkpoint("agent")
+
+
+@asynccontextmanager
+async def lifespan(app):
+    startup.ready("hr_agent")
+    yield
+
+
+PORT = 8001
+# 使用 to_a2a 將 Agent 轉換為 A2A 服務（需指定 port 以生成正確的 RPC URL）
+app = to_a2a(
+    hr_agent,
+    host="localhost",
+    port=PORT,
+    lifespan=lifespan,
 )
+# /metrics 與追蹤：接續協調專員傳來的 traceparent
+telemetry.instrument_agent(hr_agent)
+telemetry.instrument_app(app, "hr_agent")
+startup.checkpoint("app")
 
-# 啟動 A2A 服務
+# 啟動 A2A 服務 (--workers N 以多個 uvicorn worker 執行)
 if __name__ == "__main__":
-    PORT = 8001
-    # 使用 to_a2a 將 Agent 轉換為 A2A 服務（需指定 port 以生成正確的 RPC URL）
-    app = to_a2a(
-        hr_agent,
-        host="localhost",
-        port=PORT,
-    )
-
-    # 使用 uvicorn 啟動服務
-    uvicorn.run(app, host="0.0.0.0", port=PORT)
+    serve(app, "agents.hr_agent:app", PORT)
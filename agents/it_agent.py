@@ -1,22 +1,30 @@
 import sys
+from contextlib import asynccontextmanager
 
 sys.path.append("..")
-from tools.it_tools import (
+from services import startup
+from tools.it_tools import get_load_status, start_employee_data_load
+
+# async 版本：Sheet 與資料庫 I/O 在執行緒池執行，不阻塞 event loop
+from tools.it_tools_async import (
     create_email_acount,
     assign_system_permission,
     setup_vpn_access,
     reset_password,
     get_it_support_info,
-    _load_employee_data_from_sheet,
+    get_account_sync_status,
+    query_employee_accounts,
+    bulk_onboard_employees,
+    get_bulk_onboarding_results,
 )
 from google.adk.a2a.utils.agent_to_a2a import to_a2a
 from google.adk.agents import LlmAgent
-import uvicorn
-
-from dotenv import load_dotenv
-
-load_dotenv()  # 加載 .env 文件中的 API Key
+from services import telemetry
+from services.serving import serve
+from tools.sheet_client import preload_client_library
+from starlette.responses import JSONResponse
 
+startup.checkpoint("imports")
 
 # 建立IT代理
 it_agent = LlmAgent(
@@ -29,6 +37,10 @@ it_agent = LlmAgent(
                 3. 設定VPN存取權限
                 4. 重置密碼
                 5. 提供IT支援資訊
+                6. 依上傳目錄內的名單檔 (CSV/JSONL) 整批為多位新進員工開通帳號、權限與VPN，
+                   結果分頁返回 (不含密碼)，需要更多時以 get_bulk_onboarding_results 取得
+                7. 查詢員工帳號 (依 email、使用者名稱開頭、部門、權限或VPN狀態篩選，
+                   結果分頁返回，需要更多時以 next_cursor 取得下一頁)
 
                 執行任務時請:
                 1.先分析任務需求
@@ -46,19 +58,47 @@ it_agent = LlmAgent(
         setup_vpn_access,
         reset_password,
         get_it_support_info,
-        _load_employee_data_from_sheet,
+        get_account_sync_status,
+        query_employee_accounts,
+        bulk_onboard_employees,
+        get_bulk_onboarding_results,
     ],
 )
 
-# 啟動 A2A 服務
-if __name__ == "__main__":
-    PORT = 8002
-    # 使用 to_a2a 將 Agent 轉換為 A2A 服務（需指定 port 以生成正確的 RPC URL）
-    app = to_a2a(
-        it_agent,
-        host="localhost",
-        port=PORT,
-    )
+startup.checkpoint("agent")
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # 服務啟動後才在背景載入 Sheet 資料，不阻塞 import 與接收請求
+    # (預先載入模式下每個 worker 各自載入，背景執行緒不會在 fork 前啟動)
+    start_employee_data_load()
+    startup.ready("it_agent")
+    yield
+
 
-    # 使用 uvicorn 啟動服務
-    uvicorn.run(app, host="0.0.0.0", port=PORT)
+PORT = 8002
+# 使用 to_a2a 將 Agent 轉換為 A2A 服務（需指定 port 以生成正確的 RPC URL）
+app = to_a2a(
+    it_agent,
+    host="localhost",
+    port=PORT,
+    lifespan=lifespan,
+)
+
+
+async def readiness(request):
+    """員工資料載入完成前回應 503，並附上冷啟動耗時"""
+    status = get_load_status()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
+
+app.add_route("/ready", readiness, methods=["GET"])
+# /metrics 與追蹤：接續協調專員傳來的 traceparent
+telemetry.instrument_agent(it_agent)
+telemetry.instrument_app(app, "it_agent")
+startup.checkpoint("app")
+
+# 啟動 A2A 服務 (--workers N 以多個 uvicorn worker 執行；--preload 時 fork 前先匯入 gspread)
+if __name__ == "__main__":
+    serve(app, "agents.it_agent:app", PORT, warmup=preload_client_library)
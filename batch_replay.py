@@ -0,0 +1,232 @@
+"""批次回答 JSONL 問題檔 (例如客服匯出的問題或入職前的 FAQ)
+
+輸入每行一個問題:
+    {"user_id": "amy", "session_id": "(選填)", "text": "特休有幾天？", "id": "(選填)"}
+同一個 session 的問題依檔案順序一個一個問 (後面的問題看得到前面的對話)，
+不同 session 之間最多 --concurrency 個同時進行。每個問題完成就寫一行到輸出檔；
+輸出檔同時是進度檔，中斷後以相同參數重跑會略過已成功的問題。
+
+用法:
+    python batch_replay.py questions.jsonl -o answers.jsonl
+    python batch_replay.py questions.jsonl -o answers.jsonl --concurrency 32 --retries 3
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from collections import OrderedDict
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from config.settings import settings
+from services.load_shedding import is_quota_error
+
+# 配額錯誤重試的起始等待秒數 (每次加倍)
+RETRY_BASE_SECONDS = 2.0
+
+
+def read_questions(path: str) -> Iterator[Tuple[int, Dict]]:
+    """逐行讀取問題，返回 (行號, 問題)；格式錯誤的行印出警告後略過"""
+    with open(path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                item = json.loads(line)
+            except json.JSONDecodeError as e:
+                print(f"Warning: line {line_no}: invalid JSON ({e})")
+                continue
+            if not item.get("user_id") or not item.get("text"):
+                print(f"Warning: line {line_no}: user_id and text are required")
+                continue
+            item.setdefault("session_id", f"onboarding_{item['user_id']}")
+            item.setdefault("id", line_no)
+            yield line_no, item
+
+
+def load_checkpoint(output_path: str) -> Set[int]:
+    """輸出檔中已成功回答的行號"""
+    done: Set[int] = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # 中斷時最後一行可能只寫了一半
+                continue
+            if record.get("error") is None:
+                done.add(record["line"])
+    return done
+
+
+def _truncate_partial_line(path: str) -> None:
+    """去掉中斷時寫了一半的最後一行，續跑的紀錄才不會接在它後面"""
+    if not os.path.exists(path):
+        return
+    with open(path, "rb+") as f:
+        data = f.read()
+        if data and not data.endswith(b"\n"):
+            f.truncate(data.rfind(b"\n") + 1)
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(int(round(pct / 100 * len(ordered) + 0.5)) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+class BatchReplay:
+    def __init__(self, output_path: str, concurrency: int = 8, retries: int = 2, use_shortcuts: bool = True):
+        import main
+
+        self._main = main
+        self._output_path = output_path
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._retries = retries
+        self._use_shortcuts = use_shortcuts
+        self._output = None
+        self.results: List[Dict] = []
+
+    def _write(self, record: Dict) -> None:
+        self._output.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._output.flush()
+        self.results.append(record)
+
+    async def _answer(self, item: Dict) -> Dict:
+        """回答一個問題，返回 (回答、來源、呼叫過的工具、對話壓縮前後的 token 數)"""
+        main = self._main
+        user_id, session_id, text = item["user_id"], item["session_id"], item["text"]
+        await main.ensure_session(user_id, session_id)
+
+        direct = main.direct_answer(text) if self._use_shortcuts else None
+        if direct:
+            await main.record_direct_turn(main.APP_NAME, user_id, session_id, text, direct[0])
+            return {"answer": direct[0], "source": direct[1], "tools": []}
+
+        answer_parts: List[str] = []
+        tools: List[str] = []
+        report: Dict = {}
+        async for event in main.run_llm_turn(user_id, session_id, text, report=report):
+            for part in (event.content.parts if event.content else None) or []:
+                if part.text:
+                    answer_parts.append(part.text)
+                if part.function_call:
+                    tools.append(part.function_call.name)
+        return {
+            "answer": "".join(answer_parts),
+            "source": "llm",
+            "tools": tools,
+            "history_tokens_before": report.get("tokens_before"),
+            "history_tokens_after": report.get("tokens_after"),
+        }
+
+    async def _run_item(self, line_no: int, item: Dict) -> None:
+        record = {
+            "line": line_no,
+            "id": item["id"],
+            "user_id": item["user_id"],
+            "session_id": item["session_id"],
+            "text": item["text"],
+        }
+        attempt = 0
+        while True:
+            started = time.perf_counter()
+            try:
+                async with self._semaphore:
+                    # 延遲不含等待並行名額的時間
+                    started = time.perf_counter()
+                    record.update(await self._answer(item), error=None)
+                break
+            except Exception as e:
+                if is_quota_error(e) and attempt < self._retries:
+                    # 模型配額不足：等待後重試 (等待期間不占用並行名額)
+                    await asyncio.sleep(RETRY_BASE_SECONDS * 2 ** attempt)
+                    attempt += 1
+                    continue
+                record.update(answer=None, source=None, tools=[], error=f"{type(e).__name__}: {e}")
+                break
+        record["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        record["attempts"] = attempt + 1
+        self._write(record)
+
+    async def _run_session(self, items: List[Tuple[int, Dict]]) -> None:
+        # 同一個 session 依序回答
+        for line_no, item in items:
+            await self._run_item(line_no, item)
+
+    async def run(self, input_path: str) -> Dict:
+        done = load_checkpoint(self._output_path)
+        sessions: "OrderedDict[Tuple[str, str], List[Tuple[int, Dict]]]" = OrderedDict()
+        total = skipped = 0
+        for line_no, item in read_questions(input_path):
+            total += 1
+            if line_no in done:
+                skipped += 1
+                continue
+            sessions.setdefault((item["user_id"], item["session_id"]), []).append((line_no, item))
+
+        await self._main.a2a_pool.prewarm([settings.HR_AGENT_URL, settings.IT_AGENT_URL])
+        directory = os.path.dirname(self._output_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        _truncate_partial_line(self._output_path)
+        started = time.perf_counter()
+        with open(self._output_path, "a", encoding="utf-8") as self._output:
+            await asyncio.gather(*(self._run_session(items) for items in sessions.values()))
+        elapsed = time.perf_counter() - started
+        return self.summarize(total, skipped, len(sessions), elapsed)
+
+    def summarize(self, total: int, skipped: int, sessions: int, elapsed: float) -> Dict:
+        ok = [r for r in self.results if r["error"] is None]
+        by_source: Dict[str, List[float]] = {}
+        for record in ok:
+            by_source.setdefault(record["source"], []).append(record["elapsed_ms"])
+        latencies = [r["elapsed_ms"] for r in ok]
+        return {
+            "questions": total,
+            "skipped_from_checkpoint": skipped,
+            "answered": len(ok),
+            "errors": len(self.results) - len(ok),
+            "sessions": sessions,
+            "elapsed_seconds": round(elapsed, 2),
+            "questions_per_second": round(len(self.results) / elapsed, 2) if elapsed else 0.0,
+            "latency_ms": {
+                "p50": percentile(latencies, 50),
+                "p95": percentile(latencies, 95),
+                "p99": percentile(latencies, 99),
+            },
+            "by_source": {
+                source: {"count": len(values), "p50_ms": percentile(values, 50), "p95_ms": percentile(values, 95)}
+                for source, values in sorted(by_source.items())
+            },
+        }
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="批次回答 JSONL 問題檔")
+    parser.add_argument("input", help="問題檔 (JSONL，每行 user_id / session_id / text)")
+    parser.add_argument("-o", "--output", required=True, help="回答輸出檔 (JSONL，同時作為續跑的進度檔)")
+    parser.add_argument("--concurrency", type=int, default=8, help="同時進行的問題數")
+    parser.add_argument("--retries", type=int, default=2, help="模型配額不足時的重試次數")
+    parser.add_argument("--no-shortcuts", action="store_true", help="不使用快速路徑與回應快取，每題都呼叫模型")
+    parser.add_argument("--summary", help="另外把統計寫成 JSON 檔")
+    args = parser.parse_args(argv)
+
+    replay = BatchReplay(args.output, args.concurrency, args.retries, not args.no_shortcuts)
+    summary = asyncio.run(replay.run(args.input))
+    print(json.dumps(summary, ensure_ascii=False, indent=2))
+    if args.summary:
+        with open(args.summary, "w", encoding="utf-8") as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+    if summary["errors"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
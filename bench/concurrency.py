@@ -0,0 +1,203 @@
+"""IT 工具的並行檢查：event loop 是否被阻塞、同一個帳號的並行異動是否遺失
+
+對每個 email 先建立帳號，再同時送出多個 assign_system_permission / reset_password /
+setup_vpn_access 與 query_employee_accounts (名冊 TTL 設為 0，每次都讀 Sheet)。
+Google Sheet 換成有延遲的 FakeWorksheet，並以每 5ms 醒來一次的 heartbeat 量測
+event loop 的延遲：
+    sync   同步工具直接在 event loop 上執行 (原本的做法)
+    async  tools.it_tools_async (執行緒池 + 每個 email 一把鎖)
+
+同一個帳號的異動依送出順序套用時，最後的密碼應該等於最後送出的 reset_password 所返回的
+密碼、權限等於最後送出的 assign_system_permission 的系統清單；不相符就記為 out_of_order
+(沒有每個 email 一把鎖時，執行緒池中的呼叫可能以不同的順序寫入)。帳號資料層的每次
+異動前另外等待 0 ~ --store-jitter 秒，模擬 Sheet 或資料庫延遲不一，讓錯序容易出現。
+
+event loop 延遲以 p99 判斷 (--max-lag)：單核機器上工具執行緒爭用 GIL 時偶爾會有數十
+毫秒的尖峰，最大值只列出參考。
+
+用法:
+    python -m bench.concurrency
+    python -m bench.concurrency --emails 50 --ops 20 --sheet-latency 0.1 --account-store sqlite
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+from bench.run import _prepare_environment, percentile
+
+HEARTBEAT_SECONDS = 0.005
+
+
+async def _heartbeat(lags: List[float], stop: asyncio.Event) -> None:
+    """每 HEARTBEAT_SECONDS 醒來一次，記錄實際比預期晚了多久"""
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        expected = loop.time() + HEARTBEAT_SECONDS
+        await asyncio.sleep(HEARTBEAT_SECONDS)
+        lags.append(max(loop.time() - expected, 0.0))
+
+
+def _sync_as_async(func):
+    """同步工具直接在 event loop 上執行 (沒有 await 點)"""
+
+    async def call(**kwargs):
+        return func(**kwargs)
+
+    return call
+
+
+async def _exercise(tools: Dict, prefix: str, emails: int, ops: int, seed: int) -> Dict:
+    """
+    對每個帳號同時送出 ops 個工具呼叫
+
+    Returns:
+        email -> 依送出順序套用時應有的最終狀態 {"password", "permissions"}
+    """
+    rng = random.Random(seed)
+    expected: Dict[str, Dict] = {}
+
+    async def one_account(i: int) -> None:
+        created = await tools["create_email_acount"](employee_name=f"{prefix}{i}", dept="Engineering")
+        email = created["email"]
+        # 送出順序事先決定，gather 依序啟動，拿到同一把鎖的順序也相同
+        kinds = [rng.choice(["assign", "reset", "vpn", "roster"]) for _ in range(ops)]
+
+        async def op(n: int) -> Optional[Dict]:
+            kind = kinds[n]
+            if kind == "assign":
+                return await tools["assign_system_permission"](email=email, systems=[f"SYS{n}"])
+            if kind == "reset":
+                return await tools["reset_password"](email=email)
+            if kind == "vpn":
+                return await tools["setup_vpn_access"](email=email)
+            await tools["query_employee_accounts"](vpn_enabled=True)
+            return None
+
+        results = await asyncio.gather(*(op(n) for n in range(ops)))
+        final = {"password": created.get("initial_password"), "permissions": []}
+        for kind, result in zip(kinds, results):
+            if not result or not result.get("success"):
+                continue
+            if kind == "assign":
+                final["permissions"] = result["granted_systems"]
+            elif kind == "reset":
+                final["password"] = result["new_password"]
+        expected[email] = final
+
+    await asyncio.gather(*(one_account(i) for i in range(emails)))
+    return expected
+
+
+async def run_phase(name: str, tools: Dict, args) -> Dict:
+    from tools.it_tools import ACCOUNT_STORE
+
+    lags: List[float] = []
+    stop = asyncio.Event()
+    heartbeat = asyncio.create_task(_heartbeat(lags, stop))
+    started = time.perf_counter()
+    expected = await _exercise(tools, f"{name}user", args.emails, args.ops, args.seed)
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await heartbeat
+
+    out_of_order = 0
+    for email, final in expected.items():
+        account = ACCOUNT_STORE.get(email) or {}
+        if (
+            account.get("password") != final["password"]
+            or list(account.get("permissions") or []) != final["permissions"]
+        ):
+            out_of_order += 1
+    total_ops = args.emails * (args.ops + 1)
+    return {
+        "phase": name,
+        "ops": total_ops,
+        "elapsed_s": round(elapsed, 3),
+        "ops_per_second": round(total_ops / elapsed, 1),
+        "loop_lag_p99_ms": round(percentile(lags, 99) * 1000, 1),
+        "loop_lag_max_ms": round(max(lags, default=0.0) * 1000, 1),
+        "out_of_order": out_of_order,
+    }
+
+
+def _add_store_jitter(store, jitter: float, seed: int) -> None:
+    """帳號異動前隨機等待 (在工具執行緒中，不影響 event loop)"""
+    if jitter <= 0:
+        return
+    rng = random.Random(seed)
+    update = store.update
+
+    def jittered_update(email: str, **fields):
+        time.sleep(rng.uniform(0, jitter))
+        return update(email, **fields)
+
+    store.update = jittered_update
+
+
+async def main_async(args) -> List[Dict]:
+    from bench import fakes
+
+    fakes.install_fake_sheet(fakes.FakeWorksheet(latency=args.sheet_latency))
+
+    from tools import it_tools, it_tools_async
+
+    _add_store_jitter(it_tools.ACCOUNT_STORE, args.store_jitter, args.seed)
+    it_tools.start_employee_data_load()
+    await it_tools_async.run_blocking(it_tools._ensure_accounts_loaded)
+
+    names = [
+        "create_email_acount",
+        "assign_system_permission",
+        "setup_vpn_access",
+        "reset_password",
+        "query_employee_accounts",
+    ]
+    sync_tools = {n: _sync_as_async(getattr(it_tools, n)) for n in names}
+    async_tools = {n: getattr(it_tools_async, n) for n in names}
+    return [await run_phase("sync", sync_tools, args), await run_phase("async", async_tools, args)]
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="IT 工具的並行檢查")
+    parser.add_argument("--emails", type=int, default=20, help="帳號數")
+    parser.add_argument("--ops", type=int, default=10, help="每個帳號同時送出的工具呼叫數")
+    parser.add_argument("--sheet-latency", type=float, default=0.05, help="每次 Sheet API 呼叫的延遲 (秒)")
+    parser.add_argument("--store-jitter", type=float, default=0.005, help="每次帳號異動前的隨機延遲上限 (秒)")
+    parser.add_argument("--account-store", default="sheet", choices=["sheet", "sqlite", "shared"])
+    parser.add_argument("--max-lag", type=float, default=0.05, help="async 版本允許的 event loop p99 延遲 (秒)")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix="onboarding-concurrency-") as work_dir:
+        _prepare_environment(work_dir, args.account_store)
+        # 每次讀名冊都要打 Sheet，才看得出阻塞的影響
+        os.environ["ROSTER_TTL_SECONDS"] = "0"
+        rows = asyncio.run(main_async(args))
+
+        from tools.sheet_writer import get_write_queue
+
+        # 暫存目錄刪除前先停止寫入佇列
+        get_write_queue().stop(flush=False)
+
+    print(
+        f"\n{'phase':<6} {'ops':>5} {'elapsed s':>10} {'ops/s':>8} {'lag p99 ms':>11} {'lag max ms':>11} "
+        f"{'out of order':>13}"
+    )
+    for row in rows:
+        print(
+            f"{row['phase']:<6} {row['ops']:>5} {row['elapsed_s']:>10} {row['ops_per_second']:>8} "
+            f"{row['loop_lag_p99_ms']:>11} {row['loop_lag_max_ms']:>11} {row['out_of_order']:>13}"
+        )
+    async_row = rows[-1]
+    if async_row["out_of_order"] or async_row["loop_lag_p99_ms"] > args.max_lag * 1000:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
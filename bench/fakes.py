@@ -0,0 +1,334 @@
+"""壓測用的假元件：記憶體中的 Google Sheet 與固定規則回應的模型
+
+- FakeWorksheet / FakeSheetSession: 取代 gspread，支援 IT 工具用到的讀寫方法，
+  可設定每次呼叫的延遲來模擬 Sheets API，也可以模擬配額 (超過就回 429) 與隨機的 5xx
+- StubLlm: 依關鍵字決定轉交對象或呼叫哪個工具，結果固定 (同樣的輸入永遠同樣的輸出)，
+  可設定每次呼叫的延遲來模擬 Gemini
+- 每個階段的耗時都記到 StageRecorder，由 bench.run 彙整成百分位數
+"""
+
+import asyncio
+import json
+import random
+import re
+import threading
+import time
+from collections import defaultdict, deque
+from typing import AsyncGenerator, Dict, List, Optional
+
+from google.adk.models import BaseLlm, LlmRequest, LlmResponse
+from google.adk.models.registry import LLMRegistry
+from google.genai.types import (
+    Content,
+    FunctionCall,
+    GenerateContentResponseUsageMetadata,
+    Part,
+)
+import requests
+from gspread.exceptions import APIError
+from gspread.utils import a1_to_rowcol, column_letter_to_index, rowcol_to_a1
+
+from services.fan_out import HR_TERMS, IT_TERMS
+from tools import sheet_client
+from tools.roster_sync import DEFAULT_HEADER
+from tools.sheet_client import SheetSession
+
+
+class StageRecorder:
+    """記錄各階段每次的耗時 (秒)，執行緒安全"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+
+    def record(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            self.samples[stage].append(seconds)
+
+    def reset(self) -> None:
+        with self._lock:
+            self.samples.clear()
+
+
+recorder = StageRecorder()
+
+
+# ---- Google Sheet ----
+
+
+def api_error(status: int, message: str, reason: str = "RESOURCE_EXHAUSTED") -> APIError:
+    """與 gspread 相同格式的 API 錯誤"""
+    response = requests.Response()
+    response.status_code = status
+    response._content = json.dumps(
+        {"error": {"code": status, "message": message, "status": reason}}
+    ).encode()
+    return APIError(response)
+
+
+class FakeWorksheet:
+    """
+    記憶體中的工作表，只實作 IT 工具用到的 gspread 方法
+
+    quota > 0 時，每 quota_window 秒內超過 quota 次的呼叫回 429 (同 Sheets 每分鐘配額)；
+    error_rate 為隨機回 503 的比例。被拒絕的呼叫記在 rejected。
+    """
+
+    def __init__(
+        self,
+        rows: Optional[List[List[str]]] = None,
+        latency: float = 0.0,
+        quota: int = 0,
+        quota_window: float = 60.0,
+        error_rate: float = 0.0,
+        seed: int = 0,
+    ):
+        self._lock = threading.Lock()
+        self.rows: List[List[str]] = [list(DEFAULT_HEADER)] + [list(r) for r in rows or []]
+        self.latency = latency
+        self.quota = quota
+        self.quota_window = quota_window
+        self.error_rate = error_rate
+        self._rng = random.Random(seed)
+        self._recent: deque = deque()
+        self.calls: Dict[str, int] = defaultdict(int)
+        self.rejected: Dict[str, int] = defaultdict(int)
+
+    def _io(self, method: str) -> None:
+        with self._lock:
+            now = time.monotonic()
+            while self._recent and now - self._recent[0] >= self.quota_window:
+                self._recent.popleft()
+            if self.quota and len(self._recent) >= self.quota:
+                self.rejected["429"] += 1
+                raise api_error(429, "Quota exceeded for quota metric 'Requests per minute'")
+            if self.error_rate and self._rng.random() < self.error_rate:
+                self.rejected["503"] += 1
+                raise api_error(503, "The service is currently unavailable.", "UNAVAILABLE")
+            self._recent.append(now)
+            self.calls[method] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def reset_stats(self) -> None:
+        """清除呼叫計數與配額視窗"""
+        with self._lock:
+            self._recent.clear()
+            self.calls.clear()
+            self.rejected.clear()
+
+    def get_all_values(self) -> List[List[str]]:
+        self._io("get_all_values")
+        with self._lock:
+            return [list(r) for r in self.rows]
+
+    def _read_range(self, range_name: str) -> List[List[str]]:
+        """支援 "A5:F" (第 5 列到最後)、"A5:F9" 與單一儲存格 "B5" """
+        start, _, end = range_name.partition(":")
+        start_row, start_col = a1_to_rowcol(start)
+        if not end:
+            end_row, end_col = start_row, start_col
+        elif re.search(r"\d", end):
+            end_row, end_col = a1_to_rowcol(end)
+        else:
+            end_row, end_col = None, column_letter_to_index(end)
+        with self._lock:
+            return [list(r[start_col - 1 : end_col]) for r in self.rows[start_row - 1 : end_row]]
+
+    def get_values(self, range_name: str) -> List[List[str]]:
+        self._io("get_values")
+        return self._read_range(range_name)
+
+    def row_values(self, row: int, **kwargs) -> List[str]:
+        self._io("row_values")
+        with self._lock:
+            return list(self.rows[row - 1]) if row <= len(self.rows) else []
+
+    def update(self, values: List[List], range_name: Optional[str] = None, **kwargs) -> Dict:
+        return self.batch_update([{"range": range_name or "A1", "values": values}])
+
+    def batch_get(self, ranges: List[str]) -> List[List[List[str]]]:
+        self._io("batch_get")
+        return [self._read_range(r) for r in ranges]
+
+    def append_rows(self, values: List[List], value_input_option: Optional[str] = None, **kwargs) -> Dict:
+        self._io("append_rows")
+        with self._lock:
+            first = len(self.rows) + 1
+            self.rows.extend([str(v) for v in row] for row in values)
+            last = len(self.rows)
+        width = max((len(r) for r in values), default=1)
+        return {
+            "updates": {
+                "updatedRange": f"Sheet1!A{first}:{rowcol_to_a1(last, width)}",
+                "updatedRows": len(values),
+            }
+        }
+
+    def batch_update(self, data: List[Dict], **kwargs) -> Dict:
+        self._io("batch_update")
+        with self._lock:
+            for item in data:
+                start, _, _ = item["range"].partition(":")
+                row, col = a1_to_rowcol(start.split("!")[-1])
+                for r_offset, values in enumerate(item["values"]):
+                    while len(self.rows) < row + r_offset:
+                        self.rows.append([])
+                    target = self.rows[row + r_offset - 1]
+                    for c_offset, value in enumerate(values):
+                        while len(target) < col + c_offset:
+                            target.append("")
+                        target[col + c_offset - 1] = str(value)
+        return {"totalUpdatedCells": sum(len(v) for item in data for v in item["values"])}
+
+
+class FakeSheetSession(SheetSession):
+    """永遠使用同一個 FakeWorksheet 的 SheetSession，並記錄每次呼叫的耗時"""
+
+    def __init__(self, worksheet: FakeWorksheet):
+        super().__init__(refresh_interval=0)
+        self.worksheet = worksheet
+
+    def is_configured(self) -> bool:
+        return True
+
+    def get_worksheet(self, worksheet_name: Optional[str] = None) -> FakeWorksheet:
+        return self.worksheet
+
+    def _invoke(self, func, worksheet_name: Optional[str] = None, idempotent: bool = True):
+        started = time.perf_counter()
+        try:
+            return func(self.worksheet)
+        finally:
+            recorder.record("sheet_io", time.perf_counter() - started)
+
+
+def install_fake_sheet(worksheet: FakeWorksheet) -> FakeSheetSession:
+    """讓 get_sheet_session() 返回假的 Sheet (需在建立帳號資料層之前呼叫)"""
+    session = FakeSheetSession(worksheet)
+    sheet_client._session = session
+    return session
+
+
+# ---- 模型 ----
+
+_EMAIL = re.compile(r"[\w.]+@company\.com")
+_NAME = re.compile(r"我叫\s*([A-Za-z0-9_]+)")
+
+
+def _texts(llm_request: LlmRequest) -> List[str]:
+    """對話中使用者說過的話 (新的在前)"""
+    texts = []
+    for content in reversed(llm_request.contents or []):
+        if content.role != "user":
+            continue
+        for part in content.parts or []:
+            if part.text:
+                texts.append(part.text)
+    return texts
+
+
+def _pick_tool(tools: Dict, text: str) -> Optional[FunctionCall]:
+    """依問題關鍵字選擇工具與參數"""
+    lowered = text.lower()
+    email_match = _EMAIL.search(text)
+    name_match = _NAME.search(text)
+    name = name_match.group(1) if name_match else "bench_user"
+    email = email_match.group(0) if email_match else f"{name.lower()}@company.com"
+
+    candidates = [
+        (("vpn",), "setup_vpn_access", {"email": email}),
+        (("密碼",), "reset_password", {"email": email}),
+        (("權限",), "assign_system_permission", {"email": email, "systems": ["GitLab", "Jira"]}),
+        (("帳號", "email", "信箱"), "create_email_acount", {"employee_name": name, "dept": "Engineering"}),
+        (("清單", "進度"), "get_onboarding_checklist", {"employee_name": name}),
+        (("特休", "年假"), "query_hr_policy", {"category": "annual_leave"}),
+        (("福利", "保險", "補助"), "query_hr_policy", {"category": "benefits"}),
+        (("加班", "出差", "請假", "考核", "手冊"), "search_employee_handbook", {"keyword": text}),
+        (("上班", "工時", "wfh"), "query_hr_policy", {"category": "work_hours"}),
+        (("電腦", "硬體", "網路"), "get_it_support_info", {"issue_type": "硬體"}),
+    ]
+    for terms, tool, args in candidates:
+        if tool in tools and any(t in lowered for t in terms):
+            return FunctionCall(name=tool, args=args)
+    return None
+
+
+class StubLlm(BaseLlm):
+    """
+    固定規則的模型
+
+    - 有 transfer_to_agent 工具 (協調專員): 依 HR/IT 關鍵字轉交
+    - 有其他工具 (HR/IT 專員): 依關鍵字呼叫工具，拿到工具結果後整理成文字
+    - 沒有工具 (整合代理): 直接回覆固定文字
+    """
+
+    model: str = "stub-bench"
+    latency: float = 0.0
+
+    @classmethod
+    def supported_models(cls) -> List[str]:
+        return [r"stub-.*"]
+
+    def _respond(self, llm_request: LlmRequest) -> Part:
+        last = (llm_request.contents or [None])[-1]
+        responses = [p.function_response for p in (last.parts or []) if p.function_response] if last else []
+        if responses:
+            summary = json.dumps(responses[0].response, ensure_ascii=False, default=str)[:300]
+            return Part(text=f"以下是 {responses[0].name} 的結果: {summary}")
+
+        texts = _texts(llm_request)
+        question = texts[0] if texts else ""
+        tools = llm_request.tools_dict
+        if "transfer_to_agent" in tools:
+            lowered = question.lower()
+            target = "IT專員" if any(t in lowered for t in IT_TERMS) else "人資專員"
+            if not any(t in lowered for t in HR_TERMS + IT_TERMS):
+                return Part(text="請問您的姓名與部門是？我可以協助 HR 與 IT 相關的入職事項。")
+            return Part(function_call=FunctionCall(name="transfer_to_agent", args={"agent_name": target}))
+
+        function_call = _pick_tool(tools, question)
+        if function_call is not None:
+            return Part(function_call=function_call)
+        return Part(text=f"已收到您的問題: {question[:50]}")
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        started = time.perf_counter()
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        part = self._respond(llm_request)
+        stage = "routing" if "transfer_to_agent" in llm_request.tools_dict else "model"
+        recorder.record(stage, time.perf_counter() - started)
+        # 以字元數粗估 token 數，讓 token 相關的統計與壓縮邏輯也有資料可用
+        prompt_chars = sum(
+            len(p.text or "") for c in llm_request.contents or [] for p in c.parts or []
+        )
+        output_tokens = len(part.text or "") // 2 + 1
+        yield LlmResponse(
+            content=Content(role="model", parts=[part]),
+            usage_metadata=GenerateContentResponseUsageMetadata(
+                prompt_token_count=prompt_chars // 2 + 1,
+                candidates_token_count=output_tokens,
+                total_token_count=prompt_chars // 2 + 1 + output_tokens,
+            ),
+        )
+
+
+LLMRegistry.register(StubLlm)
+
+
+# ---- 工具計時 ----
+
+_tool_started: Dict[str, float] = {}
+
+
+def before_tool(tool, args, tool_context):
+    _tool_started[tool_context.function_call_id] = time.perf_counter()
+
+
+def after_tool(tool, args, tool_context, tool_response):
+    started = _tool_started.pop(tool_context.function_call_id, None)
+    if started is not None:
+        recorder.record("tool", time.perf_counter() - started)
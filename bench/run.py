@@ -0,0 +1,328 @@
+"""離線壓測：不連 Gemini 與 Google Sheets，量測整套系統的延遲與吞吐量
+
+在同一個程序內啟動 HR 與 IT 專員的 A2A 服務 (httpx ASGITransport)，模型換成
+bench.fakes.StubLlm、Google Sheet 換成記憶體中的 FakeWorksheet，再以多個並行的
+合成 session 驅動協調專員的 Runner。
+
+每個階段的 p50/p95/p99 (毫秒):
+    turn        使用者一句話到收到完整回覆
+    routing     協調專員判斷轉交對象 (模型呼叫)
+    remote_call 對遠端專員的一次 A2A 呼叫 (含遠端的模型與工具)
+    model       遠端專員與整合代理的模型呼叫
+    tool        工具函式執行
+    sheet_io    Google Sheet 讀寫 (含背景寫入佇列)
+
+用法:
+    python -m bench.run                                  # 預設工作負載
+    python -m bench.run --sessions 200 --concurrency 50 --model-latency 0.3 --sheet-latency 0.1
+    python -m bench.run --save-baseline                   # 存成 bench/baselines/<工作負載>.json
+    python -m bench.run --compare                         # 與基準比較，退步超過容許範圍時 exit 1
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from contextlib import AsyncExitStack
+from typing import Dict, List, Optional
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_WORKLOAD = os.path.join(BENCH_DIR, "workloads", "onboarding.jsonl")
+BASELINE_DIR = os.path.join(BENCH_DIR, "baselines")
+
+# 與基準比較時，p95 的差距小於這個毫秒數視為誤差
+ABSOLUTE_FLOOR_MS = 1.0
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    """最近序位法 (nearest-rank) 百分位數"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(int(round(pct / 100 * len(ordered) + 0.5)) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+def summarize(samples: Dict[str, List[float]]) -> Dict[str, Dict]:
+    """各階段的次數與 p50/p95/p99 (毫秒)"""
+    return {
+        stage: {
+            "count": len(values),
+            "p50_ms": round(percentile(values, 50) * 1000, 3),
+            "p95_ms": round(percentile(values, 95) * 1000, 3),
+            "p99_ms": round(percentile(values, 99) * 1000, 3),
+        }
+        for stage, values in sorted(samples.items())
+    }
+
+
+def load_workload(path: str) -> List[Dict]:
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def _prepare_environment(work_dir: str, account_store: str) -> None:
+    """把資料檔都放到暫存目錄 (需在匯入專案模組之前設定)"""
+    os.environ.update(
+        DB_PATH=os.path.join(work_dir, "bench.db"),
+        SHEET_SPOOL_PATH=os.path.join(work_dir, "sheet_spool.jsonl"),
+        EMPLOYEE_SNAPSHOT_PATH=os.path.join(work_dir, "employee_snapshot.json"),
+        AGENT_CARD_CACHE_DIR=os.path.join(work_dir, "agent_cards"),
+        HANDBOOK_INDEX_PATH=os.path.join(work_dir, "handbook_index.bin"),
+        ACCOUNT_STORE=account_store,
+    )
+    # 假工作表預設沒有配額，不限速 (bench.sheet_quota 另外設定)
+    os.environ.setdefault("SHEET_QUOTA_PER_MINUTE", "0")
+
+
+def _boot(args):
+    """匯入並組裝所有元件，返回 (main 模組, 需要啟動的 ASGI app 列表, 假工作表)"""
+    import httpx
+
+    from bench import fakes
+
+    seed_rows = [
+        [f"seed{i}", f"seed{i}@company.com", "Temp1234!", "", "ERP", "Sales"]
+        for i in range(args.seed_accounts)
+    ]
+    worksheet = fakes.FakeWorksheet(seed_rows, latency=args.sheet_latency)
+    fakes.install_fake_sheet(worksheet)
+
+    from agents import hr_agent as hr_module
+    from agents import it_agent as it_module
+
+    for agent in (hr_module.hr_agent, it_module.it_agent):
+        agent.model = fakes.StubLlm(latency=args.model_latency)
+        agent.before_tool_callback = fakes.before_tool
+        agent.after_tool_callback = fakes.after_tool
+
+    apps = {
+        f"localhost:{hr_module.PORT}": hr_module.app,
+        f"localhost:{it_module.PORT}": it_module.app,
+    }
+
+    class InProcessTransport(httpx.AsyncBaseTransport):
+        """依 host:port 把請求交給對應的 ASGI app，並記錄 A2A 呼叫耗時"""
+
+        def __init__(self):
+            self._transports = {key: httpx.ASGITransport(app=app) for key, app in apps.items()}
+
+        async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+            key = f"{request.url.host}:{request.url.port}"
+            transport = self._transports.get(key)
+            if transport is None:
+                raise httpx.ConnectError(f"No in-process app for {key}", request=request)
+            started = time.perf_counter()
+            response = await transport.handle_async_request(request)
+            if request.method == "POST":
+                fakes.recorder.record("remote_call", time.perf_counter() - started)
+            return response
+
+    # main 匯入時會建立連線池；改用同程序的 transport，agent card 也經由它取得
+    from services import a2a_pool
+
+    class InProcessPool(a2a_pool.A2AClientPool):
+        def __init__(self, *pool_args, **kwargs):
+            kwargs["transport"] = InProcessTransport()
+            super().__init__(*pool_args, **kwargs)
+
+        def agent_card(self, base_url: str) -> str:
+            return base_url.rstrip("/") + a2a_pool.AGENT_CARD_PATH
+
+    a2a_pool.A2AClientPool = InProcessPool
+
+    import main
+
+    main.coordinator.model = fakes.StubLlm(latency=args.model_latency)
+    main.merger.model = fakes.StubLlm(latency=args.model_latency)
+    return main, list(apps.values()), worksheet
+
+
+async def _run_session(main, index: int, script: Dict, semaphore: asyncio.Semaphore, result: Dict):
+    from google.genai.types import Content, Part
+
+    from bench.fakes import recorder
+    from services import telemetry
+    from services.fan_out import is_composite_question
+
+    name = f"bench{index}"
+    values = {"name": name, "email": f"{name}@company.com"}
+    app_name = "enterprise_onboarding"
+    user_id = f"bench_user_{index}"
+    session_id = f"bench_session_{index}"
+
+    async with semaphore:
+        await main.session_service.create_session(
+            app_name=app_name, user_id=user_id, session_id=session_id
+        )
+        for turn in script["turns"]:
+            text = turn.format(**values)
+            runner = (
+                main.fan_out_runner
+                if main.settings.FAN_OUT_ENABLED and is_composite_question(text)
+                else main.runner
+            )
+            started = time.perf_counter()
+            answered = False
+            try:
+                with telemetry.span("turn", user_id=user_id, session_id=session_id):
+                    async for event in runner.run_async(
+                        user_id=user_id,
+                        session_id=session_id,
+                        new_message=Content(role="user", parts=[Part(text=text)]),
+                    ):
+                        if event.content and any(p.text for p in event.content.parts or []):
+                            answered = True
+            except Exception as e:
+                result["errors"].append(f"{script.get('script')}: {type(e).__name__}: {e}")
+                continue
+            recorder.record("turn", time.perf_counter() - started)
+            result["turns"] += 1
+            if not answered:
+                result["empty_answers"] += 1
+
+
+async def run_benchmark(args) -> Dict:
+    main, apps, worksheet = _boot(args)
+    from bench.fakes import recorder
+    from tools.sheet_writer import get_write_queue
+
+    workload = load_workload(args.workload)
+    async with AsyncExitStack() as stack:
+        for app in apps:
+            await stack.enter_async_context(app.router.lifespan_context(app))
+
+        # 先跑一輪暖機 (agent card、資料載入)，不列入統計
+        warmup = {"turns": 0, "empty_answers": 0, "errors": []}
+        await _run_session(main, -1, workload[0], asyncio.Semaphore(1), warmup)
+        get_write_queue().flush()
+        recorder.reset()
+
+        result = {"turns": 0, "empty_answers": 0, "errors": []}
+        semaphore = asyncio.Semaphore(args.concurrency)
+        started = time.perf_counter()
+        await asyncio.gather(
+            *(
+                _run_session(main, i, workload[i % len(workload)], semaphore, result)
+                for i in range(args.sessions)
+            )
+        )
+        elapsed = time.perf_counter() - started
+        # 把排隊中的寫入送出，sheet_io 才會包含寫入
+        get_write_queue().flush()
+        await main.a2a_pool.aclose()
+
+    return {
+        "workload": os.path.basename(args.workload),
+        "config": {
+            "sessions": args.sessions,
+            "concurrency": args.concurrency,
+            "model_latency": args.model_latency,
+            "sheet_latency": args.sheet_latency,
+            "seed_accounts": args.seed_accounts,
+            "account_store": args.account_store,
+        },
+        "turns": result["turns"],
+        "errors": len(result["errors"]),
+        "error_samples": result["errors"][:5],
+        "empty_answers": result["empty_answers"],
+        "elapsed_seconds": round(elapsed, 3),
+        "requests_per_second": round(result["turns"] / elapsed, 2) if elapsed else None,
+        "stages": summarize(recorder.samples),
+        "sheet_calls": dict(worksheet.calls),
+    }
+
+
+def compare(report: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """與基準比較，返回退步項目的說明"""
+    regressions = []
+    for stage, base in baseline.get("stages", {}).items():
+        current = report["stages"].get(stage)
+        if current is None:
+            continue
+        limit = base["p95_ms"] * (1 + tolerance) + ABSOLUTE_FLOOR_MS
+        if current["p95_ms"] > limit:
+            regressions.append(f"{stage} p95 {current['p95_ms']}ms > baseline {base['p95_ms']}ms")
+    base_rps = baseline.get("requests_per_second")
+    if base_rps and report["requests_per_second"] < base_rps * (1 - tolerance):
+        regressions.append(
+            f"requests/sec {report['requests_per_second']} < baseline {base_rps}"
+        )
+    if report["errors"] > baseline.get("errors", 0):
+        regressions.append(f"errors {report['errors']} > baseline {baseline.get('errors', 0)}")
+    return regressions
+
+
+def print_report(report: Dict) -> None:
+    print(f"\nworkload: {report['workload']}  {report['config']}")
+    print(
+        f"turns: {report['turns']}  errors: {report['errors']}  "
+        f"elapsed: {report['elapsed_seconds']}s  requests/sec: {report['requests_per_second']}"
+    )
+    print(f"\n{'stage':<12}{'count':>8}{'p50 ms':>12}{'p95 ms':>12}{'p99 ms':>12}")
+    for stage, s in report["stages"].items():
+        print(f"{stage:<12}{s['count']:>8}{s['p50_ms']:>12}{s['p95_ms']:>12}{s['p99_ms']:>12}")
+    print(f"\nsheet calls: {report['sheet_calls']}")
+    for error in report["error_samples"]:
+        print(f"error: {error}")
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="離線壓測 (假模型 + 假 Google Sheet)")
+    parser.add_argument("--workload", default=DEFAULT_WORKLOAD, help="JSONL 工作負載檔")
+    parser.add_argument("--sessions", type=int, default=50, help="合成 session 數")
+    parser.add_argument("--concurrency", type=int, default=10, help="同時進行的 session 數")
+    parser.add_argument("--model-latency", type=float, default=0.0, help="模擬每次模型呼叫的秒數")
+    parser.add_argument("--sheet-latency", type=float, default=0.0, help="模擬每次 Sheets API 呼叫的秒數")
+    parser.add_argument("--seed-accounts", type=int, default=1000, help="工作表中預先放入的帳號數")
+    parser.add_argument("--account-store", default="sheet", choices=["sheet", "sqlite", "shared"])
+    parser.add_argument("--json", help="把完整結果寫成 JSON 檔")
+    parser.add_argument("--save-baseline", action="store_true", help="把結果存成基準")
+    parser.add_argument("--compare", action="store_true", help="與基準比較，退步時 exit 1")
+    parser.add_argument("--baseline", help="基準檔路徑，預設為 bench/baselines/<工作負載>.json")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="容許退步比例 (預設 20%%)")
+    args = parser.parse_args(argv)
+
+    baseline_path = args.baseline or os.path.join(
+        BASELINE_DIR, os.path.splitext(os.path.basename(args.workload))[0] + ".json"
+    )
+
+    with tempfile.TemporaryDirectory(prefix="onboarding-bench-") as work_dir:
+        _prepare_environment(work_dir, args.account_store)
+        report = asyncio.run(run_benchmark(args))
+        from tools.sheet_writer import get_write_queue
+
+        get_write_queue().stop(flush=False)
+
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(baseline_path), exist_ok=True)
+        with open(baseline_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\nSaved baseline to {baseline_path}")
+
+    if args.compare:
+        if not os.path.exists(baseline_path):
+            sys.exit(f"Baseline not found: {baseline_path}")
+        with open(baseline_path, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("config") != report["config"]:
+            print(f"Warning: baseline config differs: {baseline.get('config')}")
+        regressions = compare(report, baseline, args.tolerance)
+        if regressions:
+            print("\nRegressions:")
+            for regression in regressions:
+                print(f"  - {regression}")
+            sys.exit(1)
+        print("\nNo regressions against baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+"""多 worker 擴展性壓測：IT 專員以 1、2、4… 個 uvicorn worker 執行時的吞吐量
+
+每個 worker 數各啟動一次服務 (bench.stub_app，模型為 StubLlm、帳號存在共用的
+SQLite)，再以多個並行的客戶端送 A2A message/send：
+    1. 請專員建立帳號 (寫入)
+    2. 立刻以同一個 email 設定 VPN (讀取)；請求可能落在另一個 worker，
+       查不到帳號就記為 stale_reads，用來驗證跨 worker 的 read-after-write
+
+用法:
+    python -m bench.scaling                          # worker 數 1, 2, 4… 到 CPU 核心數
+    python -m bench.scaling --workers 1,2,4,8 --clients 64 --duration 20
+    python -m bench.scaling --model-latency 0.05     # 模擬模型延遲 (I/O bound)
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from typing import Dict, List, Optional
+
+import httpx
+
+from bench.run import percentile
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def default_worker_counts() -> List[int]:
+    """1, 2, 4… 直到 CPU 核心數 (含核心數本身)"""
+    cores = os.cpu_count() or 1
+    counts = []
+    n = 1
+    while n < cores:
+        counts.append(n)
+        n *= 2
+    counts.append(cores)
+    return counts
+
+
+def _message(text: str) -> Dict:
+    return {
+        "jsonrpc": "2.0",
+        "id": uuid.uuid4().hex,
+        "method": "message/send",
+        "params": {
+            "message": {
+                "role": "user",
+                "parts": [{"kind": "text", "text": text}],
+                "messageId": uuid.uuid4().hex,
+            }
+        },
+    }
+
+
+def _answer_text(response: httpx.Response) -> str:
+    result = response.json().get("result") or {}
+    parts = [p for a in result.get("artifacts") or [] for p in a.get("parts") or []]
+    return "".join(p.get("text", "") for p in parts)
+
+
+def _start_server(workers: int, port: int, work_dir: str, model_latency: float) -> subprocess.Popen:
+    env = dict(
+        os.environ,
+        WEB_CONCURRENCY=str(workers),
+        ACCOUNT_STORE="shared",
+        DB_PATH=os.path.join(work_dir, "accounts.db"),
+        SHEET_SPOOL_PATH=os.path.join(work_dir, "sheet_spool.jsonl"),
+        HANDBOOK_INDEX_PATH=os.path.join(work_dir, "handbook_index.bin"),
+        # 不連 Google Sheet
+        SERVICE_ACCOUNT_FILE="",
+        BENCH_MODEL_LATENCY=str(model_latency),
+        PYTHONWARNINGS="ignore",
+    )
+    command = [
+        sys.executable, "-m", "uvicorn", "bench.stub_app:app",
+        "--port", str(port), "--workers", str(workers), "--log-level", "warning",
+    ]
+    return subprocess.Popen(
+        command, cwd=PROJECT_ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE
+    )
+
+
+async def _wait_ready(base_url: str, process: subprocess.Popen, timeout: float = 120.0) -> None:
+    deadline = time.time() + timeout
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        while time.time() < deadline:
+            if process.poll() is not None:
+                raise RuntimeError(f"server exited: {process.stderr.read().decode()[-2000:]}")
+            try:
+                if (await client.get("/ready")).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.2)
+    raise TimeoutError(f"server at {base_url} not ready after {timeout}s")
+
+
+async def _client(base_url: str, client_id: int, stop_at: float, result: Dict) -> None:
+    # 每個客戶端一條連線；多個 worker 由作業系統分配連線，讀寫常落在不同 worker
+    async with httpx.AsyncClient(base_url=base_url, timeout=120.0) as client:
+        n = 0
+        while time.time() < stop_at:
+            name = f"scale{client_id}x{n}"
+            n += 1
+            try:
+                started = time.perf_counter()
+                await client.post("/", json=_message(f"我叫 {name} 請幫我建立帳號"))
+                result["latencies"].append(time.perf_counter() - started)
+                # 換一條新連線讀取，讓請求有機會落在另一個 worker
+                async with httpx.AsyncClient(base_url=base_url, timeout=120.0) as reader:
+                    started = time.perf_counter()
+                    response = await reader.post(
+                        "/", json=_message(f"請幫 {name}@company.com 設定 vpn")
+                    )
+                result["latencies"].append(time.perf_counter() - started)
+                if '"success": true' not in _answer_text(response):
+                    result["stale_reads"] += 1
+                result["requests"] += 2
+            except httpx.HTTPError as e:
+                result["errors"].append(f"{type(e).__name__}: {e}")
+
+
+async def measure(workers: int, args) -> Dict:
+    port = args.port
+    base_url = f"http://127.0.0.1:{port}"
+    with tempfile.TemporaryDirectory(prefix="onboarding-scaling-") as work_dir:
+        process = _start_server(workers, port, work_dir, args.model_latency)
+        try:
+            await _wait_ready(base_url, process)
+            # 暖機：每個 worker 都要載入模組與建立 ADK runner
+            warmup = {"requests": 0, "stale_reads": 0, "errors": [], "latencies": []}
+            await asyncio.gather(
+                *(_client(base_url, -i - 1, time.time() + args.warmup, warmup) for i in range(args.clients))
+            )
+
+            result = {"requests": 0, "stale_reads": 0, "errors": [], "latencies": []}
+            started = time.perf_counter()
+            stop_at = time.time() + args.duration
+            await asyncio.gather(*(_client(base_url, i, stop_at, result) for i in range(args.clients)))
+            elapsed = time.perf_counter() - started
+        finally:
+            process.terminate()
+            try:
+                process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+    return {
+        "workers": workers,
+        "requests": result["requests"],
+        "requests_per_second": round(result["requests"] / elapsed, 2),
+        "p50_ms": round(percentile(result["latencies"], 50) * 1000, 1),
+        "p95_ms": round(percentile(result["latencies"], 95) * 1000, 1),
+        "stale_reads": result["stale_reads"],
+        "errors": len(result["errors"]),
+    }
+
+
+def print_report(rows: List[Dict]) -> None:
+    base = rows[0]["requests_per_second"] or 1.0
+    print(f"\ncpu cores: {os.cpu_count()}")
+    print(f"{'workers':>7} {'req/s':>9} {'speedup':>8} {'efficiency':>10} {'p50 ms':>9} {'p95 ms':>9} {'stale':>6} {'errors':>6}")
+    for row in rows:
+        speedup = row["requests_per_second"] / base
+        print(
+            f"{row['workers']:>7} {row['requests_per_second']:>9} {speedup:>8.2f} "
+            f"{speedup / (row['workers'] / rows[0]['workers']):>10.0%} {row['p50_ms']:>9} "
+            f"{row['p95_ms']:>9} {row['stale_reads']:>6} {row['errors']:>6}"
+        )
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="多 worker 擴展性壓測")
+    parser.add_argument("--workers", help="以逗號分隔的 worker 數，預設 1,2,4… 到 CPU 核心數")
+    parser.add_argument("--clients", type=int, default=32, help="並行客戶端數")
+    parser.add_argument("--duration", type=float, default=10.0, help="每種 worker 數量測的秒數")
+    parser.add_argument("--warmup", type=float, default=2.0, help="暖機秒數 (不列入統計)")
+    parser.add_argument("--model-latency", type=float, default=0.0, help="StubLlm 每次呼叫的延遲 (秒)")
+    parser.add_argument("--port", type=int, default=8102)
+    parser.add_argument("--json", action="store_true", help="以 JSON 輸出結果")
+    args = parser.parse_args(argv)
+
+    counts = [int(n) for n in args.workers.split(",")] if args.workers else default_worker_counts()
+    rows = [asyncio.run(measure(n, args)) for n in counts]
+    if args.json:
+        print(json.dumps(rows, ensure_ascii=False, indent=2))
+    else:
+        print_report(rows)
+    if any(row["stale_reads"] or row["errors"] for row in rows):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""Sheets API 配額檢查：突發的工具呼叫超過配額時，寫入是否遺失、讀取要等多久
+
+FakeWorksheet 模擬每 --window 秒最多 --quota 次呼叫 (超過回 429) 與隨機的 503，
+同時送出 --creates 個 create_email_acount (經寫入佇列批次寫出) 與 --reads 個
+query_employee_accounts (名冊 TTL 設為 0，每次都讀 Sheet)：
+    retry_only  不限速，只靠 429/5xx 的退避重試
+    scheduled   權杖桶依配額限速 (讀取優先) + 退避重試
+
+最後等寫入佇列清空，檢查每個新帳號都在工作表中剛好出現一次。
+
+用法:
+    python -m bench.sheet_quota
+    python -m bench.sheet_quota --quota 10 --window 1 --creates 100 --error-rate 0.1
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+from typing import Dict, List, Optional
+
+from bench.run import _prepare_environment, percentile
+
+
+async def run_phase(name: str, worksheet, session, scheduler, args) -> Dict:
+    from tools import it_tools_async
+    from tools.sheet_writer import get_write_queue
+
+    worksheet.reset_stats()
+    session.scheduler = scheduler
+    rng = random.Random(args.seed)
+    read_latencies: List[float] = []
+
+    async def read(i: int) -> None:
+        await asyncio.sleep(rng.uniform(0, args.spread))
+        started = time.perf_counter()
+        await it_tools_async.query_employee_accounts(email=f"seed{i % args.seed_accounts}@company.com")
+        read_latencies.append(time.perf_counter() - started)
+
+    async def create(i: int) -> None:
+        await asyncio.sleep(rng.uniform(0, args.spread))
+        await it_tools_async.create_email_acount(employee_name=f"{name}{i}", dept="Engineering")
+
+    started = time.perf_counter()
+    await asyncio.gather(
+        *(create(i) for i in range(args.creates)), *(read(i) for i in range(args.reads))
+    )
+    burst_seconds = time.perf_counter() - started
+
+    # 等寫入佇列把這一輪的新帳號都寫出
+    queue = get_write_queue()
+    deadline = time.perf_counter() + args.drain_timeout
+    while queue.get_stats()["pending"] and time.perf_counter() < deadline:
+        await asyncio.to_thread(queue.flush)
+        await asyncio.sleep(0.05)
+    drain_seconds = time.perf_counter() - started
+
+    emails = Counter(row[1] for row in worksheet.rows[1:] if len(row) > 1)
+    expected = [f"{name}{i}@company.com" for i in range(args.creates)]
+    stats = scheduler.get_stats()
+    return {
+        "phase": name,
+        "burst_s": round(burst_seconds, 2),
+        "drain_s": round(drain_seconds, 2),
+        "read_p50_ms": round(percentile(read_latencies, 50) * 1000, 1),
+        "read_p95_ms": round(percentile(read_latencies, 95) * 1000, 1),
+        "api_calls": sum(worksheet.calls.values()),
+        "rejected_429": worksheet.rejected["429"],
+        "rejected_503": worksheet.rejected["503"],
+        "retries": stats["retries"],
+        "gave_up": stats["gave_up"],
+        "lost": sum(1 for email in expected if emails[email] == 0),
+        "duplicated": sum(1 for email in expected if emails[email] > 1),
+    }
+
+
+async def main_async(args) -> List[Dict]:
+    from bench import fakes
+
+    seed_rows = [
+        [f"seed{i}", f"seed{i}@company.com", "Temp1234!", "", "ERP", "Sales"]
+        for i in range(args.seed_accounts)
+    ]
+    worksheet = fakes.FakeWorksheet(
+        seed_rows,
+        latency=args.sheet_latency,
+        quota=args.quota,
+        quota_window=args.window,
+        error_rate=args.error_rate,
+        seed=args.seed,
+    )
+    session = fakes.install_fake_sheet(worksheet)
+
+    from tools import it_tools, it_tools_async
+    from tools.sheet_scheduler import SheetScheduler
+
+    it_tools.start_employee_data_load()
+    await it_tools_async.run_blocking(it_tools._ensure_accounts_loaded)
+
+    def scheduler(requests_per_minute: float) -> SheetScheduler:
+        return SheetScheduler(
+            requests_per_minute=requests_per_minute,
+            burst=max(1, args.quota // 4),
+            max_retries=args.retries,
+            base_backoff=args.base_backoff,
+            max_backoff=args.window,
+            rng=random.Random(args.seed),
+        )
+
+    quota_per_minute = args.quota / args.window * 60
+    return [
+        await run_phase("retry_only", worksheet, session, scheduler(0), args),
+        await run_phase("scheduled", worksheet, session, scheduler(quota_per_minute), args),
+    ]
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Sheets API 配額檢查")
+    parser.add_argument("--creates", type=int, default=60, help="同時建立的帳號數")
+    parser.add_argument("--reads", type=int, default=60, help="同時查詢帳號的次數")
+    parser.add_argument("--spread", type=float, default=1.0, help="呼叫分散在幾秒內送出")
+    parser.add_argument("--quota", type=int, default=20, help="每個時間窗允許的 API 呼叫數")
+    parser.add_argument("--window", type=float, default=2.0, help="配額時間窗 (秒，真實環境為 60)")
+    parser.add_argument("--error-rate", type=float, default=0.05, help="隨機回 503 的比例")
+    parser.add_argument("--sheet-latency", type=float, default=0.02, help="每次 Sheet API 呼叫的延遲 (秒)")
+    parser.add_argument("--seed-accounts", type=int, default=100)
+    parser.add_argument("--retries", type=int, default=8, help="429/5xx 最多重試次數")
+    parser.add_argument("--base-backoff", type=float, default=0.1, help="退避起始秒數")
+    parser.add_argument("--flush-batch", type=int, default=5, help="寫入佇列的批次大小")
+    parser.add_argument("--drain-timeout", type=float, default=60.0, help="等待寫入佇列清空的上限 (秒)")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix="onboarding-sheet-quota-") as work_dir:
+        _prepare_environment(work_dir, "sheet")
+        os.environ.update(
+            ROSTER_TTL_SECONDS="0",
+            SHEET_FLUSH_BATCH_SIZE=str(args.flush_batch),
+            SHEET_FLUSH_INTERVAL="0.1",
+        )
+        rows = asyncio.run(main_async(args))
+
+        from tools.sheet_writer import get_write_queue
+
+        # 暫存目錄刪除前先停止寫入佇列
+        get_write_queue().stop(flush=False)
+
+    columns = [
+        "phase", "burst_s", "drain_s", "read_p50_ms", "read_p95_ms", "api_calls",
+        "rejected_429", "rejected_503", "retries", "gave_up", "lost", "duplicated",
+    ]
+    print()
+    print(" ".join(f"{c:>12}" for c in columns))
+    for row in rows:
+        print(" ".join(f"{row[c]:>12}" for c in columns))
+    if any(row["lost"] or row["duplicated"] for row in rows):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,15 @@
+"""以 StubLlm 取代 Gemini 的 IT 專員 A2A app，供 bench.scaling 以多個 uvicorn worker 啟動
+
+    uvicorn bench.stub_app:app --port 8102 --workers 4
+
+模型延遲由 BENCH_MODEL_LATENCY (秒) 設定。
+"""
+
+import os
+
+from bench import fakes
+from agents.it_agent import app, it_agent
+
+it_agent.model = fakes.StubLlm(latency=float(os.getenv("BENCH_MODEL_LATENCY", "0")))
+
+__all__ = ["app"]
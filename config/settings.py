@@ -1,6 +1,7 @@
 import os
 from dotenv import load_dotenv
 
+# 整個程式只在這裡載入一次 .env；其他模組透過 settings (或匯入本模組後的 os.getenv) 讀設定
 load_dotenv()
 
 
@@ -12,11 +13,97 @@ class Settings:
     HR_AGENT_URL = os.getenv("HR_AGENT_URL", "http://localhost:8001")
     IT_AGENT_URL = os.getenv("IT_AGENT_URL", "http://localhost:8002")
 
+    # A2A 連線池與 agent card 快取
+    A2A_MAX_CONNECTIONS = int(os.getenv("A2A_MAX_CONNECTIONS", "20"))
+    A2A_KEEPALIVE_SECONDS = float(os.getenv("A2A_KEEPALIVE_SECONDS", "120"))
+    AGENT_CARD_CACHE_DIR = os.getenv("AGENT_CARD_CACHE_DIR", "./data/agent_cards")
+    AGENT_CARD_TTL = float(os.getenv("AGENT_CARD_TTL", "3600"))
+
     # Model Configuration
     DEFAULT_MODEL = "gemini-2.0-flash-exp"
 
     # Database
-    DB_PATH = "./data/onboarding_sessions.db"
+    DB_PATH = os.getenv("DB_PATH", "./data/onboarding_sessions.db")
+
+    # HR 查表問題的快速路徑 (不經過 LLM)
+    FAST_PATH_ENABLED = os.getenv("FAST_PATH_ENABLED", "true").lower() == "true"
+
+    # 綜合性問題平行諮詢 HR 與 IT 專員，每位專員的逾時秒數
+    FAN_OUT_ENABLED = os.getenv("FAN_OUT_ENABLED", "true").lower() == "true"
+    FAN_OUT_TIMEOUT_SECONDS = float(os.getenv("FAN_OUT_TIMEOUT_SECONDS", "60"))
+
+    # 唯讀問題的回應快取：最多項目數與存活秒數
+    RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "512"))
+    RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "3600"))
+
+    # Session 服務：記憶體中保留的熱門 session 數與資料保留天數 (0 表示永久保留)
+    SESSION_CACHE_SIZE = int(os.getenv("SESSION_CACHE_SIZE", "256"))
+    SESSION_RETENTION_DAYS = float(os.getenv("SESSION_RETENTION_DAYS", "30"))
+
+    # Session 歷史壓縮：對話估計超過 SESSION_TOKEN_BUDGET 個 token 時，把較舊的回合濃縮成摘要
+    # (0 表示不壓縮)；最近 SESSION_KEEP_RECENT_TURNS 個回合原樣保留，摘要最多 SESSION_DIGEST_MAX_TOKENS
+    SESSION_TOKEN_BUDGET = int(os.getenv("SESSION_TOKEN_BUDGET", "4000"))
+    SESSION_KEEP_RECENT_TURNS = int(os.getenv("SESSION_KEEP_RECENT_TURNS", "3"))
+    SESSION_DIGEST_MAX_TOKENS = int(os.getenv("SESSION_DIGEST_MAX_TOKENS", "600"))
+
+    # 帳號資料後端: "sheet" (Google Sheet)、"sqlite" (DB_PATH) 或 "shared" (多個 worker 共用)
+    ACCOUNT_STORE = os.getenv("ACCOUNT_STORE", "sheet")
+
+    # A2A 服務的 worker 程序數 (與 uvicorn 相同的環境變數)；大於 1 時 sheet 後端改用 shared
+    WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+    # 多個 worker 時由主程序先載入 app 再 fork worker，worker 沿用已初始化的 agent
+    SERVE_PRELOAD = os.getenv("SERVE_PRELOAD", "false").lower() == "true"
+
+    # 員工資料載入：本地快照檔與工具等待背景載入的上限（秒）
+    EMPLOYEE_SNAPSHOT_PATH = os.getenv(
+        "EMPLOYEE_SNAPSHOT_PATH", "./data/employee_snapshot.json"
+    )
+    EMPLOYEE_LOAD_TIMEOUT = float(os.getenv("EMPLOYEE_LOAD_TIMEOUT", "5.0"))
+
+    # 員工名冊快取：TTL 到期後增量同步，並定期整表重新同步（秒）
+    ROSTER_TTL_SECONDS = float(os.getenv("ROSTER_TTL_SECONDS", "60"))
+    ROSTER_FULL_REFRESH_SECONDS = float(os.getenv("ROSTER_FULL_REFRESH_SECONDS", "3600"))
+
+    # Google Sheet 寫入佇列 (write-behind)
+    SHEET_SPOOL_PATH = os.getenv("SHEET_SPOOL_PATH", "./data/sheet_spool.jsonl")
+    SHEET_FLUSH_BATCH_SIZE = int(os.getenv("SHEET_FLUSH_BATCH_SIZE", "50"))
+    SHEET_FLUSH_INTERVAL = float(os.getenv("SHEET_FLUSH_INTERVAL", "2.0"))
+
+    # Google Sheets API 配額：每分鐘呼叫數 (0 表示不限速) 與可突發的次數；
+    # 429/5xx 最多重試次數與指數退避的起始、最長秒數
+    SHEET_QUOTA_PER_MINUTE = float(os.getenv("SHEET_QUOTA_PER_MINUTE", "60"))
+    SHEET_QUOTA_BURST = int(os.getenv("SHEET_QUOTA_BURST", "10"))
+    SHEET_MAX_RETRIES = int(os.getenv("SHEET_MAX_RETRIES", "5"))
+    SHEET_RETRY_BASE_SECONDS = float(os.getenv("SHEET_RETRY_BASE_SECONDS", "1.0"))
+    SHEET_RETRY_MAX_SECONDS = float(os.getenv("SHEET_RETRY_MAX_SECONDS", "64"))
+
+    # HTTP/SSE 前端 (server.py)：port、同時執行的 LLM 回合數、排隊上限與等待秒數，
+    # 以及模型配額不足後暫停接受新回合的秒數
+    SERVER_PORT = int(os.getenv("SERVER_PORT", "8000"))
+    SERVER_MAX_CONCURRENT_TURNS = int(os.getenv("SERVER_MAX_CONCURRENT_TURNS", "64"))
+    SERVER_MAX_QUEUED_TURNS = int(os.getenv("SERVER_MAX_QUEUED_TURNS", "256"))
+    SERVER_QUEUE_TIMEOUT = float(os.getenv("SERVER_QUEUE_TIMEOUT", "30"))
+    SERVER_QUOTA_COOLDOWN = float(os.getenv("SERVER_QUOTA_COOLDOWN", "30"))
+
+    # IT 工具 (async 版本) 執行 Sheet 與資料庫 I/O 的執行緒數上限
+    IT_TOOL_WORKERS = int(os.getenv("IT_TOOL_WORKERS", "16"))
+
+    # 整批入職：同時準備帳號的執行緒數與每批處理筆數
+    BULK_ONBOARDING_WORKERS = int(os.getenv("BULK_ONBOARDING_WORKERS", "8"))
+    BULK_ONBOARDING_CHUNK_SIZE = int(os.getenv("BULK_ONBOARDING_CHUNK_SIZE", "500"))
+    # IT 專員的 bulk_onboard_employees 工具只能讀取上傳目錄內的名單；進度檔與每次執行的結果存在資料目錄
+    BULK_ONBOARDING_UPLOAD_DIR = os.getenv("BULK_ONBOARDING_UPLOAD_DIR", "./data/uploads")
+    BULK_ONBOARDING_DATA_DIR = os.getenv("BULK_ONBOARDING_DATA_DIR", "./data/bulk_onboarding")
+
+    # 員工手冊：Markdown 手冊檔目錄與預先建立的檢索索引檔
+    HANDBOOK_DIR = os.getenv("HANDBOOK_DIR", "./data/handbook")
+    HANDBOOK_INDEX_PATH = os.getenv("HANDBOOK_INDEX_PATH", "./data/handbook/index.bin")
+    # 多久檢查一次手冊檔是否有變動（秒）
+    HANDBOOK_CHECK_SECONDS = float(os.getenv("HANDBOOK_CHECK_SECONDS", "5"))
+
+    # 追蹤與指標：span 匯出檔 (JSONL) 與協調專員結束時寫出的指標檔，空字串表示不寫檔
+    TRACE_FILE = os.getenv("TRACE_FILE", "")
+    METRICS_FILE = os.getenv("METRICS_FILE", "")
 
     # Logging
     LOG_LEVEL = "INFO"
@@ -1,27 +1,49 @@
 import asyncio
-import os
-from dotenv import load_dotenv
-from google.adk.agents import LlmAgent
+import time
+from typing import AsyncIterator, Dict, Optional, Tuple
+
+from services import startup
+from google.adk.agents import LlmAgent, SequentialAgent
 from google.adk import Runner
-from google.adk.sessions import InMemorySessionService
 from google.adk.agents.remote_a2a_agent import RemoteA2aAgent
+from google.adk.events import Event
 from google.genai.types import Content, Part
 
+from config.settings import settings
+from services.a2a_pool import A2AClientPool
+from services.fan_out import FanOutAgent, is_composite_question
+from services.fast_path import FastPathRouter
+from services.response_cache import ResponseCache
+from services.session_service import SQLiteSessionService
+from services import telemetry
 
-load_dotenv()
+startup.checkpoint("imports")
 
-# 建立遠端Agent代理 (A2A 協議的 agent_card 路徑是 /.well-known/agent-card.json)
-hr_remote = RemoteA2aAgent(
-    name="人資專員",
-    agent_card=os.getenv("HR_AGENT_URL", "http://localhost:8001") + "/.well-known/agent-card.json",
-    description="專業人力資源專員,可以回答關於公司政策、福利、假期等問題",
-)
+# 所有遠端專員共用的連線池；匯入時只讀本地的 agent card 快取，過期的由 prewarm 以 ETag 重新驗證
+a2a_pool = A2AClientPool()
+hr_agent_card = a2a_pool.agent_card(settings.HR_AGENT_URL)
+it_agent_card = a2a_pool.agent_card(settings.IT_AGENT_URL)
+
+
+def build_remote_agents():
+    """建立遠端Agent代理 (A2A 協議的 agent_card 路徑是 /.well-known/agent-card.json)"""
+    hr_remote = RemoteA2aAgent(
+        name="人資專員",
+        agent_card=hr_agent_card,
+        description="專業人力資源專員,可以回答關於公司政策、福利、假期等問題",
+        httpx_client=a2a_pool.client,
+    )
+
+    it_remote = RemoteA2aAgent(
+        name="IT專員",
+        agent_card=it_agent_card,
+        description="專業IT專員,可以回答關於IT帳號、密碼、權限等問題",
+        httpx_client=a2a_pool.client,
+    )
+    return hr_remote, it_remote
 
-it_remote = RemoteA2aAgent(
-    name="IT專員",
-    agent_card=os.getenv("IT_AGENT_URL", "http://localhost:8002") + "/.well-known/agent-card.json",
-    description="專業IT專員,可以回答關於IT帳號、密碼、權限等問題",
-)
+
+hr_remote, it_remote = build_remote_agents()
 
 # 建立主要代理
 coordinator = LlmAgent(
@@ -50,8 +72,35 @@ coordinator = LlmAgent(
     sub_agents=[hr_remote, it_remote],
 )
 
-# 建立記憶體 Session 服務（測試用，不持久化）
-session_service = InMemorySessionService()
+# 綜合性問題：同時諮詢 HR 與 IT 專員，再由整合代理一次彙整
+# (ADK 的代理只能有一個上層代理，因此另外建立一組遠端代理)
+# 整合代理與協調專員同名：兩個 Runner 共用 session，下一個回合由協調專員接手時
+# 才認得最後一則回覆的作者
+merger = LlmAgent(
+    name=coordinator.name,
+    description="彙整多位專員的回覆",
+    instruction="""你是企業入職協調助理。對話中已有「人資專員」與「IT專員」針對使用者最新問題的回覆。
+                請把各專員的回覆整合成一份完整、不重複的解答，依 HR 與 IT 分段列出，
+                若某位專員逾時或發生錯誤，請說明該部分暫時無法取得並建議稍後再詢問。
+                最後提供明確的下一步指引。
+
+                請使用繁體中文回應。""",
+    model="gemini-2.0-flash",
+)
+# 模型延遲與 token 數
+for _agent in (coordinator, merger):
+    telemetry.instrument_agent(_agent)
+
+fan_out_pipeline = SequentialAgent(
+    name="綜合諮詢",
+    sub_agents=[
+        FanOutAgent(name="平行諮詢", sub_agents=list(build_remote_agents())),
+        merger,
+    ],
+)
+
+# 建立 SQLite Session 服務（持久化於 DB_PATH，重啟後可延續對話）
+session_service = SQLiteSessionService(settings.DB_PATH)
 
 # 建立Runner
 runner = Runner(
@@ -60,47 +109,238 @@ runner = Runner(
     session_service=session_service,
 )
 
+# 綜合性問題使用的 Runner (共用同一個 Session 服務)
+fan_out_runner = Runner(
+    app_name="enterprise_onboarding",
+    agent=fan_out_pipeline,
+    session_service=session_service,
+)
 
-async def main():
-    user_id = "employee_001"
-    session_id = "onboarding_session_001"
-    app_name = "enterprise_onboarding"
+# HR 查表問題的快速路徑 (不經過 LLM)
+fast_router = FastPathRouter()
 
-    # 先創建 Session（如果不存在）
-    existing_session = await session_service.get_session(
+# 唯讀問題的回應快取
+response_cache = ResponseCache()
+
+startup.checkpoint("agents")
+
+
+APP_NAME = "enterprise_onboarding"
+
+
+async def ensure_session(user_id: str, session_id: str, app_name: str = APP_NAME):
+    """取得 session，不存在時建立；返回 (session, 是否新建立)"""
+    session = await session_service.get_session(
         app_name=app_name, user_id=user_id, session_id=session_id
     )
-    if not existing_session:
-        await session_service.create_session(
+    if session is not None:
+        return session, False
+    session = await session_service.create_session(
+        app_name=app_name, user_id=user_id, session_id=session_id
+    )
+    return session, True
+
+
+async def record_direct_turn(
+    app_name: str, user_id: str, session_id: str, user_input: str, answer: str
+):
+    """把快速路徑或快取的問答寫入 session，之後走 LLM 的對話仍看得到上下文"""
+    session = await session_service.get_session(
+        app_name=app_name, user_id=user_id, session_id=session_id
+    )
+    invocation_id = Event.new_id()
+    await session_service.append_event(
+        session,
+        Event(
+            invocation_id=invocation_id,
+            author="user",
+            content=Content(role="user", parts=[Part(text=user_input)]),
+        ),
+    )
+    await session_service.append_event(
+        session,
+        Event(
+            invocation_id=invocation_id,
+            author=coordinator.name,
+            content=Content(role="model", parts=[Part(text=answer)]),
+        ),
+    )
+
+
+def direct_answer(user_input: str) -> Optional[Tuple[str, str]]:
+    """
+    不需要呼叫 LLM 的回答
+
+    Returns:
+        (回答, 來源 "fast_path" 或 "cache")；需要走 LLM 時返回 None
+    """
+    # 單純的 HR 查表問題直接回答
+    fast_result = fast_router.route(user_input) if settings.FAST_PATH_ENABLED else None
+    if fast_result:
+        return fast_result.answer, "fast_path"
+
+    # 相同的唯讀問題直接使用快取的回答
+    if response_cache.is_cacheable_question(user_input):
+        cached_answer = response_cache.get(response_cache.make_key(user_input, coordinator.name))
+        if cached_answer:
+            return cached_answer, "cache"
+    return None
+
+
+async def compact_history(user_id: str, session_id: str, app_name: str = APP_NAME) -> Dict:
+    """回合開始前壓縮過長的對話，記錄壓縮前後的估計 token 數"""
+    report = await session_service.compact_session(
+        app_name=app_name, user_id=user_id, session_id=session_id
+    ) or {"tokens_before": 0, "tokens_after": 0, "compacted_events": 0}
+    telemetry.SESSION_TOKENS.observe(report["tokens_before"], stage="before_compaction")
+    telemetry.SESSION_TOKENS.observe(report["tokens_after"], stage="after_compaction")
+    return report
+
+
+async def run_llm_turn(
+    user_id: str,
+    session_id: str,
+    user_input: str,
+    app_name: str = APP_NAME,
+    report: Optional[Dict] = None,
+) -> AsyncIterator[Event]:
+    """
+    以協調專員 (或綜合諮詢) 執行一個回合，逐一產出 ADK 事件
+
+    回合開始前先壓縮過長的對話 (壓縮前後的 token 數寫入 report)，
+    回合結束後記錄 LLM 耗時；session 第一個回合的唯讀回答存入回應快取
+    (之後的回合可能用到先前對話的上下文，不能給其他使用者)。
+    """
+    started = time.perf_counter()
+    compaction = await compact_history(user_id, session_id, app_name)
+    if report is not None:
+        report.update(compaction)
+    answer_parts = []
+    tool_names = set()
+    tool_responses = []
+    cacheable = response_cache.is_cacheable_question(user_input)
+    if cacheable:
+        session = await session_service.get_session(
             app_name=app_name, user_id=user_id, session_id=session_id
         )
+        cacheable = session is None or not session.events
+    # 將用戶輸入轉換為 Content 對象
+    message = Content(role="user", parts=[Part(text=user_input)])
+    # 同時涉及 HR 與 IT 的問題平行諮詢兩位專員
+    turn_runner = (
+        fan_out_runner
+        if settings.FAN_OUT_ENABLED and is_composite_question(user_input)
+        else runner
+    )
+    # 整個回合是一個 trace，遠端專員的 span 透過 traceparent 接在底下。
+    # 事件之間會 yield 給呼叫端 (SSE 用戶端斷線時可能由其他 task 關閉)，因此只在
+    # 取下一個事件時把回合的 span 設為目前的 span，不讓 contextvar 跨越 yield
+    turn_span = telemetry.start_span(
+        "turn",
+        user_id=user_id,
+        session_id=session_id,
+        history_tokens_before=compaction["tokens_before"],
+        history_tokens_after=compaction["tokens_after"],
+    )
+    events = turn_runner.run_async(
+        user_id=user_id, session_id=session_id, new_message=message
+    ).__aiter__()
+    try:
+        while True:
+            with telemetry.use_span(turn_span):
+                try:
+                    event = await events.__anext__()
+                except StopAsyncIteration:
+                    break
+            if event.content and event.content.parts:
+                for part in event.content.parts:
+                    if part.text:
+                        answer_parts.append(part.text)
+                    # 記錄本回合呼叫過的工具，判斷能否快取
+                    if part.function_call:
+                        tool_names.add(part.function_call.name)
+                    if part.function_response:
+                        tool_names.add(part.function_response.name)
+                        tool_responses.append(
+                            (part.function_response.name, part.function_response.response)
+                        )
+            yield event
+    except GeneratorExit:
+        # 呼叫端不再讀取 (例如用戶端斷線)
+        turn_span.attributes["cancelled"] = True
+        turn_span.finish()
+        raise
+    except BaseException as e:
+        turn_span.finish(e)
+        raise
+    finally:
+        await events.aclose()
+    turn_span.finish()
+
+    fast_router.record_llm_turn(time.perf_counter() - started)
+    if cacheable and response_cache.is_cacheable_turn(tool_names):
+        response_cache.put(
+            response_cache.make_key(user_input, coordinator.name),
+            "".join(answer_parts),
+            response_cache.tool_results_fingerprint(tool_responses),
+        )
+
+
+async def main():
+    user_id = "employee_001"
+    session_id = "onboarding_session_001"
+    app_name = APP_NAME
+
+    # 預先建立與遠端專員的連線 (並更新過期的 agent card)，第一次轉交不必等待握手
+    await a2a_pool.prewarm([settings.HR_AGENT_URL, settings.IT_AGENT_URL])
+    startup.checkpoint("prewarm")
+
+    # 先創建 Session（如果不存在）
+    session, created = await ensure_session(user_id, session_id, app_name)
+    if created:
         print("已建立新的對話 Session")
+    else:
+        print(f"已載入先前的對話 Session ({len(session.events)} 則事件)")
+    startup.ready("main")
 
     while True:
         try:
             user_input = input("\n 您: ").strip()
 
             if user_input.lower() in ["exit", "quit", "結束", "離開"]:
+                print(f"\n 快速路徑統計: {fast_router.get_stats()}")
+                print(f" 回應快取統計: {response_cache.get_stats()}")
+                print(f" A2A 連線統計: {a2a_pool.get_stats()}")
+                print(f" Session 統計: {session_service.get_stats()}")
+                telemetry.write_metrics_file()
                 print("\n 感謝使用入職協作系統，祝您工作順利！")
                 break
 
             if not user_input:
                 continue
 
+            # 快速路徑或快取的回答，不呼叫 LLM
+            direct = direct_answer(user_input)
+            if direct:
+                print(f"\n{direct[0]}")
+                await record_direct_turn(app_name, user_id, session_id, user_input, direct[0])
+                continue
+
             # 執行對話
             print("\n 系統處理中...\n")
-            # 將用戶輸入轉換為 Content 對象
-            message = Content(role="user", parts=[Part(text=user_input)])
-            async for event in runner.run_async(
-                user_id=user_id, session_id=session_id, new_message=message
-            ):
+            report: Dict = {}
+            async for event in run_llm_turn(user_id, session_id, user_input, app_name, report):
                 # 即時顯示回應
                 if event.content and event.content.parts:
                     for part in event.content.parts:
-                        if hasattr(part, 'text') and part.text:
+                        if part.text:
                             print(part.text, end="", flush=True)
-
             print()  # 換行
+            if report.get("compacted_events"):
+                print(
+                    f" (較早的對話已濃縮成摘要: {report['tokens_before']} → "
+                    f"{report['tokens_after']} tokens)"
+                )
 
         except KeyboardInterrupt:
             print("\n\n 系統已中斷，再見！")
@@ -0,0 +1,152 @@
+"""協調專員的 HTTP/SSE 前端：多位使用者同時對話
+
+    python server.py                  # 或 uvicorn server:app --port 8000
+
+POST /chat  {"user_id": "...", "message": "...", "session_id": "(選填)"}
+    以 Server-Sent Events 逐一送出事件:
+        session      使用的 session (以及是否新建立)
+        message      代理的文字回覆 {"author", "text"}
+        tool_call    呼叫工具 {"author", "name"}
+        tool_result  工具結果 {"author", "name"}
+        done         回合結束 {"source": "llm" / "fast_path" / "cache", "elapsed_ms"}
+        error        回合失敗 {"message", "quota"}
+    LLM 回合超過並行上限時排隊；佇列已滿、等待逾時或模型配額冷卻中回應 503，
+    同一個 session 已有回合在執行時回應 429，兩者都帶 Retry-After。
+GET /health   並行與卸載統計
+GET /metrics  Prometheus 指標
+"""
+
+import json
+import math
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional
+
+from services import startup
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel, Field
+from starlette.background import BackgroundTask
+
+import main
+from config.settings import settings
+from services import telemetry
+from services.load_shedding import Overloaded, TurnLease, TurnLimiter, is_quota_error
+
+limiter = TurnLimiter()
+
+
+class ChatRequest(BaseModel):
+    user_id: str = Field(min_length=1, max_length=128)
+    message: str = Field(min_length=1, max_length=4000)
+    # 未指定時每位使用者使用自己的預設 session
+    session_id: Optional[str] = Field(default=None, max_length=128)
+
+
+def _sse(event: str, data: Dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def _session_id(request: ChatRequest) -> str:
+    return request.session_id or f"onboarding_{request.user_id}"
+
+
+async def _stream_direct(request: ChatRequest, session_id: str, answer: str, source: str):
+    started = time.perf_counter()
+    _, created = await main.ensure_session(request.user_id, session_id)
+    yield _sse("session", {"session_id": session_id, "created": created})
+    await main.record_direct_turn(main.APP_NAME, request.user_id, session_id, request.message, answer)
+    yield _sse("message", {"author": main.coordinator.name, "text": answer})
+    yield _sse("done", {"source": source, "elapsed_ms": round((time.perf_counter() - started) * 1000, 1)})
+
+
+async def _stream_llm(request: ChatRequest, session_id: str, lease: TurnLease) -> AsyncIterator[str]:
+    started = time.perf_counter()
+    try:
+        _, created = await main.ensure_session(request.user_id, session_id)
+        yield _sse("session", {"session_id": session_id, "created": created})
+        report: Dict = {}
+        async for event in main.run_llm_turn(request.user_id, session_id, request.message, report=report):
+            if not (event.content and event.content.parts):
+                continue
+            for part in event.content.parts:
+                if part.text:
+                    yield _sse("message", {"author": event.author, "text": part.text})
+                if part.function_call:
+                    yield _sse("tool_call", {"author": event.author, "name": part.function_call.name})
+                if part.function_response:
+                    yield _sse("tool_result", {"author": event.author, "name": part.function_response.name})
+        yield _sse(
+            "done",
+            {
+                "source": "llm",
+                "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+                "history_tokens": report,
+            },
+        )
+    except Exception as e:
+        limiter.record_error(e)
+        print(f"Error in turn for {request.user_id}/{session_id}: {e}")
+        yield _sse("error", {"message": str(e), "quota": is_quota_error(e)})
+    finally:
+        lease.release()
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # 預先建立與遠端專員的連線，第一次轉交不必等待握手
+    await main.a2a_pool.prewarm([settings.HR_AGENT_URL, settings.IT_AGENT_URL])
+    startup.checkpoint("prewarm")
+    startup.ready("server")
+    yield
+    telemetry.write_metrics_file()
+
+
+app = FastAPI(title="Onboarding coordinator", lifespan=lifespan)
+telemetry.instrument_app(app, "coordinator")
+startup.checkpoint("app")
+
+
+@app.post("/chat")
+async def chat(request: ChatRequest):
+    session_id = _session_id(request)
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+    # 快速路徑與快取的回答不占用 LLM 名額
+    direct = main.direct_answer(request.message)
+    if direct:
+        return StreamingResponse(
+            _stream_direct(request, session_id, *direct), media_type="text/event-stream", headers=headers
+        )
+
+    try:
+        lease = await limiter.acquire(f"{request.user_id}/{session_id}")
+    except Overloaded as e:
+        return JSONResponse(
+            {"error": e.reason, "retry_after": round(e.retry_after, 1)},
+            status_code=e.status_code,
+            headers={"Retry-After": str(max(math.ceil(e.retry_after), 1))},
+        )
+    # 連線在開始串流前就中斷時，由 background task 歸還名額
+    return StreamingResponse(
+        _stream_llm(request, session_id, lease),
+        media_type="text/event-stream",
+        headers=headers,
+        background=BackgroundTask(lease.release),
+    )
+
+
+@app.get("/health")
+async def health():
+    return {
+        "turns": limiter.get_stats(),
+        "fast_path": main.fast_router.get_stats(),
+        "response_cache": main.response_cache.get_stats(),
+        "a2a": main.a2a_pool.get_stats(),
+    }
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(app, host="0.0.0.0", port=settings.SERVER_PORT)
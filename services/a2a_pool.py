@@ -0,0 +1,182 @@
+"""遠端 A2A 專員共用的 HTTP 連線池與 agent card 快取
+
+- 所有 RemoteA2aAgent 共用一個 keep-alive 的 httpx.AsyncClient
+  (有安裝 h2 且遠端走 HTTPS 時以 ALPN 協商 HTTP/2，否則為 HTTP/1.1 keep-alive)
+- agent card 存在本地檔案，匯入時只讀快取不連網路；協調專員啟動時先建立連線 (pre-warm)，
+  同一個請求順便以 ETag 條件式請求重新驗證過期的 agent card，第一次轉交就不必再做 TCP/TLS 握手
+"""
+
+import asyncio
+import hashlib
+import os
+import time
+from typing import Dict, Iterable, Optional
+
+import httpx
+
+from config.settings import settings
+from services import telemetry
+
+AGENT_CARD_PATH = "/.well-known/agent-card.json"
+
+try:
+    import h2  # noqa: F401  httpx 的 HTTP/2 支援需要 h2 套件
+
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+class A2AClientPool:
+    """共用的 HTTP 連線池，並統計連線重用情形"""
+
+    def __init__(
+        self,
+        cache_dir: str = settings.AGENT_CARD_CACHE_DIR,
+        card_ttl_seconds: float = settings.AGENT_CARD_TTL,
+        max_connections: int = settings.A2A_MAX_CONNECTIONS,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self._cache_dir = cache_dir
+        self._card_ttl = card_ttl_seconds
+        self._stats = {
+            "requests": 0,
+            "new_connections": 0,
+            "tls_handshakes": 0,
+            "card_cache_hits": 0,
+            "card_revalidated": 0,
+            "card_fetched": 0,
+        }
+        self._http_versions: Dict[str, int] = {}
+        self.client = httpx.AsyncClient(
+            http2=HTTP2_AVAILABLE,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+                keepalive_expiry=settings.A2A_KEEPALIVE_SECONDS,
+            ),
+            # 遠端專員可能要跑好幾次模型呼叫，讀取逾時給長一點
+            timeout=httpx.Timeout(600.0, connect=10.0),
+            event_hooks={
+                "request": [self._on_request, telemetry.on_a2a_request],
+                "response": [self._on_response, telemetry.on_a2a_response],
+            },
+            # 測試與壓測時可改用 ASGI transport，在同一個程序內呼叫遠端專員
+            transport=transport,
+        )
+
+    # ---- 連線統計 ----
+
+    async def _trace(self, event_name: str, info: Dict) -> None:
+        # httpcore 只有在建立新連線時才會送出 connect_tcp 事件
+        if event_name == "connection.connect_tcp.complete":
+            self._stats["new_connections"] += 1
+        elif event_name == "connection.start_tls.complete":
+            self._stats["tls_handshakes"] += 1
+
+    async def _on_request(self, request: httpx.Request) -> None:
+        self._stats["requests"] += 1
+        request.extensions["trace"] = self._trace
+
+    async def _on_response(self, response: httpx.Response) -> None:
+        version = response.http_version
+        self._http_versions[version] = self._http_versions.get(version, 0) + 1
+
+    def get_stats(self) -> Dict:
+        """取得連線重用統計"""
+        stats = dict(self._stats)
+        stats["reused_connections"] = max(stats["requests"] - stats["new_connections"], 0)
+        stats["reuse_ratio"] = (
+            round(stats["reused_connections"] / stats["requests"], 3) if stats["requests"] else 0.0
+        )
+        stats["http_versions"] = dict(self._http_versions)
+        return stats
+
+    # ---- agent card 快取 ----
+
+    def _cache_paths(self, card_url: str):
+        name = hashlib.sha1(card_url.encode("utf-8")).hexdigest()[:16]
+        base = os.path.join(self._cache_dir, name)
+        return base + ".json", base + ".etag"
+
+    def agent_card(self, base_url: str) -> str:
+        """
+        取得遠端專員的 agent card (不做任何網路請求，可在匯入時呼叫)
+
+        Args:
+            base_url: 遠端專員的網址，例如 http://localhost:8001
+
+        Returns:
+            本地快取檔路徑 (可直接傳給 RemoteA2aAgent，過期的快取也會使用，由 prewarm 更新)；
+            沒有快取時返回原網址，由 RemoteA2aAgent 在第一次使用時自行下載
+        """
+        card_url = base_url.rstrip("/") + AGENT_CARD_PATH
+        card_path, _ = self._cache_paths(card_url)
+        if not os.path.exists(card_path):
+            return card_url
+        if time.time() - os.path.getmtime(card_path) < self._card_ttl:
+            self._stats["card_cache_hits"] += 1
+            telemetry.record_cache("agent_card", True)
+        return card_path
+
+    def _card_is_fresh(self, card_url: str) -> bool:
+        card_path, _ = self._cache_paths(card_url)
+        return os.path.exists(card_path) and time.time() - os.path.getmtime(card_path) < self._card_ttl
+
+    def _card_request_headers(self, card_url: str) -> Dict[str, str]:
+        card_path, etag_path = self._cache_paths(card_url)
+        if os.path.exists(card_path) and os.path.exists(etag_path):
+            with open(etag_path, "r", encoding="utf-8") as f:
+                return {"If-None-Match": f.read().strip()}
+        return {}
+
+    def _store_card(self, card_url: str, response: httpx.Response) -> None:
+        """把 agent card 的回應寫入本地快取 (304 時只更新時間)"""
+        card_path, etag_path = self._cache_paths(card_url)
+        if response.status_code == 304 and os.path.exists(card_path):
+            os.utime(card_path)
+            self._stats["card_revalidated"] += 1
+            telemetry.record_cache("agent_card", True)
+            return
+        if response.status_code != 200:
+            print(f"Warning: agent card {card_url} returned HTTP {response.status_code}")
+            return
+
+        os.makedirs(self._cache_dir, exist_ok=True)
+        with open(card_path, "w", encoding="utf-8") as f:
+            f.write(response.text)
+        etag = response.headers.get("etag")
+        if etag:
+            with open(etag_path, "w", encoding="utf-8") as f:
+                f.write(etag)
+        elif os.path.exists(etag_path):
+            os.remove(etag_path)
+        self._stats["card_fetched"] += 1
+        telemetry.record_cache("agent_card", False)
+
+    # ---- 預熱 ----
+
+    async def prewarm(self, base_urls: Iterable[str]) -> None:
+        """
+        同時對每個遠端專員建立連線並放回連線池
+
+        預熱的請求就是 agent card：快取過期時帶 ETag 重新驗證並更新快取檔，
+        RemoteA2aAgent 第一次使用時讀到的就是最新的 agent card
+        """
+
+        async def warm(base_url: str):
+            card_url = base_url.rstrip("/") + AGENT_CARD_PATH
+            revalidate = not self._card_is_fresh(card_url)
+            headers = self._card_request_headers(card_url) if revalidate else {}
+            try:
+                response = await self.client.get(card_url, headers=headers, timeout=5.0)
+            except httpx.HTTPError as e:
+                print(f"Warning: cannot pre-warm connection to {base_url}: {e}")
+                return
+            if revalidate:
+                self._store_card(card_url, response)
+
+        await asyncio.gather(*(warm(url) for url in base_urls))
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
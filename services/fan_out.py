@@ -0,0 +1,91 @@
+"""綜合性問題的平行諮詢
+
+協調專員透過 sub_agents 轉交時一次只會呼叫一位專員，同時涉及 HR 與 IT 的問題
+要等兩個遠端呼叫依序完成。FanOutAgent 同時把問題送給多位遠端專員，各自有逾時
+限制；逾時或失敗的專員以一段說明代替，其餘回答照常保留，最後由整合代理一次
+彙整成單一回覆。
+"""
+
+import asyncio
+from typing import AsyncGenerator, List
+
+from google.adk.agents import BaseAgent
+from google.adk.agents.invocation_context import InvocationContext
+from google.adk.events import Event
+from google.genai.types import Content, Part
+
+from config.settings import settings
+
+# 判斷綜合性問題用的關鍵字 (用完整的詞，單字「假」會誤判「假設」之類的詞)
+HR_TERMS = [
+    "特休", "年假", "請假", "休假", "病假", "事假", "婚假", "產假", "喪假", "假期", "假單",
+    "福利", "保險", "薪", "獎金", "加班", "出差", "考核", "上班時間", "工時", "wfh",
+    "遠端工作", "政策", "育兒",
+]
+IT_TERMS = [
+    "帳號", "密碼", "vpn", "權限", "email", "郵件", "信箱", "電腦", "系統",
+    "gitlab", "jira", "erp", "crm",
+]
+
+_DONE = object()
+
+
+def is_composite_question(text: str) -> bool:
+    """問題同時涉及 HR 與 IT 時返回 True"""
+    lowered = text.lower()
+    return any(t in lowered for t in HR_TERMS) and any(t in lowered for t in IT_TERMS)
+
+
+class FanOutAgent(BaseAgent):
+    """同時執行所有子代理，並把各自的事件依完成順序轉出"""
+
+    timeout_seconds: float = settings.FAN_OUT_TIMEOUT_SECONDS
+
+    def _branch_ctx(self, sub_agent: BaseAgent, ctx: InvocationContext) -> InvocationContext:
+        # 與 ParallelAgent 相同，每個子代理在自己的 branch 中執行，彼此看不到對方的事件
+        branch_ctx = ctx.model_copy()
+        suffix = f"{self.name}.{sub_agent.name}"
+        branch_ctx.branch = f"{ctx.branch}.{suffix}" if ctx.branch else suffix
+        return branch_ctx
+
+    def _notice(self, ctx: InvocationContext, text: str) -> Event:
+        return Event(
+            invocation_id=ctx.invocation_id,
+            author=self.name,
+            branch=ctx.branch,
+            content=Content(role="model", parts=[Part(text=text)]),
+        )
+
+    async def _run_async_impl(self, ctx: InvocationContext) -> AsyncGenerator[Event, None]:
+        queue: asyncio.Queue = asyncio.Queue()
+
+        async def consume(sub_agent: BaseAgent):
+            async for event in sub_agent.run_async(self._branch_ctx(sub_agent, ctx)):
+                await queue.put(event)
+
+        async def run_one(sub_agent: BaseAgent):
+            try:
+                await asyncio.wait_for(consume(sub_agent), timeout=self.timeout_seconds)
+            except asyncio.TimeoutError:
+                await queue.put(
+                    self._notice(ctx, f"（{sub_agent.name} 超過 {self.timeout_seconds:g} 秒未回應，此部分暫無結果）")
+                )
+            except Exception as e:
+                await queue.put(self._notice(ctx, f"（{sub_agent.name} 發生錯誤: {e}，此部分暫無結果）"))
+            finally:
+                await queue.put(_DONE)
+
+        tasks: List[asyncio.Task] = [
+            asyncio.create_task(run_one(sub_agent)) for sub_agent in self.sub_agents
+        ]
+        try:
+            remaining = len(tasks)
+            while remaining:
+                item = await queue.get()
+                if item is _DONE:
+                    remaining -= 1
+                    continue
+                yield item
+        finally:
+            for task in tasks:
+                task.cancel()
@@ -0,0 +1,179 @@
+"""HR 問題快速路徑：用關鍵字索引直接查表回答，不經過 LLM
+
+像「上班時間」「特休幾天」這類問題，原本要經過 協調專員 LLM → A2A → HR專員 LLM
+→ query_hr_policy → HR專員 LLM → 協調專員 LLM 好幾次模型呼叫，答案其實只是一次
+字典查詢。這裡以 HR_POLICIES 與員工手冊的鍵值 (加上別名) 建立索引，只有在
+問題單純、只對應到一個條目時才直接回答，其餘一律交給 LLM。
+"""
+
+import re
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from tools.hr_tools import (
+    HR_POLICIES,
+    get_employee_handbook,
+    hr_data_fingerprint,
+    query_hr_policy,
+    search_employee_handbook,
+)
+
+# 類別別名 (HR_POLICIES 的鍵是英文，使用者會用中文問)
+CATEGORY_ALIASES = {
+    "annual_leave": ["特休", "年假", "特別休假", "annual leave"],
+    "benefits": ["福利", "benefits"],
+    "work_hours": ["工作時間", "工時", "work hours", "working hours"],
+}
+
+# 子類別別名
+SUB_CATEGORY_ALIASES = {
+    ("work_hours", "遠端工作"): ["wfh", "在家工作", "居家辦公", "遠距"],
+    ("work_hours", "上班時間"): ["幾點上班", "幾點下班"],
+    ("benefits", "健康保險"): ["團保", "保險"],
+    ("benefits", "育兒補助"): ["育兒津貼"],
+}
+
+# 這些類別的子類別名稱 (例如「新進員工」「年資1年」) 太籠統，必須同時提到類別才採用
+SUB_CATEGORY_NEEDS_CATEGORY = {"annual_leave"}
+
+# 出現這些詞代表需要 IT 服務、個人化處理或多步驟協調，一律交給 LLM
+FALLTHROUGH_TERMS = [
+    "帳號", "密碼", "vpn", "權限", "email", "郵件", "信箱", "電腦", "系統",
+    "建立", "開通", "重設", "進度", "清單", "我叫", "我是", "幫我", "申請",
+]
+
+# 太長的訊息通常不是單純查詢
+MAX_QUESTION_LENGTH = 40
+
+Target = Tuple[str, str, Optional[str]]  # (種類, 類別/手冊關鍵字, 子類別)
+
+
+@dataclass
+class FastPathResult:
+    """快速路徑的回答"""
+
+    answer: str
+    target: Target
+    latency: float
+
+
+def _normalize(text: str) -> str:
+    return re.sub(r"[\s\?？!！。，,、:：]+", " ", text.lower()).strip()
+
+
+class FastPathRouter:
+    """以關鍵字/別名索引判斷問題是否能直接查表回答"""
+
+    def __init__(self):
+        self._index: List[Tuple[str, Target]] = []
+        # 建立索引時的 HR 資料指紋；None 表示還沒建立 (第一次查詢時才建立)
+        self._fingerprint: Optional[str] = None
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "fast_path_seconds": 0.0,
+            "llm_turns": 0,
+            "llm_seconds": 0.0,
+            "rebuilds": 0,
+        }
+
+    def build_index(self) -> None:
+        """由 HR_POLICIES 與員工手冊重建索引 (HR 資料指紋改變時由 classify 自動呼叫)"""
+        self._fingerprint = hr_data_fingerprint()
+        index: Dict[str, Target] = {}
+        for category, policy in HR_POLICIES.items():
+            for alias in CATEGORY_ALIASES.get(category, []) + [category]:
+                index[alias.lower()] = ("policy", category, None)
+            for sub_category in policy:
+                index[sub_category.lower()] = ("policy", category, sub_category)
+        for (category, sub_category), aliases in SUB_CATEGORY_ALIASES.items():
+            for alias in aliases:
+                index[alias.lower()] = ("policy", category, sub_category)
+        for keyword in get_employee_handbook():
+            index[keyword.lower()] = ("handbook", keyword, None)
+        # 長詞優先，避免「上班時間」先被「時間」之類的短詞吃掉
+        self._index = sorted(index.items(), key=lambda item: -len(item[0]))
+
+    def classify(self, text: str) -> Optional[Target]:
+        """
+        判斷問題對應的唯一條目
+
+        Returns:
+            (種類, 類別/手冊關鍵字, 子類別)，不夠確定時返回 None
+        """
+        normalized = _normalize(text)
+        if not normalized or len(normalized) > MAX_QUESTION_LENGTH:
+            return None
+        if any(term in normalized for term in FALLTHROUGH_TERMS):
+            return None
+        # HR_POLICIES 或手冊檔變動後重建索引，不沿用舊的章節標題
+        if self._fingerprint != hr_data_fingerprint():
+            if self._fingerprint is not None:
+                self._stats["rebuilds"] += 1
+            self.build_index()
+
+        remaining = normalized
+        matches = set()
+        for term, target in self._index:
+            if term in remaining:
+                matches.add(target)
+                remaining = remaining.replace(term, " ")
+        if not matches:
+            return None
+
+        # 子類別命中時，同類別的類別命中可以合併
+        sub_matches = {m for m in matches if m[2] is not None}
+        categories = {m[1] for m in matches if m[0] == "policy" and m[2] is None}
+        for kind, category, sub_category in list(sub_matches):
+            if category in SUB_CATEGORY_NEEDS_CATEGORY and category not in categories:
+                sub_matches.discard((kind, category, sub_category))
+                matches.discard((kind, category, sub_category))
+        matches -= {("policy", c, None) for c in {m[1] for m in sub_matches}}
+
+        if len(matches) != 1:
+            return None
+        return matches.pop()
+
+    def route(self, text: str) -> Optional[FastPathResult]:
+        """能直接回答時返回答案，否則返回 None (交給 LLM)"""
+        started = time.perf_counter()
+        target = self.classify(text)
+        if target is None:
+            self._stats["misses"] += 1
+            return None
+
+        kind, key, sub_category = target
+        if kind == "handbook":
+            answer = search_employee_handbook(key)
+        else:
+            answer = query_hr_policy(key, sub_category)
+            if sub_category:
+                answer = f"{sub_category}: {answer}"
+        latency = time.perf_counter() - started
+        self._stats["hits"] += 1
+        self._stats["fast_path_seconds"] += latency
+        return FastPathResult(answer=answer.strip(), target=target, latency=latency)
+
+    def record_llm_turn(self, seconds: float) -> None:
+        """記錄一次走 LLM 的耗時，用來估算快速路徑省下的時間"""
+        self._stats["llm_turns"] += 1
+        self._stats["llm_seconds"] += seconds
+
+    def get_stats(self) -> Dict:
+        """取得命中率與估計節省的延遲"""
+        stats = self._stats
+        total = stats["hits"] + stats["misses"]
+        avg_llm = stats["llm_seconds"] / stats["llm_turns"] if stats["llm_turns"] else None
+        avg_fast = stats["fast_path_seconds"] / stats["hits"] if stats["hits"] else 0.0
+        return {
+            "hits": stats["hits"],
+            "misses": stats["misses"],
+            "hit_rate": round(stats["hits"] / total, 3) if total else 0.0,
+            "index_rebuilds": stats["rebuilds"],
+            "avg_fast_path_ms": round(avg_fast * 1000, 3),
+            "avg_llm_turn_seconds": round(avg_llm, 3) if avg_llm is not None else None,
+            "estimated_seconds_saved": (
+                round(stats["hits"] * (avg_llm - avg_fast), 2) if avg_llm is not None else None
+            ),
+        }
@@ -0,0 +1,133 @@
+"""HTTP 前端的並行上限與卸載 (load shedding)
+
+每個 LLM 回合都要占用一個名額：
+    - 同時執行的回合數有上限，超過時在佇列中等待 (FIFO)
+    - 佇列已滿或等待逾時就直接拒絕 (503)，不讓等待中的請求無限堆積
+    - 同一個 session 同時只能有一個回合 (429)，避免事件交錯寫入同一個 session
+    - 模型回應配額不足 (HTTP 429 / RESOURCE_EXHAUSTED) 後冷卻一段時間，期間新的 LLM 回合
+      直接拒絕；快速路徑與快取的回答不經過這裡，仍可正常回應
+"""
+
+import asyncio
+import time
+from typing import Dict, Set
+
+from config.settings import settings
+
+
+class Overloaded(Exception):
+    """無法取得名額"""
+
+    def __init__(self, reason: str, retry_after: float, status_code: int = 503):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+        self.status_code = status_code
+
+
+def is_quota_error(error: BaseException) -> bool:
+    """模型 API 的配額或速率限制錯誤"""
+    if getattr(error, "code", None) == 429 or getattr(error, "status_code", None) == 429:
+        return True
+    text = str(error)
+    return "RESOURCE_EXHAUSTED" in text or text.startswith("429 ")
+
+
+class TurnLease:
+    """一個回合的名額；release() 可重複呼叫"""
+
+    def __init__(self, limiter: "TurnLimiter", key: str):
+        self._limiter = limiter
+        self.key = key
+        self._released = False
+
+    def release(self) -> None:
+        if not self._released:
+            self._released = True
+            self._limiter._release(self.key)
+
+
+class TurnLimiter:
+    def __init__(
+        self,
+        max_concurrent: int = settings.SERVER_MAX_CONCURRENT_TURNS,
+        max_queued: int = settings.SERVER_MAX_QUEUED_TURNS,
+        queue_timeout: float = settings.SERVER_QUEUE_TIMEOUT,
+        quota_cooldown: float = settings.SERVER_QUOTA_COOLDOWN,
+    ):
+        self._max_concurrent = max_concurrent
+        self._max_queued = max_queued
+        self._queue_timeout = queue_timeout
+        self._quota_cooldown = quota_cooldown
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self._active: Set[str] = set()
+        self._waiting = 0
+        self._cooldown_until = 0.0
+        self._stats = {
+            "accepted": 0,
+            "shed_queue_full": 0,
+            "shed_queue_timeout": 0,
+            "shed_busy_session": 0,
+            "shed_quota": 0,
+            "quota_errors": 0,
+        }
+
+    async def acquire(self, key: str) -> TurnLease:
+        """
+        取得一個回合的名額 (可能需要排隊)
+
+        Args:
+            key: session 的識別 (同一個 key 同時只能有一個回合)
+
+        Raises:
+            Overloaded: 配額冷卻中、session 已有回合在執行、佇列已滿或等待逾時
+        """
+        remaining = self._cooldown_until - time.monotonic()
+        if remaining > 0:
+            self._stats["shed_quota"] += 1
+            raise Overloaded("model_quota_exhausted", remaining)
+        if key in self._active:
+            self._stats["shed_busy_session"] += 1
+            raise Overloaded("turn_in_progress", 1.0, status_code=429)
+        # _active 包含執行中與排隊中的回合
+        if len(self._active) >= self._max_concurrent + self._max_queued:
+            self._stats["shed_queue_full"] += 1
+            raise Overloaded("queue_full", self._queue_timeout)
+
+        # 排隊期間同一個 session 的其他請求也要被擋下
+        self._active.add(key)
+        self._waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=self._queue_timeout)
+        except asyncio.TimeoutError:
+            self._active.discard(key)
+            self._stats["shed_queue_timeout"] += 1
+            raise Overloaded("queue_timeout", self._queue_timeout)
+        except BaseException:
+            self._active.discard(key)
+            raise
+        finally:
+            self._waiting -= 1
+        self._stats["accepted"] += 1
+        return TurnLease(self, key)
+
+    def _release(self, key: str) -> None:
+        self._active.discard(key)
+        self._semaphore.release()
+
+    def record_error(self, error: BaseException) -> None:
+        """回合失敗時呼叫；配額錯誤會開始冷卻"""
+        if is_quota_error(error):
+            self._stats["quota_errors"] += 1
+            self._cooldown_until = time.monotonic() + self._quota_cooldown
+
+    def get_stats(self) -> Dict:
+        stats = dict(self._stats)
+        stats.update(
+            running=len(self._active) - self._waiting,
+            waiting=self._waiting,
+            max_concurrent=self._max_concurrent,
+            max_queued=self._max_queued,
+            cooldown_seconds=round(max(self._cooldown_until - time.monotonic(), 0.0), 1),
+        )
+        return stats
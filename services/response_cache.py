@@ -0,0 +1,177 @@
+"""唯讀問題的回應快取 (LRU + TTL)
+
+新進員工常重複問相同的問題 (特休、WFH、VPN 設定…)，每次都要經過協調專員與
+遠端專員的完整 Gemini 呼叫。這裡以「正規化後的問題 + 代理名稱 + HR 資料指紋」
+為鍵快取最終回答，並記下該回合工具結果的指紋：
+    - HR_POLICIES 或員工手冊內容改變時指紋改變，舊的快取自動失效
+    - 呼叫過會異動資料的 IT 工具 (建立帳號、重設密碼…)、讀取帳號資料或入職進度的對話一律不快取
+    - 同一個問題再次存入時工具結果不同，代表回答取決於會變動的資料，刪除快取且不再存入
+    - 只快取 session 的第一個回合 (回答不會用到先前對話的上下文)
+"""
+
+import hashlib
+import json
+import re
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional, Set, Tuple
+
+from config.settings import settings
+from services import telemetry
+from tools.hr_tools import hr_data_fingerprint
+
+# 會異動帳號資料的 IT 工具
+MUTATING_IT_TOOLS = {
+    "create_email_acount",
+    "assign_system_permission",
+    "setup_vpn_access",
+    "reset_password",
+    "bulk_onboard_employees",
+}
+
+# 讀取帳號資料的 IT 工具 (結果隨帳號異動改變，且因人而異)
+ACCOUNT_READING_IT_TOOLS = {
+    "query_employee_accounts",
+    "get_account_sync_status",
+    "get_bulk_onboarding_results",
+}
+
+# 結果取決於入職進度 (會隨時間改變) 的 HR 工具
+STATEFUL_HR_TOOLS = {
+    "get_onboarding_checklist",
+    "update_onboarding_checklist",
+    "get_onboarding_progress",
+}
+
+# 問題中出現這些詞代表要求執行動作或涉及個人資料，不查也不存快取
+UNCACHEABLE_TERMS = [
+    "建立", "開通", "重設", "重置", "申請", "幫我", "我的", "我叫", "我是",
+    "進度", "清單", "完成",
+]
+
+
+def normalize_question(text: str) -> str:
+    """去除大小寫、空白與標點差異"""
+    return re.sub(r"[\s\?？!！。，,、:：~～]+", "", text.lower())
+
+
+class ResponseCache:
+    """以 OrderedDict 實作的 LRU + TTL 快取"""
+
+    def __init__(
+        self,
+        max_entries: int = settings.RESPONSE_CACHE_SIZE,
+        ttl_seconds: float = settings.RESPONSE_CACHE_TTL,
+    ):
+        self._max_entries = max_entries
+        self._ttl = ttl_seconds
+        # 快取鍵 -> (存入時間, 工具結果指紋, 回答)
+        self._entries: "OrderedDict[str, Tuple[float, str, str]]" = OrderedDict()
+        # 工具結果不固定的問題，不再存入
+        self._unstable: Set[str] = set()
+        # 第一次查詢時才計算 (匯入時不載入手冊索引)
+        self._fingerprint: Optional[str] = None
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "evictions": 0,
+            "invalidations": 0,
+            "conflicts": 0,
+        }
+
+    def _check_fingerprint(self) -> str:
+        """HR 資料變動時清空快取"""
+        fingerprint = hr_data_fingerprint()
+        if fingerprint != self._fingerprint:
+            if self._fingerprint is not None:
+                self._entries.clear()
+                self._unstable.clear()
+                self._stats["invalidations"] += 1
+            self._fingerprint = fingerprint
+        return fingerprint
+
+    @staticmethod
+    def is_cacheable_question(text: str) -> bool:
+        """要求執行動作或涉及個人資料的問題不使用快取"""
+        return not any(term in text.lower() for term in UNCACHEABLE_TERMS)
+
+    @staticmethod
+    def is_cacheable_turn(tool_names: Iterable[str]) -> bool:
+        """整個回合沒有呼叫任何會異動資料、讀取帳號資料或入職進度的工具才可快取"""
+        tool_names = set(tool_names)
+        return not (
+            MUTATING_IT_TOOLS & tool_names
+            or ACCOUNT_READING_IT_TOOLS & tool_names
+            or STATEFUL_HR_TOOLS & tool_names
+        )
+
+    @staticmethod
+    def tool_results_fingerprint(responses: Iterable[Tuple[str, Any]]) -> str:
+        """由本回合各工具的 (名稱, function_response 內容) 產生指紋"""
+        digest = hashlib.sha256()
+        for name, payload in responses:
+            digest.update(name.encode("utf-8"))
+            encoded = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+            digest.update(encoded.encode("utf-8"))
+        return digest.hexdigest()
+
+    def make_key(self, question: str, agent_name: str) -> str:
+        """由正規化問題、代理名稱與 HR 資料指紋產生快取鍵"""
+        fingerprint = self._check_fingerprint()
+        raw = "|".join([normalize_question(question), agent_name, fingerprint])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """取得快取的回答，過期或不存在時返回 None"""
+        self._check_fingerprint()
+        entry = self._entries.get(key)
+        if entry is None:
+            self._stats["misses"] += 1
+            telemetry.record_cache("response", False)
+            return None
+        stored_at, _, answer = entry
+        if time.time() - stored_at > self._ttl:
+            del self._entries[key]
+            self._stats["misses"] += 1
+            telemetry.record_cache("response", False)
+            return None
+        self._entries.move_to_end(key)
+        self._stats["hits"] += 1
+        telemetry.record_cache("response", True)
+        return answer
+
+    def put(self, key: str, answer: str, tool_fingerprint: str = "") -> None:
+        """
+        存入回答，超過容量時淘汰最久未使用的項目
+
+        同一個鍵已有快取但工具結果指紋不同時，刪除快取並且之後不再存入這個鍵。
+        """
+        if not answer or key in self._unstable:
+            return
+        entry = self._entries.get(key)
+        if entry is not None and entry[1] != tool_fingerprint:
+            del self._entries[key]
+            if len(self._unstable) >= self._max_entries:
+                self._unstable.clear()
+            self._unstable.add(key)
+            self._stats["conflicts"] += 1
+            return
+        self._entries[key] = (time.time(), tool_fingerprint, answer)
+        self._entries.move_to_end(key)
+        self._stats["stores"] += 1
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._unstable.clear()
+
+    def get_stats(self) -> Dict:
+        """取得快取命中率"""
+        stats = dict(self._stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 3) if lookups else 0.0
+        stats["entries"] = len(self._entries)
+        return stats
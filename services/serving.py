@@ -0,0 +1,167 @@
+"""A2A 服務的啟動方式 (單一程序或多個 uvicorn worker)
+
+多個 worker 時每個程序都有自己的記憶體，帳號資料必須放在共用的儲存：
+這裡設定 WEB_CONCURRENCY，worker 匯入工具時 get_account_store() 會把
+sheet 後端改成 shared (SQLite + Google Sheet)，寫入後任何 worker 都讀得到。
+
+預先載入 (--preload 或 SERVE_PRELOAD=true) 時由主程序匯入並建立好 agent 與 app，
+再 fork 出 worker 共用同一個 socket；worker 直接沿用已初始化的物件，不必各自重新匯入。
+worker 異常結束時主程序再 fork 一個補上，新 worker 同樣不必重新匯入。
+背景執行緒、Sheet 連線與寫入佇列都在 worker 的 lifespan 或第一次使用時才建立，
+主程序 fork 前不會啟動它們。
+"""
+
+import argparse
+import os
+import signal
+import socket
+import sys
+import time
+from typing import Callable, Dict, List, Optional
+
+from config.settings import settings
+
+# worker 連續在這個秒數內結束時視為啟動失敗，不再補上
+MIN_WORKER_LIFETIME = 5.0
+
+
+def serve(
+    app,
+    app_path: str,
+    port: int,
+    argv: Optional[List[str]] = None,
+    warmup: Optional[Callable[[], object]] = None,
+) -> None:
+    """
+    啟動 A2A 服務
+
+    Args:
+        app: 已建立的 ASGI app (單一程序或預先載入時直接使用)
+        app_path: app 的匯入路徑，例如 "agents.it_agent:app" (多個 worker 時由各 worker 自行匯入)
+        port: 監聽的 port
+        warmup: 預先載入時在 fork 前呼叫，先建立好 worker 共用的唯讀資料
+    """
+    parser = argparse.ArgumentParser(description="啟動 A2A 服務")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=port)
+    parser.add_argument(
+        "--workers", type=int, default=settings.WEB_CONCURRENCY, help="worker 程序數 (預設 WEB_CONCURRENCY)"
+    )
+    parser.add_argument(
+        "--preload",
+        action=argparse.BooleanOptionalAction,
+        default=settings.SERVE_PRELOAD,
+        help="主程序先載入 app 再 fork worker (預設 SERVE_PRELOAD)",
+    )
+    args = parser.parse_args(argv)
+
+    import uvicorn
+
+    if args.workers <= 1:
+        uvicorn.run(app, host=args.host, port=args.port)
+        return
+
+    preload = args.preload and hasattr(os, "fork")
+    if preload and settings.WEB_CONCURRENCY != args.workers:
+        # 帳號資料後端在匯入工具時就決定了；帶著 WEB_CONCURRENCY 重新執行一次，
+        # 讓主程序建立的就是 worker 共用的後端
+        os.environ["WEB_CONCURRENCY"] = str(args.workers)
+        sys.stdout.flush()
+        os.execv(sys.executable, [sys.executable] + sys.orig_argv[1:])
+
+    if settings.ACCOUNT_STORE == "sqlite":
+        print(f"Starting {args.workers} workers with the sqlite account store ({settings.DB_PATH})")
+    else:
+        print(f"Starting {args.workers} workers with the shared account store ({settings.DB_PATH})")
+
+    if preload:
+        if warmup is not None:
+            warmup()
+        serve_preloaded(app, args.host, args.port, args.workers)
+        return
+
+    # worker 程序繼承環境變數
+    os.environ["WEB_CONCURRENCY"] = str(args.workers)
+    uvicorn.run(app_path, host=args.host, port=args.port, workers=args.workers)
+
+
+def _bind(host: str, port: int) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.set_inheritable(True)
+    return sock
+
+
+def _run_worker(config, sock: socket.socket) -> None:
+    """在 fork 出來的 worker 中執行 uvicorn (不會返回)"""
+    import uvicorn
+
+    # 主程序的訊號處理交還給 uvicorn
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    code = 0
+    try:
+        uvicorn.Server(config).run(sockets=[sock])
+    except BaseException as e:  # noqa: BLE001  worker 內的任何錯誤都只結束這個 worker
+        print(f"Worker {os.getpid()} failed: {e}")
+        code = 1
+    finally:
+        sys.stdout.flush()
+        os._exit(code)
+
+
+def serve_preloaded(app, host: str, port: int, workers: int) -> None:
+    """
+    主程序持有 socket 並 fork 出 workers 個 worker，worker 結束時補上
+
+    收到 SIGINT 或 SIGTERM 時通知所有 worker 結束，等它們寫出剩餘的資料後返回。
+    """
+    import uvicorn
+
+    # uvicorn 的設定 (含 HTTP/WebSocket 協定實作的匯入) 也在 fork 前載入好
+    config = uvicorn.Config(app)
+    config.load()
+    sock = _bind(host, port)
+    children: Dict[int, float] = {}
+    stopping = False
+
+    def spawn() -> None:
+        pid = os.fork()
+        if pid == 0:
+            _run_worker(config, sock)
+        children[pid] = time.monotonic()
+
+    def stop(signum, frame) -> None:
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    print(f"Preloaded app, forking {workers} workers on {host}:{port} (parent pid {os.getpid()})")
+    for _ in range(workers):
+        spawn()
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        started = children.pop(pid, None)
+        if started is None or stopping:
+            continue
+        code = os.waitstatus_to_exitcode(status)
+        if time.monotonic() - started < MIN_WORKER_LIFETIME:
+            print(f"Worker {pid} exited with {code} right after starting, not restarting it")
+            continue
+        print(f"Worker {pid} exited with {code}, forking a replacement")
+        spawn()
+    sock.close()
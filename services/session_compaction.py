@@ -0,0 +1,241 @@
+"""Session 歷史壓縮：限制每個回合送給模型的對話長度
+
+對話越長，每個回合送給協調專員 (以及轉交時送給遠端專員) 的事件就越多。
+估計的 token 數超過預算時，把較舊的回合壓縮成一則「先前對話摘要」事件：
+    - 最近幾個回合原樣保留
+    - 員工姓名、部門、建立的信箱與入職檢查清單狀態從工具呼叫中擷取，
+      完整保留在摘要中，並存到 session state (onboarding_facts)
+    - 其餘的問答只留下一行重點；摘要本身也有上限，超過時捨棄最舊的重點
+    - 之後再次壓縮時，舊摘要的重點與資料會併入新的摘要 (滾動摘要)
+"""
+
+import json
+import re
+import sqlite3
+from typing import Dict, List, Optional, Tuple
+
+from google.adk.events import Event, EventActions
+from google.genai.types import Content, Part
+
+from config.settings import settings
+
+# 壓縮產生的摘要事件以此開頭，custom_metadata 也帶有 COMPACTION_METADATA_KEY
+DIGEST_HEADER = "【先前對話摘要】(較早的對話已自動濃縮，以下資料以此為準)"
+COMPACTION_METADATA_KEY = "compaction"
+
+# 擷取出的員工資料存在 session state 的這個鍵
+FACTS_STATE_KEY = "onboarding_facts"
+
+# 每則問答重點的字數上限
+QUESTION_CHARS = 60
+ANSWER_CHARS = 80
+
+_CJK = re.compile(r"[\u3000-\u9fff\uac00-\ud7af\uff00-\uffef]")
+
+# 會帶出員工資料的工具
+_CHECKLIST_TOOLS = ("get_onboarding_checklist", "update_onboarding_checklist")
+
+
+def estimate_tokens(text: str) -> int:
+    """粗估 token 數：中日韓字元約 1 個 token，其他字元約 4 個一個 token"""
+    if not text:
+        return 0
+    cjk = len(_CJK.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def event_text(event: Event) -> str:
+    """事件送給模型時的內容 (文字、工具呼叫與工具結果)"""
+    chunks = []
+    for part in (event.content.parts if event.content else None) or []:
+        if part.text:
+            chunks.append(part.text)
+        if part.function_call:
+            args = json.dumps(part.function_call.args or {}, ensure_ascii=False, default=str)
+            chunks.append(f"{part.function_call.name}({args})")
+        if part.function_response:
+            response = json.dumps(part.function_response.response or {}, ensure_ascii=False, default=str)
+            chunks.append(f"{part.function_response.name} -> {response}")
+    return "\n".join(chunks)
+
+
+def count_tokens(events: List[Event]) -> int:
+    """事件清單的估計 token 數"""
+    return sum(estimate_tokens(event_text(e)) for e in events)
+
+
+def is_digest(event: Event) -> bool:
+    return bool(event.custom_metadata and COMPACTION_METADATA_KEY in event.custom_metadata)
+
+
+def split_turns(events: List[Event]) -> List[List[Event]]:
+    """依使用者發言切成回合 (摘要事件自成一組，第一則使用者發言之前的事件併入第一組)"""
+    turns: List[List[Event]] = []
+    for event in events:
+        if not turns or event.author == "user" or is_digest(turns[-1][0]):
+            turns.append([event])
+        else:
+            turns[-1].append(event)
+    return turns
+
+
+def extract_facts(events: List[Event], facts: Optional[Dict] = None) -> Dict:
+    """
+    從工具呼叫與結果擷取員工資料 (後面的事件覆蓋前面的)
+
+    Returns:
+        {"employee_name", "dept", "email", "checklist": {項目: 狀態}}，只含有找到的欄位
+    """
+    facts = dict(facts or {})
+    for event in events:
+        for part in (event.content.parts if event.content else None) or []:
+            call, response = part.function_call, part.function_response
+            if call and call.name == "create_email_acount":
+                args = call.args or {}
+                facts.update({k: args[k] for k in ("employee_name", "dept") if args.get(k)})
+            elif call and call.name in _CHECKLIST_TOOLS and (call.args or {}).get("employee_name"):
+                facts["employee_name"] = call.args["employee_name"]
+            if not response or not isinstance(response.response, dict):
+                continue
+            result = response.response
+            if response.name == "create_email_acount" and result.get("email"):
+                facts["email"] = result["email"]
+            elif response.name in _CHECKLIST_TOOLS and isinstance(result.get("checklist"), list):
+                facts["checklist"] = {row["item"]: row["status"] for row in result["checklist"]}
+                facts.update({k: result[k] for k in ("dept", "email") if result.get(k)})
+    return facts
+
+
+def _current_checklist(employee_name: str) -> Optional[Dict[str, str]]:
+    """從入職檢查清單資料庫取得最新狀態，取不到時返回 None"""
+    from tools.checklist_store import get_checklist_store
+
+    try:
+        checklist = get_checklist_store().get(employee_name)
+    except sqlite3.Error as e:
+        print(f"Error reading onboarding checklist for compaction: {e}")
+        return None
+    if checklist is None:
+        return None
+    return {row["item"]: row["status"] for row in checklist["checklist"]}
+
+
+def summarize_turn(events: List[Event]) -> Optional[str]:
+    """把一個回合濃縮成一行：使用者問題、最後的回覆與呼叫過的工具"""
+    question, answer, tools = "", "", []
+    for event in events:
+        for part in (event.content.parts if event.content else None) or []:
+            if part.text and event.author == "user":
+                question = question or part.text
+            elif part.text:
+                answer = part.text
+            if part.function_call and part.function_call.name != "transfer_to_agent":
+                if part.function_call.name not in tools:
+                    tools.append(part.function_call.name)
+    if not question and not answer:
+        return None
+    line = f"- 使用者：{_clip(question, QUESTION_CHARS)}"
+    if answer:
+        line += f"｜{events[-1].author}：{_clip(answer, ANSWER_CHARS)}"
+    if tools:
+        line += f"｜工具：{', '.join(tools)}"
+    return line
+
+
+def _clip(text: str, limit: int) -> str:
+    text = " ".join(text.split())
+    return text if len(text) <= limit else text[:limit] + "…"
+
+
+class SessionCompactor:
+    """決定何時壓縮、保留哪些事件，並產生摘要事件"""
+
+    def __init__(
+        self,
+        token_budget: int = settings.SESSION_TOKEN_BUDGET,
+        keep_recent_turns: int = settings.SESSION_KEEP_RECENT_TURNS,
+        digest_max_tokens: int = settings.SESSION_DIGEST_MAX_TOKENS,
+    ):
+        self.token_budget = token_budget
+        self.keep_recent_turns = max(1, keep_recent_turns)
+        self.digest_max_tokens = digest_max_tokens
+
+    @property
+    def enabled(self) -> bool:
+        return self.token_budget > 0
+
+    def plan(self, events: List[Event], state: Dict) -> Optional[Tuple[int, Event]]:
+        """
+        需要壓縮時返回 (要被取代的前段事件數, 摘要事件)，否則返回 None
+
+        前段事件一定是完整的回合，工具呼叫與結果不會被拆開。
+        """
+        if not self.enabled or count_tokens(events) <= self.token_budget:
+            return None
+        turns = split_turns(events)
+        # 壓縮到只剩最近 keep_recent_turns 個回合 (舊摘要也算一組，會被併入新摘要)
+        older = turns[: max(0, len(turns) - self.keep_recent_turns)]
+        if not older or (len(older) == 1 and is_digest(older[0][0])):
+            return None
+        removed = [e for turn in older for e in turn]
+        return len(removed), self._digest_event(older, state)
+
+    def _digest_event(self, older: List[List[Event]], state: Dict) -> Event:
+        facts = dict(state.get(FACTS_STATE_KEY) or {})
+        lines: List[str] = []
+        for turn in older:
+            if is_digest(turn[0]):
+                previous = turn[0].custom_metadata[COMPACTION_METADATA_KEY]
+                facts.update(previous.get("facts") or {})
+                lines.extend(previous.get("lines") or [])
+                continue
+            facts = extract_facts(turn, facts)
+            line = summarize_turn(turn)
+            if line:
+                lines.append(line)
+        if facts.get("employee_name"):
+            facts["checklist"] = _current_checklist(facts["employee_name"]) or facts.get("checklist")
+            if not facts["checklist"]:
+                del facts["checklist"]
+
+        # 摘要超過上限時捨棄最舊的問答重點，員工資料永遠保留
+        header = self._render_facts(facts)
+        while lines and estimate_tokens("\n".join(header + lines)) > self.digest_max_tokens:
+            lines.pop(0)
+        text = "\n".join(header + (["先前的問答："] + lines if lines else []))
+
+        last = older[-1][-1]
+        compacted = sum(
+            e.custom_metadata[COMPACTION_METADATA_KEY].get("compacted_events", 1) if is_digest(e) else 1
+            for turn in older
+            for e in turn
+        )
+        return Event(
+            invocation_id=last.invocation_id,
+            author="user",
+            timestamp=last.timestamp,
+            content=Content(role="user", parts=[Part(text=text)]),
+            actions=EventActions(state_delta={FACTS_STATE_KEY: facts}),
+            custom_metadata={
+                COMPACTION_METADATA_KEY: {
+                    "facts": facts,
+                    "lines": lines,
+                    "compacted_events": compacted,
+                }
+            },
+        )
+
+    @staticmethod
+    def _render_facts(facts: Dict) -> List[str]:
+        header = [DIGEST_HEADER]
+        known = [
+            f"{label}：{facts[key]}"
+            for key, label in (("employee_name", "員工姓名"), ("dept", "部門"), ("email", "公司信箱"))
+            if facts.get(key)
+        ]
+        if known:
+            header.append("已知資料：" + "、".join(known))
+        checklist = facts.get("checklist")
+        if checklist:
+            header.append("入職檢查清單：" + "、".join(f"{item} {status}" for item, status in checklist.items()))
+        return header
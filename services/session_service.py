@@ -0,0 +1,360 @@
+"""以 SQLite 持久化的 Session 服務 (取代 InMemorySessionService)
+
+- 事件只新增不修改 (append-only)，以 (app_name, user_id, session_id, seq) 建索引
+- 最近使用的 session 保留在記憶體 LRU 快取中，超過容量就淘汰 (資料仍在資料庫)
+- 超過保留天數沒有更新的 session 會被定期清除
+- 對話超過 token 預算時，compact_session 以一則摘要事件取代較舊的回合 (見 session_compaction)
+"""
+
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from google.adk.events import Event
+from google.adk.sessions import BaseSessionService, Session
+from google.adk.sessions.base_session_service import (
+    GetSessionConfig,
+    ListSessionsResponse,
+)
+
+from config.settings import settings
+from services.session_compaction import FACTS_STATE_KEY, SessionCompactor, count_tokens
+
+# temp: 開頭的 state 只在單次呼叫中有效，不寫入資料庫
+TEMP_STATE_PREFIX = "temp:"
+
+# 清除過期 session 的間隔（秒）
+PURGE_INTERVAL_SECONDS = 3600
+
+SessionKey = Tuple[str, str, str]
+
+
+class SQLiteSessionService(BaseSessionService):
+    """SQLite 後端的 Session 服務 (WAL 模式 + LRU 快取)"""
+
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS sessions (
+            app_name TEXT NOT NULL,
+            user_id TEXT NOT NULL,
+            session_id TEXT NOT NULL,
+            state TEXT NOT NULL,
+            create_time REAL NOT NULL,
+            update_time REAL NOT NULL,
+            PRIMARY KEY (app_name, user_id, session_id)
+        );
+        CREATE INDEX IF NOT EXISTS idx_sessions_update_time ON sessions(update_time);
+        CREATE TABLE IF NOT EXISTS session_events (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            app_name TEXT NOT NULL,
+            user_id TEXT NOT NULL,
+            session_id TEXT NOT NULL,
+            event_id TEXT NOT NULL,
+            timestamp REAL NOT NULL,
+            data TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_session_events_session
+            ON session_events(app_name, user_id, session_id, seq);
+    """
+
+    def __init__(
+        self,
+        db_path: str = settings.DB_PATH,
+        cache_size: int = settings.SESSION_CACHE_SIZE,
+        retention_days: float = settings.SESSION_RETENTION_DAYS,
+        compactor: Optional[SessionCompactor] = None,
+    ):
+        self._db_path = db_path
+        self._cache_size = cache_size
+        self._retention_seconds = retention_days * 86400
+        self._cache: "OrderedDict[SessionKey, Session]" = OrderedDict()
+        self._local = threading.local()
+        self._last_purge = 0.0
+        self._compactor = compactor or SessionCompactor()
+        self._stats = {
+            "cache_hits": 0,
+            "cache_misses": 0,
+            "evictions": 0,
+            "purged_sessions": 0,
+            "compactions": 0,
+            "compacted_events": 0,
+        }
+
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn().executescript(self._SCHEMA)
+        self._purge_expired_db()
+
+    # ---- 資料庫 ----
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        # 預先載入模式 fork 出來的 worker 不能沿用主程序開的連線
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self._db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _insert_session(self, key: SessionKey, state: Dict, now: float) -> None:
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "INSERT INTO sessions (app_name, user_id, session_id, state, create_time, update_time)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (*key, json.dumps(state, ensure_ascii=False), now, now),
+            )
+
+    def _load_session(self, key: SessionKey) -> Optional[Session]:
+        conn = self._conn()
+        row = conn.execute(
+            "SELECT state, update_time FROM sessions"
+            " WHERE app_name = ? AND user_id = ? AND session_id = ?",
+            key,
+        ).fetchone()
+        if row is None:
+            return None
+        rows = conn.execute(
+            "SELECT data FROM session_events"
+            " WHERE app_name = ? AND user_id = ? AND session_id = ? ORDER BY seq",
+            key,
+        ).fetchall()
+        return Session(
+            app_name=key[0],
+            user_id=key[1],
+            id=key[2],
+            state=json.loads(row[0]),
+            events=[Event.model_validate_json(r[0]) for r in rows],
+            last_update_time=row[1],
+        )
+
+    def _insert_event(self, key: SessionKey, event: Event, state: Dict) -> None:
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "INSERT INTO session_events (app_name, user_id, session_id, event_id, timestamp, data)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (*key, event.id, event.timestamp, event.model_dump_json(exclude_none=True)),
+            )
+            conn.execute(
+                "UPDATE sessions SET state = ?, update_time = ?"
+                " WHERE app_name = ? AND user_id = ? AND session_id = ?",
+                (json.dumps(state, ensure_ascii=False), event.timestamp, *key),
+            )
+
+    def _replace_prefix(self, key: SessionKey, first_kept_id: Optional[str], digest: Event, state: Dict) -> None:
+        """以摘要事件取代 first_kept_id 之前的所有事件 (摘要沿用最早事件的序號，排序不變)"""
+        conn = self._conn()
+        with conn:
+            first_seq = conn.execute(
+                "SELECT MIN(seq) FROM session_events WHERE app_name = ? AND user_id = ? AND session_id = ?",
+                key,
+            ).fetchone()[0]
+            if first_kept_id is None:
+                conn.execute(
+                    "DELETE FROM session_events WHERE app_name = ? AND user_id = ? AND session_id = ?",
+                    key,
+                )
+            else:
+                conn.execute(
+                    "DELETE FROM session_events WHERE app_name = ? AND user_id = ? AND session_id = ?"
+                    " AND seq < (SELECT MIN(seq) FROM session_events"
+                    " WHERE app_name = ? AND user_id = ? AND session_id = ? AND event_id = ?)",
+                    (*key, *key, first_kept_id),
+                )
+            conn.execute(
+                "INSERT INTO session_events (seq, app_name, user_id, session_id, event_id, timestamp, data)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (first_seq, *key, digest.id, digest.timestamp, digest.model_dump_json(exclude_none=True)),
+            )
+            conn.execute(
+                "UPDATE sessions SET state = ? WHERE app_name = ? AND user_id = ? AND session_id = ?",
+                (json.dumps(state, ensure_ascii=False), *key),
+            )
+
+    def _delete_session(self, key: SessionKey) -> None:
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "DELETE FROM session_events WHERE app_name = ? AND user_id = ? AND session_id = ?",
+                key,
+            )
+            conn.execute(
+                "DELETE FROM sessions WHERE app_name = ? AND user_id = ? AND session_id = ?",
+                key,
+            )
+
+    def _purge_expired_db(self) -> float:
+        """刪除資料庫中超過保留期限沒有更新的 session，返回截止時間"""
+        self._last_purge = time.time()
+        if self._retention_seconds <= 0:
+            return 0.0
+        cutoff = time.time() - self._retention_seconds
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "DELETE FROM session_events WHERE (app_name, user_id, session_id) IN"
+                " (SELECT app_name, user_id, session_id FROM sessions WHERE update_time < ?)",
+                (cutoff,),
+            )
+            purged = conn.execute(
+                "DELETE FROM sessions WHERE update_time < ?", (cutoff,)
+            ).rowcount
+        self._stats["purged_sessions"] += purged
+        return cutoff
+
+    # ---- LRU 快取 ----
+
+    def _cache_put(self, key: SessionKey, session: Session) -> None:
+        self._cache[key] = session
+        self._cache.move_to_end(key)
+        while len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    async def _get_cached(self, key: SessionKey) -> Optional[Session]:
+        session = self._cache.get(key)
+        if session is not None:
+            self._cache.move_to_end(key)
+            self._stats["cache_hits"] += 1
+            return session
+        self._stats["cache_misses"] += 1
+        session = await asyncio.to_thread(self._load_session, key)
+        if session is not None:
+            self._cache_put(key, session)
+        return session
+
+    # ---- BaseSessionService ----
+
+    async def create_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        state: Optional[Dict[str, Any]] = None,
+        session_id: Optional[str] = None,
+    ) -> Session:
+        session_id = (session_id or "").strip() or str(uuid.uuid4())
+        key = (app_name, user_id, session_id)
+        state = {k: v for k, v in (state or {}).items() if not k.startswith(TEMP_STATE_PREFIX)}
+        now = time.time()
+        await asyncio.to_thread(self._insert_session, key, state, now)
+
+        session = Session(
+            app_name=app_name, user_id=user_id, id=session_id, state=state, last_update_time=now
+        )
+        self._cache_put(key, session)
+        return session.model_copy(deep=True)
+
+    async def get_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        session_id: str,
+        config: Optional[GetSessionConfig] = None,
+    ) -> Optional[Session]:
+        session = await self._get_cached((app_name, user_id, session_id))
+        if session is None:
+            return None
+
+        copied = session.model_copy(deep=True)
+        if config:
+            if config.num_recent_events:
+                copied.events = copied.events[-config.num_recent_events :]
+            if config.after_timestamp:
+                copied.events = [e for e in copied.events if e.timestamp >= config.after_timestamp]
+        return copied
+
+    async def list_sessions(self, *, app_name: str, user_id: Optional[str] = None) -> ListSessionsResponse:
+        def query() -> List[Session]:
+            sql = "SELECT user_id, session_id, state, update_time FROM sessions WHERE app_name = ?"
+            params: List[Any] = [app_name]
+            if user_id is not None:
+                sql += " AND user_id = ?"
+                params.append(user_id)
+            rows = self._conn().execute(sql + " ORDER BY update_time DESC", params).fetchall()
+            # 與 InMemorySessionService 相同，列表不含事件內容
+            return [
+                Session(app_name=app_name, user_id=r[0], id=r[1], state=json.loads(r[2]), last_update_time=r[3])
+                for r in rows
+            ]
+
+        return ListSessionsResponse(sessions=await asyncio.to_thread(query))
+
+    async def delete_session(self, *, app_name: str, user_id: str, session_id: str) -> None:
+        key = (app_name, user_id, session_id)
+        self._cache.pop(key, None)
+        await asyncio.to_thread(self._delete_session, key)
+
+    async def append_event(self, session: Session, event: Event) -> Event:
+        if event.partial:
+            return event
+        # 由基底類別更新呼叫端持有的 session (state_delta 與 events)
+        event = await super().append_event(session=session, event=event)
+
+        key = (session.app_name, session.user_id, session.id)
+        state = {k: v for k, v in session.state.items() if not k.startswith(TEMP_STATE_PREFIX)}
+        session.last_update_time = event.timestamp
+        await asyncio.to_thread(self._insert_event, key, event, state)
+
+        cached = self._cache.get(key)
+        if cached is not None:
+            cached.events.append(event.model_copy(deep=True))
+            cached.state = dict(state)
+            cached.last_update_time = event.timestamp
+            self._cache.move_to_end(key)
+
+        if time.time() - self._last_purge > PURGE_INTERVAL_SECONDS:
+            cutoff = await asyncio.to_thread(self._purge_expired_db)
+            for stale in [k for k, s in self._cache.items() if s.last_update_time < cutoff]:
+                del self._cache[stale]
+        return event
+
+    async def compact_session(self, *, app_name: str, user_id: str, session_id: str) -> Optional[Dict]:
+        """
+        在回合開始前壓縮對話：估計的 token 數超過預算時，較舊的回合改以一則摘要事件取代
+
+        Returns:
+            {"tokens_before", "tokens_after", "compacted_events"} (估計值；沒有 session 時返回 None)
+        """
+        key = (app_name, user_id, session_id)
+        session = await self._get_cached(key)
+        if session is None:
+            return None
+        tokens = count_tokens(session.events)
+        report = {"tokens_before": tokens, "tokens_after": tokens, "compacted_events": 0}
+        # 摘要會讀取入職檢查清單資料庫，不在 event loop 上執行
+        plan = await asyncio.to_thread(self._compactor.plan, session.events, session.state)
+        if plan is None:
+            return report
+
+        count, digest = plan
+        kept = session.events[count:]
+        state = {k: v for k, v in session.state.items() if not k.startswith(TEMP_STATE_PREFIX)}
+        state[FACTS_STATE_KEY] = digest.actions.state_delta[FACTS_STATE_KEY]
+        await asyncio.to_thread(self._replace_prefix, key, kept[0].id if kept else None, digest, state)
+
+        # 快取中的 session 可能在等待寫入時被淘汰，重新放回以維持一致
+        session.events = [digest] + kept
+        session.state = state
+        self._cache_put(key, session)
+        self._stats["compactions"] += 1
+        self._stats["compacted_events"] += count
+        report["tokens_after"] = count_tokens(session.events)
+        report["compacted_events"] = count
+        return report
+
+    def get_stats(self) -> Dict:
+        """取得快取統計 (命中、淘汰、清除筆數) 與壓縮次數"""
+        stats = dict(self._stats)
+        stats["cached_sessions"] = len(self._cache)
+        return stats
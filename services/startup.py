@@ -0,0 +1,202 @@
+"""啟動耗時的量測
+
+- 各進入點 (main.py、server.py、agents/hr_agent.py、agents/it_agent.py) 在主要階段結束時呼叫
+  checkpoint()，開始接收請求時呼叫 ready()：印出一行各階段耗時，並記到 /metrics 的
+  startup_seconds。第一個階段 (interpreter) 是程序啟動到匯入本模組為止
+- 以預先載入模式 fork 出來的 worker 從 fork 開始重新計時，第一個階段是 fork
+- python -m services.startup 以 -X importtime 在子程序匯入各進入點，列出匯入最久的套件與模組
+"""
+
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+from services import telemetry
+
+# 預設量測的進入點 (模組路徑)
+ENTRY_POINTS = ("main", "server", "agents.hr_agent", "agents.it_agent")
+
+STARTUP_SECONDS = telemetry.registry.gauge("startup_seconds", "Seconds spent in each startup phase")
+
+_IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def _process_age() -> Optional[float]:
+    """程序已經執行了幾秒 (由 /proc 計算，精確到約 10ms)；非 Linux 時返回 None"""
+    try:
+        with open("/proc/self/stat", "r") as f:
+            # 第 2 欄 (程式名稱) 可能有空白，從右括號之後開始數
+            fields = f.read().rsplit(")", 1)[1].split()
+        with open("/proc/uptime", "r") as f:
+            uptime = float(f.read().split()[0])
+        started = int(fields[19]) / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return None
+    return max(0.0, uptime - started)
+
+
+class StartupProfiler:
+    """記錄一個程序從啟動到開始接收請求的各階段耗時"""
+
+    def __init__(self):
+        self._last = time.perf_counter()
+        age = _process_age()
+        self._phases: List[Tuple[str, float]] = [("interpreter", age)] if age is not None else []
+        self._entry: Optional[str] = None
+        self._ready = False
+
+    def checkpoint(self, phase: str) -> float:
+        """結束一個階段，返回這個階段的秒數"""
+        now = time.perf_counter()
+        elapsed = now - self._last
+        self._last = now
+        self._phases.append((phase, elapsed))
+        return elapsed
+
+    def ready(self, entry: str) -> Dict:
+        """開始接收請求：結束最後一個階段並印出摘要 (每個程序只印一次)"""
+        if self._ready:
+            return self.report()
+        self._ready = True
+        self._entry = entry
+        self.checkpoint("serve")
+        report = self.report()
+        for phase, seconds in report["phases"].items():
+            STARTUP_SECONDS.set(seconds, entry=entry, phase=phase)
+        STARTUP_SECONDS.set(report["total_seconds"], entry=entry, phase="total")
+        phases = ", ".join(f"{phase} {seconds:.3f}s" for phase, seconds in report["phases"].items())
+        print(f"Startup ({entry}, pid {os.getpid()}): {phases}, total {report['total_seconds']:.3f}s")
+        return report
+
+    def after_fork(self) -> None:
+        """fork 出來的 worker 沿用父程序已初始化的物件，從 fork 重新計時"""
+        self._last = time.perf_counter()
+        self._phases = [("fork", 0.0)]
+        self._ready = False
+
+    def report(self) -> Dict:
+        """各階段秒數 (同名階段相加) 與總秒數"""
+        phases: Dict[str, float] = {}
+        for phase, seconds in self._phases:
+            phases[phase] = round(phases.get(phase, 0.0) + seconds, 4)
+        return {
+            "entry": self._entry,
+            "phases": phases,
+            "total_seconds": round(sum(seconds for _, seconds in self._phases), 4),
+        }
+
+
+profiler = StartupProfiler()
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=profiler.after_fork)
+
+
+def checkpoint(phase: str) -> float:
+    return profiler.checkpoint(phase)
+
+
+def ready(entry: str) -> Dict:
+    return profiler.ready(entry)
+
+
+# ---- 匯入時間報告 ----
+
+
+def parse_importtime(output: str) -> List[Dict]:
+    """解析 python -X importtime 的輸出：[{module, self_us, cumulative_us, depth}]"""
+    modules = []
+    for line in output.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if match:
+            modules.append(
+                {
+                    "module": match.group(4),
+                    "self_us": int(match.group(1)),
+                    "cumulative_us": int(match.group(2)),
+                    "depth": len(match.group(3)) // 2,
+                }
+            )
+    return modules
+
+
+def import_report(entry: str, top: int = 10) -> Dict:
+    """
+    在子程序匯入進入點，量測匯入時間
+
+    Returns:
+        {"entry", "wall_seconds", "import_seconds", "modules", "packages": [(套件, 秒)],
+         "slowest": [(模組, 累計秒)], "error"}
+    """
+    env = dict(os.environ, PYTHONWARNINGS="ignore")
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {entry}"],
+        capture_output=True,
+        text=True,
+        env=env,
+    )
+    wall = time.perf_counter() - started
+    modules = parse_importtime(result.stderr)
+
+    packages: Dict[str, int] = {}
+    for module in modules:
+        package = module["module"].split(".")[0]
+        packages[package] = packages.get(package, 0) + module["self_us"]
+    # 進入點直接匯入的模組 (深度 1) 依累計時間排序
+    slowest = sorted(
+        (m for m in modules if m["depth"] == 1), key=lambda m: -m["cumulative_us"]
+    )[:top]
+    error = None
+    if result.returncode != 0:
+        error = (result.stderr.strip().splitlines() or ["unknown error"])[-1]
+    return {
+        "entry": entry,
+        "wall_seconds": round(wall, 3),
+        "import_seconds": round(sum(m["self_us"] for m in modules) / 1e6, 3),
+        "modules": len(modules),
+        "packages": [
+            (name, round(us / 1e6, 4))
+            for name, us in sorted(packages.items(), key=lambda item: -item[1])[:top]
+        ],
+        "slowest": [(m["module"], round(m["cumulative_us"] / 1e6, 4)) for m in slowest],
+        "error": error,
+    }
+
+
+def _print_report(report: Dict) -> None:
+    print(
+        f"\n== {report['entry']}: {report['import_seconds']:.3f}s importing "
+        f"{report['modules']} modules (process {report['wall_seconds']:.3f}s)"
+    )
+    if report["error"]:
+        print(f"   import failed: {report['error']}")
+    print("   packages (self time):")
+    for name, seconds in report["packages"]:
+        print(f"     {seconds * 1000:9.1f} ms  {name}")
+    print("   slowest direct imports (cumulative):")
+    for name, seconds in report["slowest"]:
+        print(f"     {seconds * 1000:9.1f} ms  {name}")
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="量測各進入點的匯入時間")
+    parser.add_argument("entries", nargs="*", default=list(ENTRY_POINTS), help="模組路徑，例如 agents.it_agent")
+    parser.add_argument("--top", type=int, default=10, help="每個清單列出幾項")
+    parser.add_argument("--json", action="store_true", help="以 JSON 輸出")
+    args = parser.parse_args(argv)
+
+    reports = [import_report(entry, args.top) for entry in args.entries]
+    if args.json:
+        print(json.dumps(reports, ensure_ascii=False, indent=2))
+        return
+    for report in reports:
+        _print_report(report)
+
+
+if __name__ == "__main__":
+    main()
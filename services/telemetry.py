@@ -0,0 +1,518 @@
+"""追蹤 (trace span) 與 Prometheus 指標
+
+- span 以 contextvars 記錄目前所在的 span，async 與執行緒池中的工具呼叫都會接到上層 span
+- 呼叫遠端專員時在 HTTP 標頭加上 W3C traceparent，遠端服務的 TraceMiddleware 接續同一個
+  trace，一次對話從協調專員、A2A 呼叫、遠端模型到工具與 Sheet 讀寫都在同一個 trace_id 下
+- 指標以 Prometheus 文字格式由 /metrics 提供；設定 TRACE_FILE 時 span 另外寫成 JSONL 檔
+"""
+
+import contextvars
+import functools
+import json
+import os
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from config.settings import settings
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+TOKEN_BUCKETS = (10, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 25000, 50000)
+
+TRACEPARENT = "traceparent"
+
+# 沒有上層 span 時的服務名稱 (協調專員程序)
+SERVICE_NAME = "coordinator"
+
+
+# ---- 指標 ----
+
+
+def _label_key(labels: Dict[str, str]) -> Tuple[Tuple[str, str], ...]:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key: Tuple[Tuple[str, str], ...], extra: str = "") -> str:
+    parts = [
+        '%s="%s"' % (k, v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for k, v in key
+    ]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(_label_key(labels), 0.0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(key)} {value:g}")
+        return lines
+
+
+class Gauge(Counter):
+    """可增可減的數值，例如等待中的呼叫數"""
+
+    kind = "gauge"
+
+    def dec(self, amount: float = 1.0, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self._buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        # label -> [各 bucket 計數..., 總和, 次數]
+        self._values: Dict[Tuple, List[float]] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            data = self._values.get(key)
+            if data is None:
+                data = self._values[key] = [0.0] * (len(self._buckets) + 2)
+            for i, bound in enumerate(self._buckets):
+                if value <= bound:
+                    data[i] += 1
+            data[-2] += value
+            data[-1] += 1
+
+    def count(self, **labels) -> int:
+        data = self._values.get(_label_key(labels))
+        return int(data[-1]) if data else 0
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, data in sorted(self._values.items()):
+                for bound, count in zip(self._buckets, data):
+                    bucket = _format_labels(key, 'le="%g"' % bound)
+                    lines.append(f"{self.name}_bucket{bucket} {count:g}")
+                bucket = _format_labels(key, 'le="+Inf"')
+                lines.append(f"{self.name}_bucket{bucket} {data[-1]:g}")
+                lines.append(f"{self.name}_sum{_format_labels(key)} {data[-2]:.6f}")
+                lines.append(f"{self.name}_count{_format_labels(key)} {data[-1]:g}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name: str, help_text: str, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help_text, **kwargs)
+            return metric
+
+    def counter(self, name: str, help_text: str) -> Counter:
+        return self._get(Counter, name, help_text)
+
+    def gauge(self, name: str, help_text: str) -> Gauge:
+        return self._get(Gauge, name, help_text)
+
+    def histogram(self, name: str, help_text: str, buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._get(Histogram, name, help_text, buckets=buckets)
+
+    def render(self) -> str:
+        """Prometheus 文字格式"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+TOOL_LATENCY = registry.histogram("tool_latency_seconds", "Tool function latency")
+TOOL_ERRORS = registry.counter("tool_errors_total", "Tool functions that raised")
+SHEET_LATENCY = registry.histogram("sheet_api_seconds", "Google Sheets API call latency")
+SHEET_ERRORS = registry.counter("sheet_api_errors_total", "Google Sheets API calls that failed")
+CACHE_REQUESTS = registry.counter("cache_requests_total", "Cache lookups by cache and result")
+MODEL_LATENCY = registry.histogram("model_latency_seconds", "Model call latency per agent")
+MODEL_TOKENS = registry.histogram("model_tokens", "Tokens per model call", buckets=TOKEN_BUCKETS)
+TOKENS_TOTAL = registry.counter("model_tokens_total", "Tokens used per agent")
+A2A_LATENCY = registry.histogram("a2a_request_seconds", "Outgoing A2A request latency")
+HTTP_LATENCY = registry.histogram("http_request_seconds", "Incoming HTTP request latency")
+SESSION_TOKENS = registry.histogram(
+    "session_history_tokens", "Estimated session history tokens per turn", buckets=TOKEN_BUCKETS
+)
+
+
+def record_cache(cache: str, hit: bool) -> None:
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+# ---- 追蹤 ----
+
+
+class Span:
+    """一段計時的操作"""
+
+    __slots__ = (
+        "name", "service", "trace_id", "span_id", "parent_id", "attributes", "start", "duration", "error"
+    )
+
+    def __init__(self, name: str, parent: Optional["Span"] = None, trace_id: Optional[str] = None,
+                 parent_id: Optional[str] = None, service: Optional[str] = None, **attributes):
+        self.name = name
+        # 服務名稱沿用上層 span；伺服器端的根 span 由 TraceMiddleware 指定
+        self.service = service or (parent.service if parent else SERVICE_NAME)
+        self.trace_id = parent.trace_id if parent else (trace_id or secrets.token_hex(16))
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent.span_id if parent else parent_id
+        self.attributes = attributes
+        self.start = time.time()
+        self.duration: Optional[float] = None
+        self.error: Optional[str] = None
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def finish(self, error: Optional[BaseException] = None) -> float:
+        self.duration = time.time() - self.start
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}"
+        if _exporter is not None:
+            _exporter.export(self)
+        return self.duration
+
+    def to_dict(self) -> Dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "service": self.service,
+            "start": self.start,
+            "duration_ms": round((self.duration or 0.0) * 1000, 3),
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("current_span", default=None)
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def parse_traceparent(value: Optional[str]) -> Optional[Tuple[str, str]]:
+    """解析 W3C traceparent，返回 (trace_id, parent span_id)"""
+    if not value:
+        return None
+    parts = value.strip().split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    return parts[1], parts[2]
+
+
+@contextmanager
+def span(
+    name: str, traceparent: Optional[str] = None, service: Optional[str] = None, **attributes
+) -> Iterator[Span]:
+    """
+    開始一個 span 並設為目前的 span
+
+    Args:
+        name: 操作名稱，例如 "tool create_email_acount"
+        traceparent: 遠端傳來的 W3C traceparent (伺服器端使用)，沒有時接續目前的 span
+        service: 服務名稱，預設沿用上層 span
+    """
+    remote = parse_traceparent(traceparent)
+    if remote is not None:
+        current = Span(name, trace_id=remote[0], parent_id=remote[1], service=service, **attributes)
+    else:
+        current = Span(name, parent=_current_span.get(), service=service, **attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        _reset_current(token)
+        current.finish(e)
+        raise
+    _reset_current(token)
+    current.finish()
+
+
+def _reset_current(token: contextvars.Token) -> None:
+    """還原目前的 span；在其他 Context 中結束時 (例如 async generator 被別的 task 關閉) 略過"""
+    try:
+        _current_span.reset(token)
+    except ValueError:
+        pass
+
+
+def start_span(name: str, **attributes) -> Span:
+    """
+    開始一個 span，但不設為目前的 span
+
+    需要跨越 yield 的 span (async generator) 用這個開始，只在每一步以 use_span() 設為
+    目前的 span，最後自行呼叫 finish()。
+    """
+    return Span(name, parent=_current_span.get(), **attributes)
+
+
+@contextmanager
+def use_span(current: Span) -> Iterator[Span]:
+    """在這個區塊內把 current 設為目前的 span (不會結束它)"""
+    token = _current_span.set(current)
+    try:
+        yield current
+    finally:
+        _reset_current(token)
+
+
+def timed(histogram: Histogram, errors: Optional[Counter] = None, span_prefix: str = "", **labels) -> Callable:
+    """
+    計時裝飾器：記錄到 histogram 並建立 span
+
+    保留原函式的名稱、說明與參數簽章，可直接裝飾交給 ADK 的工具函式。
+    """
+
+    def decorator(func: Callable) -> Callable:
+        label_values = labels or {"tool": func.__name__}
+        span_name = f"{span_prefix}{func.__name__}"
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                with span(span_name, **label_values):
+                    return func(*args, **kwargs)
+            except Exception:
+                if errors is not None:
+                    errors.inc(**label_values)
+                raise
+            finally:
+                histogram.observe(time.perf_counter() - started, **label_values)
+
+        return wrapper
+
+    return decorator
+
+
+def timed_tool(func: Callable) -> Callable:
+    """工具函式的計時裝飾器"""
+    return timed(TOOL_LATENCY, TOOL_ERRORS, span_prefix="tool ")(func)
+
+
+# ---- 模型呼叫 (ADK callbacks) ----
+
+_model_started: Dict[Tuple[str, str], Tuple[float, Span]] = {}
+_model_started_lock = threading.Lock()
+
+# 超過這個秒數仍未結束的模型呼叫視為已中斷 (例如請求被取消，沒有任何 callback)
+STALE_MODEL_CALL_SECONDS = 600.0
+
+
+def _prune_model_calls(now: float) -> None:
+    """丟棄已中斷的模型呼叫 (呼叫端需持有鎖)"""
+    stale = [
+        key for key, (started, _) in _model_started.items() if now - started > STALE_MODEL_CALL_SECONDS
+    ]
+    for key in stale:
+        del _model_started[key]
+
+
+def before_model(callback_context, llm_request):
+    """LlmAgent.before_model_callback：開始模型呼叫的 span"""
+    key = (callback_context.invocation_id, callback_context.agent_name)
+    current = Span(f"model {callback_context.agent_name}", parent=_current_span.get(),
+                   agent=callback_context.agent_name)
+    now = time.perf_counter()
+    with _model_started_lock:
+        _prune_model_calls(now)
+        _model_started[key] = (now, current)
+    return None
+
+
+def after_model(callback_context, llm_response):
+    """LlmAgent.after_model_callback：記錄模型延遲與 token 數"""
+    agent = callback_context.agent_name
+    with _model_started_lock:
+        started = _model_started.pop((callback_context.invocation_id, agent), None)
+    if started is not None:
+        MODEL_LATENCY.observe(time.perf_counter() - started[0], agent=agent)
+        usage = llm_response.usage_metadata
+        if usage is not None:
+            started[1].attributes.update(
+                prompt_tokens=usage.prompt_token_count, output_tokens=usage.candidates_token_count
+            )
+        started[1].finish()
+    usage = llm_response.usage_metadata
+    if usage is not None:
+        for kind, count in (("prompt", usage.prompt_token_count), ("output", usage.candidates_token_count)):
+            if count:
+                TOKENS_TOTAL.inc(count, agent=agent, kind=kind)
+                MODEL_TOKENS.observe(count, agent=agent, kind=kind)
+    return None
+
+
+def on_model_error(callback_context, llm_request, error):
+    """LlmAgent.on_model_error_callback：模型呼叫失敗時結束 span (例外照常往上拋)"""
+    agent = callback_context.agent_name
+    with _model_started_lock:
+        started = _model_started.pop((callback_context.invocation_id, agent), None)
+    if started is not None:
+        MODEL_LATENCY.observe(time.perf_counter() - started[0], agent=agent)
+        started[1].finish(error)
+    return None
+
+
+def instrument_agent(agent) -> None:
+    """為 LlmAgent 加上模型延遲與 token 數的 callbacks"""
+    agent.before_model_callback = before_model
+    agent.after_model_callback = after_model
+    agent.on_model_error_callback = on_model_error
+
+
+# ---- HTTP ----
+
+
+async def on_a2a_request(request) -> None:
+    """httpx 的 request hook：開始 A2A 呼叫的 span 並加上 traceparent 標頭"""
+    current = Span(f"a2a {request.method} {request.url.host}:{request.url.port}{request.url.path}",
+                   parent=_current_span.get())
+    request.headers[TRACEPARENT] = current.traceparent
+    request.extensions["telemetry_span"] = current
+
+
+async def on_a2a_response(response) -> None:
+    """httpx 的 response hook：結束 A2A 呼叫的 span"""
+    current = response.request.extensions.get("telemetry_span")
+    if current is not None:
+        current.attributes["status"] = response.status_code
+        duration = current.finish()
+        A2A_LATENCY.observe(duration, target=f"{response.request.url.host}:{response.request.url.port}")
+
+
+def route_template(routes: Sequence, scope) -> str:
+    """請求對應的路由樣板 (例如 /tasks/{task_id})，沒有符合的路由時返回 "other"，避免標籤無限增加"""
+    from starlette.routing import Match
+
+    for route in routes:
+        match, _ = route.matches(scope)
+        if match != Match.NONE:
+            return getattr(route, "path", "other")
+    return "other"
+
+
+class TraceMiddleware:
+    """ASGI middleware：接續呼叫端的 traceparent，並記錄每個請求的延遲 (依路由樣板分類)"""
+
+    def __init__(self, app, service: str, routes: Sequence = ()):
+        self.app = app
+        self.service = service
+        # app.routes 本身 (之後加入的路由也看得到)
+        self.routes = routes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope.get("headers") or [])
+        traceparent = headers.get(TRACEPARENT.encode(), b"").decode() or None
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        path = scope.get("path", "")
+        # 路由會改寫 scope (例如 Mount 的 root_path)，先比對好樣板
+        template = route_template(self.routes, scope)
+        try:
+            with span(f"http {scope.get('method')} {path}", traceparent=traceparent, service=self.service):
+                await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_LATENCY.observe(time.perf_counter() - started, service=self.service,
+                                 path=template, status=status["code"])
+
+
+async def metrics_endpoint(request):
+    """/metrics：Prometheus 文字格式"""
+    from starlette.responses import PlainTextResponse
+
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+
+def instrument_app(app, service: str) -> None:
+    """為 to_a2a 產生的 app 加上 /metrics 與追蹤 middleware"""
+    app.add_route("/metrics", metrics_endpoint, methods=["GET"])
+    app.add_middleware(TraceMiddleware, service=service, routes=app.routes)
+
+
+# ---- 匯出 ----
+
+
+class FileExporter:
+    """把結束的 span 以 JSONL 附加到檔案 (供離線分析)"""
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def export(self, finished: Span) -> None:
+        line = json.dumps(finished.to_dict(), ensure_ascii=False, default=str) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+
+
+_exporter: Optional[FileExporter] = FileExporter(settings.TRACE_FILE) if settings.TRACE_FILE else None
+
+
+def write_metrics_file(path: str = settings.METRICS_FILE) -> None:
+    """把目前的指標寫成 Prometheus 文字檔 (沒有 HTTP 服務的程序使用，例如協調專員)"""
+    if not path:
+        return
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(registry.render())
+    os.replace(tmp_path, path)
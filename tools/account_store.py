@@ -0,0 +1,910 @@
+"""員工帳號資料存取層
+
+所有 IT 工具都透過 AccountStore 讀寫帳號，後端可用 ACCOUNT_STORE 環境變數切換:
+    - "sheet"  (預設) 記憶體快取 + Google Sheet，新增與異動經寫入佇列同步 (異動依列號索引就地更新)
+    - "sqlite" 本地 SQLite (WAL 模式)，寫入即持久化，適合測試與效能量測
+    - "shared" SQLite + Google Sheet，多個 worker 程序共用同一份帳號資料 (WEB_CONCURRENCY > 1)
+各後端都提供 email / username / 部門 / 系統權限 的索引查詢，不需掃描整份名冊；
+query() 依條件分頁查詢，只返回指定欄位 (不含密碼)。
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_left, bisect_right, insort
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from config.settings import settings
+from tools.roster_sync import RosterCache, account_to_row, changed_columns
+from tools.sheet_writer import get_write_queue
+
+# 模組載入時間，用來計算冷啟動到資料可用的耗時
+_IMPORTED_AT = time.perf_counter()
+
+# query() 可以返回的欄位 (密碼永遠不返回) 與每頁筆數上限
+QUERY_FIELDS = ("email", "username", "employee_name", "dept", "status", "permissions", "vpn_enabled")
+QUERY_MAX_LIMIT = 100
+
+# 使用者名稱前綴查詢的上界 (前綴後面接最大的字元)
+_PREFIX_END = "\U0010ffff"
+
+# 不寫進本地快照的欄位 (快照是明文檔案)
+SNAPSHOT_EXCLUDED_FIELDS = ("password",)
+
+
+def _updated_account(account: Dict, fields: Dict) -> Dict:
+    """套用欄位異動並把 version 加一 (並行異動時用來確認每次更新都套用在最新的資料上)"""
+    updated = _copy_account({**account, **fields})
+    updated["version"] = int(account.get("version") or 0) + 1
+    return updated
+
+
+def _copy_account(account: Dict) -> Dict:
+    """複製帳號資料，避免呼叫端直接改到快取而漏更新索引"""
+    copied = dict(account)
+    copied["permissions"] = list(account.get("permissions") or [])
+    return copied
+
+
+def _project(account: Dict, fields: Sequence[str]) -> Dict:
+    """只取出指定欄位 (fields 需為 QUERY_FIELDS 的子集)"""
+    projected = {}
+    for field in fields:
+        if field == "permissions":
+            projected[field] = list(account.get("permissions") or [])
+        elif field == "vpn_enabled":
+            projected[field] = bool(account.get("vpn_enabled"))
+        else:
+            projected[field] = account.get(field)
+    return projected
+
+
+def _enqueue_row_update(account: Dict, fields: Dict) -> str:
+    """把帳號有異動且存在於 Sheet 的欄位排入寫入佇列，返回同步狀態 (沒有 Sheet 欄位異動時為 "synced")"""
+    values = changed_columns(account, fields)
+    if not values:
+        return "synced"
+    try:
+        return get_write_queue().enqueue_row_update(account["email"], values)
+    except Exception as e:
+        print(f"Error queueing write to Google Sheet: {e}")
+        return "failed"
+
+
+class AccountStore(ABC):
+    """帳號資料存取介面"""
+
+    backend = ""
+
+    @abstractmethod
+    def get(self, email: str) -> Optional[Dict]:
+        """依 email 取得帳號，不存在時返回 None"""
+
+    @abstractmethod
+    def create(self, account: Dict) -> str:
+        """新增 (或覆寫) 帳號，返回同步狀態"""
+
+    @abstractmethod
+    def update(self, email: str, **fields) -> Optional[Dict]:
+        """
+        更新帳號欄位 (讀-改-寫為原子操作，version 加一)
+
+        Returns:
+            更新後的帳號；帳號不存在時返回 None
+        """
+
+    def create_many(self, accounts: List[Dict]) -> str:
+        """一次新增多筆帳號，返回同步狀態"""
+        status = "synced"
+        for account in accounts:
+            status = self.create(account)
+        return status
+
+    def update_many(self, updates: Iterable[Tuple[str, Dict]]) -> Dict[str, str]:
+        """
+        依序更新多筆帳號
+
+        Args:
+            updates: (email, 欄位異動) 的序列
+
+        Returns:
+            email -> 同步狀態 (不存在的帳號不列入)
+        """
+        statuses = {}
+        for email, fields in updates:
+            if self.update(email, **fields) is not None:
+                statuses[email] = "synced"
+        return statuses
+
+    @abstractmethod
+    def find_by_username(self, username: str) -> List[Dict]:
+        """依使用者名稱查詢"""
+
+    @abstractmethod
+    def find_by_department(self, dept: str) -> List[Dict]:
+        """依部門查詢"""
+
+    @abstractmethod
+    def find_by_permission(self, system: str) -> List[Dict]:
+        """查詢擁有某系統權限的所有帳號，例如 "GitLab" """
+
+    @abstractmethod
+    def query(
+        self,
+        email: Optional[str] = None,
+        username_prefix: Optional[str] = None,
+        dept: Optional[str] = None,
+        permission: Optional[str] = None,
+        vpn_enabled: Optional[bool] = None,
+        after: Optional[str] = None,
+        limit: int = 20,
+        fields: Sequence[str] = QUERY_FIELDS,
+    ) -> Tuple[List[Dict], Optional[str]]:
+        """
+        依條件查詢帳號 (條件之間為 AND)，依 email 排序分頁
+
+        Args:
+            after: 分頁游標，只返回 email 大於此值的帳號 (上一頁的下一頁游標)
+            limit: 每頁筆數
+            fields: 返回的欄位 (QUERY_FIELDS 的子集)
+
+        Returns:
+            (帳號清單, 下一頁游標；沒有下一頁時為 None)
+        """
+
+    @abstractmethod
+    def all(self) -> Dict[str, Dict]:
+        """取得全部帳號 (email -> 帳號資料)"""
+
+    @abstractmethod
+    def count(self) -> int:
+        """帳號總數"""
+
+    def __contains__(self, email: str) -> bool:
+        return self.get(email) is not None
+
+    def sync_status(self, email: str) -> Optional[str]:
+        """帳號異動的同步狀態，帳號不存在時返回 None"""
+        return "synced" if email in self else None
+
+    def start_loading(self) -> Optional[Future]:
+        """開始 (背景) 載入資料；不需要載入的後端不做事"""
+        return None
+
+    def wait_ready(self, email: Optional[str] = None) -> str:
+        """等待資料可用，返回資料來源"""
+        return self.backend
+
+    def get_status(self) -> Dict:
+        """取得載入狀態（供 readiness 檢查使用）"""
+        return {"backend": self.backend, "state": "ready", "ready": True, "accounts": self.count()}
+
+
+class _AccountIndex:
+    """
+    記憶體中的二級索引：username / 部門 / 系統權限 -> email 集合
+
+    另外維護排序好的 email 清單 (分頁) 與 (username, email) 清單 (前綴查詢用 bisect)，
+    以及已開通 VPN 的 email 集合與排序好的未開通 VPN email 清單。
+    """
+
+    def __init__(self):
+        self.by_username: Dict[str, Set[str]] = {}
+        self.by_department: Dict[str, Set[str]] = {}
+        self.by_permission: Dict[str, Set[str]] = {}
+        self.emails: List[str] = []
+        self.usernames: List[Tuple[str, str]] = []
+        self.vpn_enabled: Set[str] = set()
+        self.vpn_disabled: List[str] = []
+
+    @staticmethod
+    def _keys(account: Dict):
+        yield "by_username", [account.get("username")]
+        yield "by_department", [account.get("dept")]
+        yield "by_permission", account.get("permissions") or []
+
+    def add(self, account: Dict) -> None:
+        email = account["email"]
+        for name, keys in self._keys(account):
+            index = getattr(self, name)
+            for key in keys:
+                if key:
+                    index.setdefault(key, set()).add(email)
+        insort(self.emails, email)
+        if account.get("username"):
+            insort(self.usernames, (account["username"], email))
+        if account.get("vpn_enabled"):
+            self.vpn_enabled.add(email)
+        else:
+            insort(self.vpn_disabled, email)
+
+    def remove(self, account: Dict) -> None:
+        email = account["email"]
+        for name, keys in self._keys(account):
+            index = getattr(self, name)
+            for key in keys:
+                emails = index.get(key)
+                if emails is not None:
+                    emails.discard(email)
+                    if not emails:
+                        del index[key]
+        self._discard(self.emails, email)
+        if account.get("username"):
+            self._discard(self.usernames, (account["username"], email))
+        if account.get("vpn_enabled"):
+            self.vpn_enabled.discard(email)
+        else:
+            self._discard(self.vpn_disabled, email)
+
+    @staticmethod
+    def _discard(ordered: List, item) -> None:
+        i = bisect_left(ordered, item)
+        if i < len(ordered) and ordered[i] == item:
+            del ordered[i]
+
+    def select(
+        self,
+        email: Optional[str],
+        username_prefix: Optional[str],
+        dept: Optional[str],
+        permission: Optional[str],
+        vpn_enabled: Optional[bool],
+    ) -> Optional[Set[str]]:
+        """以索引找出符合條件的 email 集合；沒有可用索引的條件時返回 None (依序掃描)"""
+        candidates: List[Set[str]] = []
+        if email is not None:
+            candidates.append({email})
+        if username_prefix:
+            lo = bisect_left(self.usernames, (username_prefix,))
+            hi = bisect_left(self.usernames, (username_prefix + _PREFIX_END,))
+            candidates.append({e for _, e in self.usernames[lo:hi]})
+        if dept is not None:
+            candidates.append(self.by_department.get(dept, set()))
+        if permission is not None:
+            candidates.append(self.by_permission.get(permission, set()))
+        if vpn_enabled:
+            candidates.append(self.vpn_enabled)
+        if not candidates:
+            return None
+        candidates.sort(key=len)
+        return set(candidates[0]).intersection(*candidates[1:])
+
+
+class SheetAccountStore(AccountStore):
+    """
+    Google Sheet 後端
+
+    匯入時不做網路 I/O：start_loading() 先讀本地快照，再由背景執行緒從 Sheet
+    載入並合併；之後由 RosterCache 依 TTL 增量同步。新增帳號排入寫入佇列。
+    """
+
+    backend = "sheet"
+
+    def __init__(self, snapshot_path: str = settings.EMPLOYEE_SNAPSHOT_PATH):
+        self._snapshot_path = snapshot_path
+        self._lock = threading.RLock()
+        self.accounts: Dict[str, Dict] = {}
+        self._index = _AccountIndex()
+        # 本程序內建立或修改過的帳號，從 Sheet 同步時不覆蓋
+        self._local_changes: Set[str] = set()
+        self.roster = RosterCache(self._merge)
+
+        # 背景載入狀態: idle -> loading -> ready / failed
+        self._load_state = {
+            "state": "idle",
+            "source": None,
+            "load_seconds": None,
+            "cold_start_seconds": None,
+            "error": None,
+        }
+        self._load_lock = threading.Lock()
+        self._load_future: Optional[Future] = None
+
+    # ---- 快取與索引 ----
+
+    def _set(self, account: Dict) -> None:
+        """寫入快取並更新索引（呼叫端需持有鎖）"""
+        old = self.accounts.get(account["email"])
+        if old is not None:
+            self._index.remove(old)
+        self.accounts[account["email"]] = account
+        self._index.add(account)
+
+    def _merge(self, accounts: Dict[str, Dict]) -> None:
+        """合併從 Sheet 讀到的帳號 (本程序修改過的帳號不覆蓋)"""
+        with self._lock:
+            for email, account in accounts.items():
+                if email not in self._local_changes:
+                    self._set(account)
+
+    def _lookup(self, index: Dict[str, Set[str]], key: str) -> List[Dict]:
+        with self._lock:
+            return [_copy_account(self.accounts[e]) for e in sorted(index.get(key, ()))]
+
+    def get(self, email: str) -> Optional[Dict]:
+        with self._lock:
+            account = self.accounts.get(email)
+            return _copy_account(account) if account is not None else None
+
+    def create(self, account: Dict) -> str:
+        with self._lock:
+            self._set(_copy_account(account))
+            self._local_changes.add(account["email"])
+        try:
+            return get_write_queue().enqueue_append(account["email"], account_to_row(account))
+        except Exception as e:
+            print(f"Error queueing write to Google Sheet: {e}")
+            return "failed"
+
+    def create_many(self, accounts: List[Dict]) -> str:
+        """更新記憶體後整批排入寫入佇列 (同一次 spool 寫入)"""
+        if not accounts:
+            return "synced"
+        with self._lock:
+            for account in accounts:
+                self._set(_copy_account(account))
+                self._local_changes.add(account["email"])
+        try:
+            return get_write_queue().enqueue_append_many(
+                (account["email"], account_to_row(account)) for account in accounts
+            )
+        except Exception as e:
+            print(f"Error queueing write to Google Sheet: {e}")
+            return "failed"
+
+    def update(self, email: str, **fields) -> Optional[Dict]:
+        updated = self._update_cached(email, fields)
+        if updated is None:
+            return None
+        _enqueue_row_update(updated, fields)
+        return _copy_account(updated)
+
+    def update_many(self, updates: Iterable[Tuple[str, Dict]]) -> Dict[str, str]:
+        statuses = {}
+        for email, fields in updates:
+            updated = self._update_cached(email, fields)
+            if updated is not None:
+                statuses[email] = _enqueue_row_update(updated, fields)
+        return statuses
+
+    def _update_cached(self, email: str, fields: Dict) -> Optional[Dict]:
+        """先更新記憶體 (之後由呼叫端把有異動的欄位排入寫入佇列，寫出時依列號索引就地更新)"""
+        with self._lock:
+            account = self.accounts.get(email)
+            if account is None:
+                return None
+            updated = _updated_account(account, fields)
+            self._set(updated)
+            self._local_changes.add(email)
+        return updated
+
+    def find_by_username(self, username: str) -> List[Dict]:
+        return self._lookup(self._index.by_username, username)
+
+    def find_by_department(self, dept: str) -> List[Dict]:
+        return self._lookup(self._index.by_department, dept)
+
+    def find_by_permission(self, system: str) -> List[Dict]:
+        return self._lookup(self._index.by_permission, system)
+
+    def query(
+        self,
+        email: Optional[str] = None,
+        username_prefix: Optional[str] = None,
+        dept: Optional[str] = None,
+        permission: Optional[str] = None,
+        vpn_enabled: Optional[bool] = None,
+        after: Optional[str] = None,
+        limit: int = 20,
+        fields: Sequence[str] = QUERY_FIELDS,
+    ) -> Tuple[List[Dict], Optional[str]]:
+        with self._lock:
+            matched = self._index.select(email, username_prefix, dept, permission, vpn_enabled)
+            if matched is not None:
+                ordered = sorted(matched)
+            elif vpn_enabled is False:
+                # 只篩選未開通 VPN：直接在排序好的清單上分頁
+                ordered = self._index.vpn_disabled
+            else:
+                ordered = self._index.emails
+            start = bisect_right(ordered, after) if after else 0
+            results: List[Dict] = []
+            last_email = None
+            for i in range(start, len(ordered)):
+                candidate = ordered[i]
+                account = self.accounts.get(candidate)
+                if account is None or (vpn_enabled is False and account.get("vpn_enabled")):
+                    continue
+                if len(results) == limit:
+                    # 還有下一筆符合的帳號，游標為本頁最後一筆的 email
+                    return results, last_email
+                results.append(_project(account, fields))
+                last_email = candidate
+            return results, None
+
+    def all(self) -> Dict[str, Dict]:
+        with self._lock:
+            return {email: _copy_account(a) for email, a in self.accounts.items()}
+
+    def count(self) -> int:
+        return len(self.accounts)
+
+    def sync_status(self, email: str) -> Optional[str]:
+        status = get_write_queue().get_status(email)
+        if status is None and email in self.accounts:
+            # 從 Sheet 載入的帳號
+            return "synced"
+        return status
+
+    # ---- 載入 ----
+
+    def _load_snapshot(self) -> int:
+        """從本地快照檔讀入員工資料，返回讀入筆數"""
+        if not os.path.exists(self._snapshot_path):
+            return 0
+        try:
+            with open(self._snapshot_path, "r", encoding="utf-8") as f:
+                snapshot = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"Error reading employee snapshot: {e}")
+            return 0
+        with self._lock:
+            for email, account in snapshot.items():
+                if email not in self.accounts:
+                    self._set(account)
+        self._load_state["source"] = "snapshot"
+        return len(snapshot)
+
+    def _save_snapshot(self, accounts: Dict) -> None:
+        """將最近一次從 Sheet 載入的資料寫成本地快照（不含密碼；先寫暫存檔再取代）"""
+        snapshot = {
+            email: {k: v for k, v in account.items() if k not in SNAPSHOT_EXCLUDED_FIELDS}
+            for email, account in accounts.items()
+        }
+        try:
+            directory = os.path.dirname(self._snapshot_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp_path = self._snapshot_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(snapshot, f, ensure_ascii=False)
+            os.replace(tmp_path, self._snapshot_path)
+        except OSError as e:
+            print(f"Error writing employee snapshot: {e}")
+
+    def load_from_sheet(self) -> Dict:
+        """從 Google Sheet 載入全部員工資料 (整表同步)；讀取失敗時拋出例外"""
+        return self.roster.refresh(full=True)
+
+    def _background_load(self) -> int:
+        started = time.perf_counter()
+        try:
+            accounts = self.load_from_sheet()
+        except Exception as e:
+            # 繼續使用本地快照 (可能沒有任何資料)，/ready 回應 503
+            self._load_state.update(state="failed", source="snapshot", error=str(e))
+            print(f"Error loading data from Google Sheet: {e}")
+            raise
+
+        if accounts:
+            self._save_snapshot(accounts)
+
+        finished = time.perf_counter()
+        self._load_state.update(
+            state="ready",
+            source="sheet",
+            load_seconds=round(finished - started, 3),
+            cold_start_seconds=round(finished - _IMPORTED_AT, 3),
+        )
+        print(
+            f"Employee data ready: {self.count()} accounts, "
+            f"sheet load {self._load_state['load_seconds']}s, "
+            f"cold start {self._load_state['cold_start_seconds']}s"
+        )
+        return len(accounts)
+
+    def start_loading(self) -> Future:
+        """
+        在背景開始載入員工資料（只會啟動一次）
+
+        先同步讀入本地快照，讓工具在 Sheet 載入完成前也有資料可用。
+        """
+        with self._load_lock:
+            if self._load_future is not None:
+                return self._load_future
+            self._load_snapshot()
+            self._load_state["state"] = "loading"
+            future: Future = Future()
+
+            def run():
+                try:
+                    future.set_result(self._background_load())
+                except Exception as e:
+                    future.set_exception(e)
+
+            threading.Thread(target=run, name="employee-data-loader", daemon=True).start()
+            self._load_future = future
+            return future
+
+    def wait_ready(
+        self, email: Optional[str] = None, timeout: float = settings.EMPLOYEE_LOAD_TIMEOUT
+    ) -> str:
+        """
+        等待背景載入完成，最多等 timeout 秒
+
+        Args:
+            email: 要查詢的帳號；若不在快取中且名冊已超過 TTL，先增量同步一次
+            timeout: 最長等待秒數
+
+        Returns:
+            "sheet" (已載入最新資料) 或 "snapshot" (逾時或失敗，使用本地快照)
+        """
+        future = self.start_loading()
+        try:
+            future.result(timeout=timeout)
+        except FutureTimeoutError:
+            return "snapshot"
+        except Exception:
+            return "snapshot"
+
+        if email is not None and email not in self.accounts:
+            self.roster.ensure_fresh()
+        return "sheet"
+
+    def get_status(self) -> Dict:
+        status = dict(self._load_state)
+        status["backend"] = self.backend
+        status["accounts"] = self.count()
+        status["ready"] = status["state"] == "ready"
+        status["roster"] = self.roster.get_stats()
+        return status
+
+
+class SQLiteAccountStore(AccountStore):
+    """
+    SQLite 後端 (WAL 模式)
+
+    每個執行緒使用自己的連線；帳號完整內容存成 JSON，另外把 username、部門
+    與系統權限拆成有索引的欄位/資料表供查詢。
+    """
+
+    backend = "sqlite"
+
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS accounts (
+            email TEXT PRIMARY KEY,
+            username TEXT,
+            dept TEXT,
+            data TEXT NOT NULL,
+            updated_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_accounts_username ON accounts(username);
+        CREATE INDEX IF NOT EXISTS idx_accounts_dept ON accounts(dept);
+        CREATE TABLE IF NOT EXISTS account_permissions (
+            email TEXT NOT NULL,
+            system TEXT NOT NULL,
+            PRIMARY KEY (email, system)
+        );
+        CREATE INDEX IF NOT EXISTS idx_account_permissions_system
+            ON account_permissions(system);
+    """
+
+    def __init__(self, db_path: str = settings.DB_PATH):
+        self._db_path = db_path
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        self._conn().executescript(self._SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        # 預先載入模式 fork 出來的 worker 不能沿用主程序開的連線
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self._db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @staticmethod
+    def _write(conn: sqlite3.Connection, account: Dict) -> None:
+        email = account["email"]
+        conn.execute(
+            "INSERT OR REPLACE INTO accounts (email, username, dept, data, updated_at)"
+            " VALUES (?, ?, ?, ?, ?)",
+            (
+                email,
+                account.get("username"),
+                account.get("dept"),
+                json.dumps(account, ensure_ascii=False),
+                time.time(),
+            ),
+        )
+        conn.execute("DELETE FROM account_permissions WHERE email = ?", (email,))
+        conn.executemany(
+            "INSERT OR IGNORE INTO account_permissions (email, system) VALUES (?, ?)",
+            [(email, system) for system in account.get("permissions") or []],
+        )
+
+    def _select(self, where: str, params: Iterable, limit: Optional[int] = None) -> List[Dict]:
+        sql = f"SELECT data FROM accounts WHERE {where} ORDER BY email"
+        params = tuple(params)
+        if limit is not None:
+            sql += " LIMIT ?"
+            params += (limit,)
+        rows = self._conn().execute(sql, params).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def get(self, email: str) -> Optional[Dict]:
+        rows = self._select("email = ?", (email,))
+        return rows[0] if rows else None
+
+    def create(self, account: Dict) -> str:
+        conn = self._conn()
+        with conn:
+            self._write(conn, _copy_account(account))
+        return "synced"
+
+    def import_accounts(self, accounts: Iterable[Dict], replace: bool = True) -> int:
+        """
+        在同一個交易中大量匯入帳號，返回匯入筆數
+
+        Args:
+            replace: False 時略過已存在的帳號 (不覆蓋本地的異動)
+        """
+        conn = self._conn()
+        count = 0
+        with conn:
+            for account in accounts:
+                if not replace and conn.execute(
+                    "SELECT 1 FROM accounts WHERE email = ?", (account["email"],)
+                ).fetchone():
+                    continue
+                self._write(conn, _copy_account(account))
+                count += 1
+        return count
+
+    def create_many(self, accounts: List[Dict]) -> str:
+        self.import_accounts(accounts)
+        return "synced"
+
+    def update(self, email: str, **fields) -> Optional[Dict]:
+        conn = self._conn()
+        with conn:
+            # BEGIN IMMEDIATE 先取得寫入鎖，避免多個程序同時讀-改-寫
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT data FROM accounts WHERE email = ?", (email,)).fetchone()
+            if row is None:
+                return None
+            updated = _updated_account(json.loads(row[0]), fields)
+            self._write(conn, updated)
+        return updated
+
+    def find_by_username(self, username: str) -> List[Dict]:
+        return self._select("username = ?", (username,))
+
+    def find_by_department(self, dept: str) -> List[Dict]:
+        return self._select("dept = ?", (dept,))
+
+    def find_by_permission(self, system: str) -> List[Dict]:
+        return self._select(
+            "email IN (SELECT email FROM account_permissions WHERE system = ?)", (system,)
+        )
+
+    def query(
+        self,
+        email: Optional[str] = None,
+        username_prefix: Optional[str] = None,
+        dept: Optional[str] = None,
+        permission: Optional[str] = None,
+        vpn_enabled: Optional[bool] = None,
+        after: Optional[str] = None,
+        limit: int = 20,
+        fields: Sequence[str] = QUERY_FIELDS,
+    ) -> Tuple[List[Dict], Optional[str]]:
+        # 前綴以範圍條件查詢，可以使用 username 索引；多取一筆判斷是否還有下一頁
+        clauses: List[str] = []
+        params: List = []
+        for clause, value in (
+            ("email > ?", after),
+            ("email = ?", email),
+            ("username >= ?", username_prefix),
+            ("username < ?", username_prefix + _PREFIX_END if username_prefix else None),
+            ("dept = ?", dept),
+            ("email IN (SELECT email FROM account_permissions WHERE system = ?)", permission),
+            ("COALESCE(json_extract(data, '$.vpn_enabled'), 0) = ?", vpn_enabled),
+        ):
+            if value is not None and value != "":
+                clauses.append(clause)
+                params.append(int(value) if isinstance(value, bool) else value)
+        rows = self._select(" AND ".join(clauses) or "1", params, limit + 1)
+        next_cursor = rows[limit - 1]["email"] if len(rows) > limit else None
+        return [_project(account, fields) for account in rows[:limit]], next_cursor
+
+    def all(self) -> Dict[str, Dict]:
+        return {account["email"]: account for account in self._select("1", ())}
+
+    def count(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM accounts").fetchone()[0]
+
+
+class SharedAccountStore(SQLiteAccountStore):
+    """
+    多個 worker 程序共用的後端
+
+    帳號資料存在 SQLite (DB_PATH)，任何 worker 寫入後其他 worker 的下一次讀取
+    就看得到；新增與異動另外排入本程序的 Google Sheet 寫入佇列。啟動時只由一個
+    worker 從 Sheet 整表匯入 (以 store_meta 表協調，ROSTER_FULL_REFRESH_SECONDS
+    內不重複匯入)，之後各 worker 查不到帳號時才增量同步新增的資料列。
+    """
+
+    backend = "shared"
+
+    _META_SCHEMA = """
+        CREATE TABLE IF NOT EXISTS store_meta (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        );
+    """
+
+    def __init__(
+        self,
+        db_path: str = settings.DB_PATH,
+        full_refresh_seconds: float = settings.ROSTER_FULL_REFRESH_SECONDS,
+    ):
+        super().__init__(db_path)
+        self._conn().executescript(self._META_SCHEMA)
+        self._full_refresh_seconds = full_refresh_seconds
+        # 從 Sheet 讀到的帳號只補上資料庫沒有的，不覆蓋其他 worker 的異動
+        self.roster = RosterCache(lambda accounts: self.import_accounts(accounts.values(), replace=False))
+        self._load_state = {"state": "idle", "load_seconds": None, "imported": 0, "error": None}
+        self._load_lock = threading.Lock()
+        self._load_future: Optional[Future] = None
+
+    def create(self, account: Dict) -> str:
+        super().create(account)
+        try:
+            return get_write_queue().enqueue_append(account["email"], account_to_row(account))
+        except Exception as e:
+            print(f"Error queueing write to Google Sheet: {e}")
+            return "failed"
+
+    def create_many(self, accounts: List[Dict]) -> str:
+        if not accounts:
+            return "synced"
+        self.import_accounts(accounts)
+        try:
+            return get_write_queue().enqueue_append_many(
+                (account["email"], account_to_row(account)) for account in accounts
+            )
+        except Exception as e:
+            print(f"Error queueing write to Google Sheet: {e}")
+            return "failed"
+
+    def update(self, email: str, **fields) -> Optional[Dict]:
+        updated = super().update(email, **fields)
+        if updated is not None:
+            _enqueue_row_update(updated, fields)
+        return updated
+
+    def update_many(self, updates: Iterable[Tuple[str, Dict]]) -> Dict[str, str]:
+        statuses = {}
+        for email, fields in updates:
+            updated = SQLiteAccountStore.update(self, email, **fields)
+            if updated is not None:
+                statuses[email] = _enqueue_row_update(updated, fields)
+        return statuses
+
+    def sync_status(self, email: str) -> Optional[str]:
+        # 寫入佇列是每個程序各自的；其他 worker 建立的帳號在這裡視為已同步
+        status = get_write_queue().get_status(email)
+        if status is None and email in self:
+            return "synced"
+        return status
+
+    # ---- 從 Sheet 匯入 ----
+
+    def _claim_import(self) -> bool:
+        """取得整表匯入的權利 (距上次匯入超過 full_refresh_seconds 才會成功)"""
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT value FROM store_meta WHERE key = 'sheet_imported_at'"
+            ).fetchone()
+            now = time.time()
+            if row is not None and now - float(row[0]) < self._full_refresh_seconds:
+                return False
+            conn.execute(
+                "INSERT OR REPLACE INTO store_meta (key, value) VALUES ('sheet_imported_at', ?)",
+                (str(now),),
+            )
+        return True
+
+    def _release_import(self) -> None:
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM store_meta WHERE key = 'sheet_imported_at'")
+
+    def _background_load(self) -> int:
+        started = time.perf_counter()
+        if not self._claim_import():
+            self._load_state.update(state="ready", load_seconds=0.0)
+            return 0
+        try:
+            # RosterCache 讀到的帳號經由 merge 回呼寫入資料庫
+            imported = len(self.roster.refresh(full=True))
+        except Exception as e:
+            # 讓其他 worker (或下次啟動) 可以重新匯入
+            self._release_import()
+            self._load_state.update(state="failed", error=str(e))
+            print(f"Error loading data from Google Sheet: {e}")
+            raise
+        self._load_state.update(
+            state="ready", load_seconds=round(time.perf_counter() - started, 3), imported=imported
+        )
+        print(f"Loaded {imported} accounts from Google Sheet into shared store")
+        return imported
+
+    def start_loading(self) -> Future:
+        """在背景從 Sheet 匯入名冊 (只會啟動一次)；資料庫已有的帳號立即可用"""
+        with self._load_lock:
+            if self._load_future is not None:
+                return self._load_future
+            self._load_state["state"] = "loading"
+            future: Future = Future()
+
+            def run():
+                try:
+                    future.set_result(self._background_load())
+                except Exception as e:
+                    future.set_exception(e)
+
+            threading.Thread(target=run, name="shared-store-loader", daemon=True).start()
+            self._load_future = future
+            return future
+
+    def wait_ready(
+        self, email: Optional[str] = None, timeout: float = settings.EMPLOYEE_LOAD_TIMEOUT
+    ) -> str:
+        try:
+            self.start_loading().result(timeout=timeout)
+        except Exception:
+            # 逾時或匯入失敗：直接使用資料庫中已有的帳號
+            return self.backend
+        if email is not None and email not in self:
+            try:
+                self.roster.ensure_fresh()
+            except Exception as e:
+                print(f"Error syncing roster from Google Sheet: {e}")
+        return self.backend
+
+    def get_status(self) -> Dict:
+        status = dict(self._load_state)
+        status["backend"] = self.backend
+        status["accounts"] = self.count()
+        status["ready"] = status["state"] in ("ready", "failed")
+        status["roster"] = self.roster.get_stats()
+        return status
+
+
+def get_account_store(backend: str = settings.ACCOUNT_STORE) -> AccountStore:
+    """依設定建立帳號資料存取層"""
+    if backend == "sheet" and settings.WEB_CONCURRENCY > 1:
+        # 每個 worker 各自的記憶體快取會互相看不到對方的異動
+        print(f"ACCOUNT_STORE=sheet with {settings.WEB_CONCURRENCY} workers, using the shared store")
+        backend = "shared"
+    if backend == "shared":
+        return SharedAccountStore()
+    if backend == "sqlite":
+        return SQLiteAccountStore()
+    if backend == "sheet":
+        return SheetAccountStore()
+    raise ValueError(f"Unknown ACCOUNT_STORE backend: {backend}")
@@ -0,0 +1,468 @@
+"""整批新進員工入職：一次建立帳號、系統權限與 VPN
+
+輸入為 CSV 或 JSONL，每筆需有 name、dept，可選 systems (以 ; | , 分隔或 JSON 陣列)
+與 vpn (預設開通)。處理方式：
+    - 邊讀邊處理，每次取 BULK_ONBOARDING_CHUNK_SIZE 筆交給執行緒池準備帳號
+      (同時處理的筆數有上限，大檔案也不會整份載入記憶體)
+    - 同一批新帳號以一次 create_many 寫入；Sheet 後端在整個匯入期間暫停背景寫出，
+      結束時合併成一次 append_rows
+    - 以 email 判斷是否已存在 (已存在只補上缺少的權限/VPN)，重跑不會重複建立
+    - 每批寫入後記錄到 journal 檔 (BULK_ONBOARDING_DATA_DIR 下)，中途失敗重跑時略過已完成的資料列
+
+IT 專員的 bulk_onboard_employees 工具只能讀取 BULK_ONBOARDING_UPLOAD_DIR 內的名單，
+只返回筆數與一頁結果 (不含密碼)；其餘結果以 get_bulk_onboarding_results 分頁取得。
+新帳號的初始密碼和單筆建立的帳號一樣寫入帳號資料 (Google Sheet 名冊)，由 IT 依既有流程交付。
+
+用法:
+    python -m tools.bulk_onboarding hires.csv
+    python -m tools.bulk_onboarding hires.jsonl -o results.jsonl --workers 16
+"""
+
+import argparse
+import csv
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from config.settings import settings
+from services.telemetry import timed_tool
+from tools.account_store import AccountStore, SharedAccountStore, SheetAccountStore
+from tools.checklist_store import get_checklist_store
+from tools.it_tools import (
+    ACCOUNT_STORE,
+    _ensure_accounts_loaded,
+    _generate_temp_password,
+    _username_for,
+)
+from tools.sheet_writer import get_write_queue
+
+# 每筆資料列的處理結果
+RESULT_CREATED = "created"
+RESULT_UPDATED = "updated"
+RESULT_UNCHANGED = "unchanged"
+RESULT_RESUMED = "resumed"  # journal 中已記錄完成，這次略過
+RESULT_DUPLICATE = "duplicate"  # 同一個檔案中 email 重複
+RESULT_INVALID = "invalid"
+
+_DONE_RESULTS = {RESULT_CREATED, RESULT_UPDATED, RESULT_UNCHANGED}
+_FALSE_VALUES = {"0", "false", "no", "n", "否"}
+
+# 名單檔的副檔名
+HIRE_FILE_EXTENSIONS = (".csv", ".jsonl")
+
+# 工具返回給模型的結果欄位 (不含密碼)，與每頁筆數上限
+PUBLIC_RESULT_FIELDS = ("row", "name", "email", "result", "sync_status", "error")
+RESULTS_MAX_LIMIT = 100
+
+_RUN_ID = re.compile(r"^[0-9a-f]{32}$")
+
+
+def _parse_systems(value) -> List[str]:
+    if isinstance(value, list):
+        return [str(s).strip() for s in value if str(s).strip()]
+    if not value:
+        return []
+    for separator in (";", "|"):
+        if separator in value:
+            return [s.strip() for s in value.split(separator) if s.strip()]
+    return [s.strip() for s in value.split(",") if s.strip()]
+
+
+def _parse_vpn(value) -> bool:
+    if value is None or str(value).strip() == "":
+        return True
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() not in _FALSE_VALUES
+
+
+def read_hires(path: str) -> Iterator[Tuple[int, Dict]]:
+    """
+    逐筆讀取新進員工資料
+
+    Yields:
+        (資料列編號, {"name", "dept", "systems", "vpn"})；格式錯誤的資料列附上 "error"
+    """
+    if path.endswith(".jsonl"):
+        with open(path, "r", encoding="utf-8") as f:
+            for line_no, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    hire = json.loads(line)
+                except json.JSONDecodeError as e:
+                    yield line_no, {"error": f"invalid JSON: {e}"}
+                    continue
+                if not isinstance(hire, dict):
+                    hire = {"error": "row is not an object"}
+                yield line_no, hire
+    else:
+        with open(path, "r", encoding="utf-8-sig", newline="") as f:
+            # 第 1 行是標題列，資料列編號從 2 開始，與試算表中看到的列號一致
+            for line_no, row in enumerate(csv.DictReader(f), start=2):
+                yield line_no, row
+
+
+def journal_path_for(source_path: str, data_dir: str = settings.BULK_ONBOARDING_DATA_DIR) -> str:
+    """名單檔對應的進度檔 (放在資料目錄，以名單的絕對路徑區分同名檔案)"""
+    source = os.path.realpath(source_path)
+    digest = hashlib.sha1(source.encode("utf-8")).hexdigest()[:12]
+    return os.path.join(data_dir, "journals", f"{os.path.basename(source)}.{digest}.journal")
+
+
+def resolve_upload(file_name: str, upload_dir: str = settings.BULK_ONBOARDING_UPLOAD_DIR) -> Tuple[Optional[str], str]:
+    """
+    把工具收到的檔名解析成上傳目錄內的檔案
+
+    Returns:
+        (檔案路徑, "")；檔案不在上傳目錄內 (含 ..、絕對路徑與符號連結)、副檔名不對或不存在時返回 (None, 原因)
+    """
+    root = os.path.realpath(upload_dir)
+    path = os.path.realpath(os.path.join(root, file_name))
+    if os.path.commonpath([root, path]) != root or path == root:
+        return None, f"只能讀取上傳目錄內的名單檔 ({upload_dir})"
+    if not path.endswith(HIRE_FILE_EXTENSIONS):
+        return None, "名單檔必須是 .csv 或 .jsonl"
+    if not os.path.isfile(path):
+        return None, f"上傳目錄內找不到 {file_name}"
+    return path, ""
+
+
+class OnboardingJournal:
+    """記錄已完成的 email，重跑時略過 (每批寫入後 fsync)"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.done: Dict[str, Dict] = {}
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    self.done[entry["email"]] = entry
+        self._file = open(path, "a", encoding="utf-8")
+
+    def record(self, results: List[Dict]) -> None:
+        entries = [
+            {"email": r["email"], "row": r["row"], "result": r["result"], "at": time.time()}
+            for r in results
+            if r["result"] in _DONE_RESULTS
+        ]
+        if not entries:
+            return
+        self._file.write("".join(json.dumps(e, ensure_ascii=False) + "\n" for e in entries))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        for entry in entries:
+            self.done[entry["email"]] = entry
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class BulkOnboarding:
+    """整批入職的處理流程"""
+
+    def __init__(
+        self,
+        store: AccountStore = ACCOUNT_STORE,
+        max_workers: int = settings.BULK_ONBOARDING_WORKERS,
+        chunk_size: int = settings.BULK_ONBOARDING_CHUNK_SIZE,
+    ):
+        self._store = store
+        self._max_workers = max_workers
+        self._chunk_size = chunk_size
+
+    def _prepare(self, line_no: int, hire: Dict) -> Dict:
+        """準備單筆資料：新帳號產生完整帳號資料，已存在的帳號算出要補的欄位"""
+        result = {"row": line_no, "name": (hire.get("name") or "").strip(), "dept": hire.get("dept") or ""}
+        if hire.get("error") or not result["name"]:
+            result.update(result=RESULT_INVALID, email=None, error=hire.get("error") or "missing name")
+            return result
+
+        systems = _parse_systems(hire.get("systems"))
+        vpn = _parse_vpn(hire.get("vpn"))
+        username = _username_for(result["name"])
+        email = f"{username}@company.com"
+        result.update(email=email, systems=systems, vpn=vpn)
+
+        existing = self._store.get(email)
+        if existing is None:
+            password = _generate_temp_password()
+            result["account"] = {
+                "username": username,
+                "employee_name": result["name"],
+                "email": email,
+                "password": password,
+                "dept": result["dept"],
+                "status": "active",
+                "permissions": systems,
+                "vpn_enabled": vpn,
+                "vpn": "enabled" if vpn else "",
+            }
+            result.update(result=RESULT_CREATED, initial_password=password)
+            return result
+
+        fields = {}
+        missing = [s for s in systems if s not in (existing.get("permissions") or [])]
+        if missing:
+            fields["permissions"] = list(existing.get("permissions") or []) + missing
+        if vpn and not existing.get("vpn_enabled"):
+            fields.update(vpn_enabled=True, vpn="enabled")
+        result["fields"] = fields
+        result["result"] = RESULT_UPDATED if fields else RESULT_UNCHANGED
+        return result
+
+    def _commit(self, prepared: List[Dict]) -> str:
+        """寫入一批結果，返回新帳號的同步狀態 (補欄位的帳號各自記下排入寫入佇列的狀態)"""
+        new_accounts = [r.pop("account") for r in prepared if "account" in r]
+        sync_status = self._store.create_many(new_accounts) if new_accounts else "synced"
+        updates = [(r["email"], r.pop("fields")) for r in prepared if r.get("fields")]
+        update_statuses = self._store.update_many(updates) if updates else {}
+        for r in prepared:
+            r.pop("fields", None)
+            if r["result"] == RESULT_CREATED:
+                r["sync_status"] = sync_status
+            elif r["result"] == RESULT_UPDATED:
+                r["sync_status"] = update_statuses.get(r["email"], "failed")
+        self._mark_checklist(prepared)
+        return sync_status
+
+    @staticmethod
+    def _mark_checklist(prepared: List[Dict]) -> None:
+        """把這批員工的 IT帳號申請 (以及有分配權限時的 工作環境設定) 標記為完成"""
+        updates = []
+        for r in prepared:
+            if r["result"] not in _DONE_RESULTS:
+                continue
+            updates.append((r["name"], "IT帳號申請", r["dept"] or None, r["email"]))
+            if r["systems"]:
+                updates.append((r["name"], "工作環境設定", r["dept"] or None, r["email"]))
+        try:
+            get_checklist_store().mark_many(updates, source="bulk_onboard_employees")
+        except sqlite3.Error as e:
+            print(f"Error updating onboarding checklist: {e}")
+
+    def run(self, source_path: str, journal_path: Optional[str] = None) -> Iterator[Dict]:
+        """
+        處理整個檔案，依資料列順序逐筆產生結果
+
+        Args:
+            source_path: CSV 或 JSONL 檔
+            journal_path: 進度檔，預設為資料目錄下對應 source_path 的檔案 (journal_path_for)
+        """
+        _ensure_accounts_loaded()
+        journal = OnboardingJournal(journal_path or journal_path_for(source_path))
+        seen: Set[str] = set()
+        # Sheet 後端整個匯入期間暫停背景寫出，結束時合併成一次 append_rows
+        hold = (
+            get_write_queue().paused()
+            if isinstance(self._store, (SheetAccountStore, SharedAccountStore))
+            else nullcontext()
+        )
+
+        try:
+            with hold, ThreadPoolExecutor(max_workers=self._max_workers) as executor:
+                chunk: List[Tuple[int, Dict]] = []
+                for item in read_hires(source_path):
+                    chunk.append(item)
+                    if len(chunk) >= self._chunk_size:
+                        yield from self._run_chunk(executor, chunk, journal, seen)
+                        chunk = []
+                if chunk:
+                    yield from self._run_chunk(executor, chunk, journal, seen)
+        finally:
+            journal.close()
+
+    def _run_chunk(self, executor, chunk, journal: OnboardingJournal, seen: Set[str]) -> Iterator[Dict]:
+        results: List[Optional[Dict]] = [None] * len(chunk)
+        to_prepare = []
+        for i, (line_no, hire) in enumerate(chunk):
+            name = (hire.get("name") or "").strip()
+            email = f"{_username_for(name)}@company.com" if name else None
+            if email and email in seen:
+                results[i] = {"row": line_no, "name": name, "email": email, "result": RESULT_DUPLICATE}
+            elif email and email in journal.done:
+                seen.add(email)
+                results[i] = {"row": line_no, "name": name, "email": email, "result": RESULT_RESUMED}
+            else:
+                if email:
+                    seen.add(email)
+                to_prepare.append(i)
+
+        prepared = list(executor.map(lambda i: self._prepare(*chunk[i]), to_prepare))
+        self._commit(prepared)
+        journal.record(prepared)
+        for i, result in zip(to_prepare, prepared):
+            results[i] = result
+        yield from results
+
+
+def _public_result(result: Dict) -> Dict:
+    """工具返回給模型的單筆結果：只有狀態，沒有密碼與帳號資料"""
+    return {k: result[k] for k in PUBLIC_RESULT_FIELDS if result.get(k) is not None}
+
+
+def _results_path(run_id: str, data_dir: str = settings.BULK_ONBOARDING_DATA_DIR) -> str:
+    return os.path.join(data_dir, "runs", f"{run_id}.jsonl")
+
+
+def run_bulk_onboarding(
+    source_path: str,
+    journal_path: Optional[str] = None,
+    max_workers: int = settings.BULK_ONBOARDING_WORKERS,
+) -> Dict:
+    """
+    執行整批入職，每筆結果 (不含密碼) 寫入資料目錄，返回彙整
+
+    Returns:
+        {"run_id": 之後以 load_run_results 分頁讀取結果, "summary": 各結果筆數、耗時與每秒處理筆數}
+    """
+    run_id = uuid.uuid4().hex
+    path = _results_path(run_id)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    started = time.perf_counter()
+    counts: Dict[str, int] = {}
+    rows = 0
+    with open(path, "w", encoding="utf-8") as f:
+        for result in BulkOnboarding(max_workers=max_workers).run(source_path, journal_path):
+            rows += 1
+            counts[result["result"]] = counts.get(result["result"], 0) + 1
+            f.write(json.dumps(_public_result(result), ensure_ascii=False) + "\n")
+    elapsed = time.perf_counter() - started
+    return {
+        "run_id": run_id,
+        "summary": {
+            "rows": rows,
+            **counts,
+            "elapsed_seconds": round(elapsed, 3),
+            "rows_per_second": round(rows / elapsed, 1) if elapsed else None,
+        },
+    }
+
+
+def load_run_results(
+    run_id: str, result: Optional[str] = None, offset: int = 0, limit: int = 20
+) -> Optional[Dict]:
+    """
+    分頁讀取一次整批入職的結果
+
+    Returns:
+        {"results", "count", "next_offset" (沒有下一頁時為 None)}；run_id 不存在時返回 None
+    """
+    if not _RUN_ID.match(run_id or ""):
+        return None
+    path = _results_path(run_id)
+    if not os.path.exists(path):
+        return None
+    offset, limit = max(0, offset), max(1, min(limit, RESULTS_MAX_LIMIT))
+    page: List[Dict] = []
+    matched = 0
+    next_offset = None
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            entry = json.loads(line)
+            if result and entry["result"] != result:
+                continue
+            if matched >= offset + limit:
+                next_offset = offset + limit
+                break
+            if matched >= offset:
+                page.append(entry)
+            matched += 1
+    return {"results": page, "count": len(page), "next_offset": next_offset}
+
+
+@timed_tool
+def bulk_onboard_employees(file_name: str, limit: int = 20) -> Dict:
+    """
+    整批為新進員工建立郵件帳號、分配系統權限並開通 VPN
+
+    Args:
+        file_name: 上傳目錄內的新進員工名單檔名 (CSV 或 JSONL)，欄位為 name、dept、
+                   systems (以分號分隔)、vpn (選填，預設開通)
+        limit: 第一頁返回幾筆結果 (最多 100)
+
+    Returns:
+        各結果筆數、run_id 與第一頁的每筆狀態 (不含密碼，初始密碼寫入帳號資料後由 IT 交付)；
+        其餘結果以 get_bulk_onboarding_results 取得。可重複執行，已完成的員工會略過
+    """
+    path, error = resolve_upload(file_name)
+    if path is None:
+        return {"success": False, "message": error}
+    report = run_bulk_onboarding(path)
+    page = load_run_results(report["run_id"], limit=limit)
+    return {
+        "success": True,
+        **report,
+        **page,
+        "password_delivery": "新帳號的初始密碼已寫入帳號資料，不會出現在對話中，請 IT 依既有流程交付給員工",
+    }
+
+
+@timed_tool
+def get_bulk_onboarding_results(
+    run_id: str, result: Optional[str] = None, offset: int = 0, limit: int = 20
+) -> Dict:
+    """
+    分頁查詢整批入職每位員工的處理結果 (不含密碼)
+
+    Args:
+        run_id: bulk_onboard_employees 返回的 run_id
+        result: 只列出某種結果，可選 "created"、"updated"、"unchanged"、"resumed"、
+                "duplicate"、"invalid"
+        offset: 從第幾筆開始 (上一頁返回的 next_offset)
+        limit: 每頁筆數 (最多 100)
+
+    Returns:
+        {"results": 每筆的列號、姓名、email、結果與同步狀態, "count", "next_offset"}
+    """
+    page = load_run_results(run_id, result, offset, limit)
+    if page is None:
+        return {"success": False, "message": f"找不到整批入職紀錄 {run_id}"}
+    return {"success": True, "run_id": run_id, **page}
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="整批新進員工入職")
+    parser.add_argument("source", help="新進員工名單 (CSV 或 JSONL)")
+    parser.add_argument("-o", "--output", help="每筆結果輸出為 JSONL，預設輸出到 stdout")
+    parser.add_argument("--journal", help="進度檔路徑，預設放在 BULK_ONBOARDING_DATA_DIR")
+    parser.add_argument("--workers", type=int, default=settings.BULK_ONBOARDING_WORKERS)
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    counts: Dict[str, int] = {}
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        for result in BulkOnboarding(max_workers=args.workers).run(args.source, args.journal):
+            counts[result["result"]] = counts.get(result["result"], 0) + 1
+            out.write(json.dumps(result, ensure_ascii=False) + "\n")
+    finally:
+        if args.output:
+            out.close()
+
+    elapsed = time.perf_counter() - started
+    total = sum(counts.values())
+    summary = ", ".join(f"{k}={v}" for k, v in sorted(counts.items()))
+    print(
+        f"Processed {total} rows in {elapsed:.2f}s ({total / elapsed:.1f} rows/s): {summary}",
+        file=sys.stderr,
+    )
+
+
+if __name__ == "__main__":
+    main()
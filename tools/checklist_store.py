@@ -0,0 +1,286 @@
+"""新進員工入職檢查清單的進度儲存 (SQLite，路徑為 DB_PATH)
+
+HR 與 IT 專員是不同的程序，兩邊的工具都直接更新同一個資料庫：
+    - 每個項目一列，以 (員工, 項目) 為主鍵，標記完成只更新一列
+    - 每位員工另存未完成項目數，以部分索引查詢「還有未完成項目的員工」
+    - 梯次進度 (依部門或建立清單的月份) 直接由員工表彙總，不需掃描對話紀錄
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from config.settings import settings
+
+STATUS_TODO = "未完成"
+STATUS_DONE = "已完成"
+
+# 入職檢查清單項目 (依顯示順序)
+CHECKLIST_ITEMS = [
+    "HR政策諮詢",
+    "IT帳號申請",
+    "福利申請",
+    "工作環境設定",
+    "工作流程熟悉",
+]
+
+
+class ChecklistStore:
+    """入職檢查清單進度 (每個執行緒使用自己的連線)"""
+
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS onboarding_employees (
+            employee TEXT PRIMARY KEY,
+            dept TEXT,
+            email TEXT,
+            total_items INTEGER NOT NULL,
+            pending_items INTEGER NOT NULL,
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_onboarding_employees_pending
+            ON onboarding_employees(pending_items) WHERE pending_items > 0;
+        CREATE INDEX IF NOT EXISTS idx_onboarding_employees_email
+            ON onboarding_employees(email);
+        CREATE TABLE IF NOT EXISTS onboarding_checklist (
+            employee TEXT NOT NULL,
+            item TEXT NOT NULL,
+            position INTEGER NOT NULL,
+            status TEXT NOT NULL,
+            source TEXT,
+            updated_at REAL NOT NULL,
+            PRIMARY KEY (employee, item)
+        );
+    """
+
+    def __init__(self, db_path: str = settings.DB_PATH, items: Optional[List[str]] = None):
+        self._db_path = db_path
+        self._items = list(items or CHECKLIST_ITEMS)
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        self._conn().executescript(self._SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        # 預先載入模式 fork 出來的 worker 不能沿用主程序開的連線
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self._db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _ensure(
+        self,
+        conn: sqlite3.Connection,
+        employee: str,
+        dept: Optional[str] = None,
+        email: Optional[str] = None,
+    ) -> None:
+        """建立員工的檢查清單 (已存在時只補上部門與 email)"""
+        now = time.time()
+        created = conn.execute(
+            "INSERT OR IGNORE INTO onboarding_employees"
+            " (employee, dept, email, total_items, pending_items, created_at, updated_at)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (employee, dept, email, len(self._items), len(self._items), now, now),
+        ).rowcount
+        if created:
+            conn.executemany(
+                "INSERT OR IGNORE INTO onboarding_checklist"
+                " (employee, item, position, status, updated_at) VALUES (?, ?, ?, ?, ?)",
+                [(employee, item, i, STATUS_TODO, now) for i, item in enumerate(self._items)],
+            )
+        elif dept or email:
+            conn.execute(
+                "UPDATE onboarding_employees SET dept = COALESCE(?, dept),"
+                " email = COALESCE(?, email) WHERE employee = ?",
+                (dept, email, employee),
+            )
+
+    def ensure(self, employee: str, dept: Optional[str] = None, email: Optional[str] = None) -> None:
+        """建立員工的檢查清單 (已存在時只補上部門與 email)"""
+        conn = self._conn()
+        with conn:
+            self._ensure(conn, employee.strip(), dept, email)
+
+    def _mark(
+        self, conn: sqlite3.Connection, employee: str, item: str, done: bool, source: Optional[str]
+    ) -> bool:
+        status = STATUS_DONE if done else STATUS_TODO
+        changed = conn.execute(
+            "UPDATE onboarding_checklist SET status = ?, source = ?, updated_at = ?"
+            " WHERE employee = ? AND item = ? AND status != ?",
+            (status, source, time.time(), employee, item, status),
+        ).rowcount
+        if changed:
+            conn.execute(
+                "UPDATE onboarding_employees SET pending_items = pending_items + ?,"
+                " updated_at = ? WHERE employee = ?",
+                (-1 if done else 1, time.time(), employee),
+            )
+        return bool(changed)
+
+    def mark(
+        self,
+        employee: str,
+        item: str,
+        done: bool = True,
+        source: Optional[str] = None,
+        dept: Optional[str] = None,
+        email: Optional[str] = None,
+    ) -> bool:
+        """
+        更新單一項目的狀態 (員工不存在時先建立清單)
+
+        Args:
+            employee: 員工姓名
+            item: 檢查清單項目，例如 "IT帳號申請"
+            done: True 標記完成，False 改回未完成
+            source: 觸發更新的工具名稱
+
+        Returns:
+            狀態有改變時返回 True
+        """
+        if item not in self._items:
+            raise ValueError(f"Unknown checklist item: {item}")
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            employee = employee.strip()
+            self._ensure(conn, employee, dept, email)
+            return self._mark(conn, employee, item, done, source)
+
+    def mark_many(
+        self,
+        updates: Iterable[Tuple[str, str, Optional[str], Optional[str]]],
+        source: Optional[str] = None,
+    ) -> int:
+        """
+        在同一個交易中把多個項目標記完成
+
+        Args:
+            updates: (員工, 項目, 部門, email) 的序列，部門與 email 可為 None
+
+        Returns:
+            實際改變的項目數
+        """
+        conn = self._conn()
+        changed = 0
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            for employee, item, dept, email in updates:
+                employee = employee.strip()
+                self._ensure(conn, employee, dept, email)
+                changed += self._mark(conn, employee, item, True, source)
+        return changed
+
+    def get(self, employee: str) -> Optional[Dict]:
+        """取得員工的檢查清單，沒有紀錄時返回 None"""
+        employee = employee.strip()
+        conn = self._conn()
+        summary = conn.execute(
+            "SELECT dept, email, total_items, pending_items FROM onboarding_employees"
+            " WHERE employee = ?",
+            (employee,),
+        ).fetchone()
+        if summary is None:
+            return None
+        rows = conn.execute(
+            "SELECT item, status FROM onboarding_checklist WHERE employee = ? ORDER BY position",
+            (employee,),
+        ).fetchall()
+        dept, email, total, pending = summary
+        return {
+            "employee": employee,
+            "dept": dept,
+            "email": email,
+            "checklist": [{"item": item, "status": status} for item, status in rows],
+            "completed": total - pending,
+            "total": total,
+        }
+
+    def find_employee_by_email(self, email: str) -> Optional[str]:
+        row = self._conn().execute(
+            "SELECT employee FROM onboarding_employees WHERE email = ?", (email,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def pending_employees(self, dept: Optional[str] = None, limit: int = 100) -> List[Dict]:
+        """查詢還有未完成項目的員工 (未完成項目多的在前)"""
+        where = "pending_items > 0" + (" AND dept = ?" if dept else "")
+        params = ((dept,) if dept else ()) + (limit,)
+        employees = self._conn().execute(
+            f"SELECT employee, dept, pending_items, total_items FROM onboarding_employees"
+            f" WHERE {where} ORDER BY pending_items DESC, employee LIMIT ?",
+            params,
+        ).fetchall()
+        if not employees:
+            return []
+        names = [e[0] for e in employees]
+        placeholders = ",".join("?" * len(names))
+        pending_items: Dict[str, List[str]] = {}
+        for employee, item in self._conn().execute(
+            f"SELECT employee, item FROM onboarding_checklist"
+            f" WHERE employee IN ({placeholders}) AND status = ? ORDER BY position",
+            (*names, STATUS_TODO),
+        ):
+            pending_items.setdefault(employee, []).append(item)
+        return [
+            {
+                "employee": employee,
+                "dept": dept_,
+                "pending": pending,
+                "total": total,
+                "pending_items": pending_items.get(employee, []),
+            }
+            for employee, dept_, pending, total in employees
+        ]
+
+    def cohort_progress(self, group_by: str = "dept") -> List[Dict]:
+        """
+        彙總梯次進度
+
+        Args:
+            group_by: "dept" (依部門) 或 "month" (依建立清單的月份)
+        """
+        if group_by == "dept":
+            cohort = "COALESCE(dept, '')"
+        elif group_by == "month":
+            cohort = "strftime('%Y-%m', created_at, 'unixepoch', 'localtime')"
+        else:
+            raise ValueError(f"Unknown cohort grouping: {group_by}")
+        rows = self._conn().execute(
+            f"SELECT {cohort} AS cohort, COUNT(*), SUM(total_items), SUM(total_items - pending_items),"
+            f" SUM(pending_items = 0) FROM onboarding_employees GROUP BY cohort ORDER BY cohort"
+        ).fetchall()
+        return [
+            {
+                "cohort": cohort_name,
+                "employees": employees,
+                "completed_items": completed,
+                "total_items": total,
+                "progress": round(completed / total, 3) if total else 0.0,
+                "fully_onboarded": finished,
+            }
+            for cohort_name, employees, total, completed, finished in rows
+        ]
+
+
+_store: Optional[ChecklistStore] = None
+_store_lock = threading.Lock()
+
+
+def get_checklist_store() -> ChecklistStore:
+    """取得全域共用的檢查清單儲存"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = ChecklistStore()
+    return _store
@@ -0,0 +1,521 @@
+"""員工手冊全文檢索
+
+- 從 HANDBOOK_DIR 下的 Markdown 檔載入章節 (每個 "## 標題" 為一個章節)
+- 中日韓文字切成雙字詞 (bigram)、英數字以單字為詞，建立倒排索引並以 BM25 排序
+- 查詢時套用同義詞 (例如 休假→請假、考績→考核)，英文詞允許一個字元的拼字誤差
+- 索引預先建好存成二進位檔，載入時以 mmap 映射；章節、詞表 (二分搜尋) 與 posting list
+  都在映射的檔案中，用到時才解碼
+
+用法:
+    python -m tools.handbook_search --build      # 重建索引
+    python -m tools.handbook_search 加班費怎麼算   # 測試查詢
+"""
+
+import glob
+import hashlib
+import heapq
+import math
+import mmap
+import os
+import re
+import struct
+import sys
+import tempfile
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections.abc import Mapping, Sequence
+from typing import Dict, List, Optional, Tuple
+
+from config.settings import settings
+
+# 索引檔格式: header (MAGIC、位元組順序標記、來源指紋、平均文件長度) + 區塊表
+# (每個區塊的起點與長度) + 各區塊 (補齊到 4 bytes)。除了字串區塊都是 uint32 陣列。
+MAGIC = b"HBK2"
+AREAS = (
+    "doc_lengths",
+    "section_offsets",
+    "section_text",
+    "term_keys",
+    "term_key_offsets",
+    "term_values",
+    "fuzzy_keys",
+    "fuzzy_key_offsets",
+    "fuzzy_value_offsets",
+    "fuzzy_values",
+    "title_keys",
+    "title_key_offsets",
+    "title_docs",
+    "postings",
+)
+_BYTE_AREAS = {"section_text", "term_keys", "fuzzy_keys", "title_keys"}
+_HEADER = struct.Struct("=4sI16sd")
+_AREA_TABLE = struct.Struct(f"={2 * len(AREAS)}I")
+_BYTE_ORDER_MARK = 0x01020304
+
+# BM25 參數
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# 同義詞展開的詞權重 (原始查詢詞為 1.0)
+SYNONYM_WEIGHT = 0.6
+FUZZY_WEIGHT = 0.5
+
+# 同義詞群組：群組內任一詞出現在查詢中，其他詞也一併搜尋
+SYNONYM_GROUPS = [
+    ["請假", "休假", "假單", "病假", "事假"],
+    ["加班", "超時", "加班費", "overtime"],
+    ["出差", "差旅", "出差費", "travel"],
+    ["考核", "考績", "績效", "評分", "review"],
+]
+
+_CJK_RUN = re.compile(r"[㐀-鿿豈-﫿]+")
+_WORD = re.compile(r"[a-z0-9]+(?:\.[0-9]+)?")
+
+
+def tokenize(text: str) -> List[str]:
+    """中日韓文字切雙字詞 (只有一個字時保留單字)，英數字切單字"""
+    text = text.lower()
+    tokens = []
+    for run in _CJK_RUN.findall(text):
+        if len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i : i + 2] for i in range(len(run) - 1))
+    tokens.extend(_WORD.findall(text))
+    return tokens
+
+
+def _deletes(word: str) -> List[str]:
+    """刪除一個字元後的所有變形 (SymSpell 式的模糊比對鍵)"""
+    return [word[:i] + word[i + 1 :] for i in range(len(word))]
+
+
+def _near(word: str, tokens: List[str]) -> bool:
+    """英文同義詞允許一個字元的拼字誤差 (例如 overtme -> overtime)"""
+    if not word.isascii() or len(word) <= 3:
+        return False
+    keys = set(_deletes(word)) | {word}
+    return any(token in keys or word in _deletes(token) or keys & set(_deletes(token)) for token in tokens)
+
+
+def load_handbook_sections(directory: str = settings.HANDBOOK_DIR) -> List[Tuple[str, str]]:
+    """
+    載入員工手冊章節
+
+    Returns:
+        [(章節標題, 內容), ...]，依檔名與章節順序排列
+    """
+    sections = []
+    for path in sorted(glob.glob(os.path.join(directory, "*.md"))):
+        with open(path, "r", encoding="utf-8") as f:
+            content = f.read()
+        for block in re.split(r"^## ", content, flags=re.MULTILINE)[1:]:
+            title, _, body = block.partition("\n")
+            body = body.strip()
+            if title.strip() and body:
+                sections.append((title.strip(), body))
+    return sections
+
+
+def _source_fingerprint(directory: str) -> str:
+    h = hashlib.sha256()
+    for path in sorted(glob.glob(os.path.join(directory, "*.md"))):
+        stat = os.stat(path)
+        h.update(f"{os.path.basename(path)}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+    return h.hexdigest()[:16]
+
+
+def _pad(data: bytes) -> bytes:
+    """補齊到 4 bytes，讓下一個區塊可以 cast 成 uint32"""
+    return data + b"\0" * (-len(data) % 4)
+
+
+def _key_table(keys: List[bytes]) -> Tuple[bytes, bytes]:
+    """排序好的字串 -> (字串區塊, 每個字串的起點 (n + 1 個 uint32))"""
+    offsets = array("I", [0])
+    for key in keys:
+        offsets.append(offsets[-1] + len(key))
+    return b"".join(keys), offsets.tobytes()
+
+
+def build_index(
+    sections: List[Tuple[str, str]], index_path: str, fingerprint: str = ""
+) -> None:
+    """建立倒排索引並寫入二進位索引檔"""
+    postings: Dict[str, Dict[int, int]] = {}
+    doc_lengths = array("I")
+    for doc_id, (title, body) in enumerate(sections):
+        # 標題的詞重複計入，讓標題命中排序較前
+        tokens = tokenize(title) * 2 + tokenize(body)
+        doc_lengths.append(len(tokens))
+        for token in tokens:
+            tf = postings.setdefault(token, {})
+            tf[doc_id] = tf.get(doc_id, 0) + 1
+
+    # 章節內容: 第 i 個章節的標題與內容依序位於 section_offsets[2i : 2i + 3] 之間
+    section_offsets = array("I", [0])
+    section_text = bytearray()
+    for title, body in sections:
+        for text in (title, body):
+            section_text += text.encode("utf-8")
+            section_offsets.append(len(section_text))
+
+    # 詞表依 UTF-8 位元組排序 (與字元順序相同)，載入後以二分搜尋查詢
+    terms = sorted(postings, key=lambda term: term.encode("utf-8"))
+    term_ids = {term: i for i, term in enumerate(terms)}
+    term_values = array("I")  # 每個詞兩個值: posting 起點, 文件數
+    data = array("I")
+    for term in terms:
+        docs = postings[term]
+        term_values.append(len(data))
+        term_values.append(len(docs))
+        for doc_id in sorted(docs):
+            data.append(doc_id)
+            data.append(docs[doc_id])
+
+    fuzzy: Dict[bytes, List[int]] = {}
+    for term in terms:
+        if term.isascii() and len(term) > 3:
+            for key in _deletes(term):
+                fuzzy.setdefault(key.encode("utf-8"), []).append(term_ids[term])
+    fuzzy_keys = sorted(fuzzy)
+    fuzzy_value_offsets = array("I", [0])
+    fuzzy_values = array("I")
+    for key in fuzzy_keys:
+        fuzzy_values.extend(fuzzy[key])
+        fuzzy_value_offsets.append(len(fuzzy_values))
+
+    # 標題 -> 章節 (標題重複時以最後一個為準)
+    titles = {title.encode("utf-8"): doc_id for doc_id, (title, _) in enumerate(sections)}
+    title_keys = sorted(titles)
+    title_docs = array("I", (titles[key] for key in title_keys))
+
+    term_blob, term_key_offsets = _key_table([term.encode("utf-8") for term in terms])
+    fuzzy_blob, fuzzy_key_offsets = _key_table(fuzzy_keys)
+    title_blob, title_key_offsets = _key_table(title_keys)
+    areas = {
+        "doc_lengths": doc_lengths.tobytes(),
+        "section_offsets": section_offsets.tobytes(),
+        "section_text": bytes(section_text),
+        "term_keys": term_blob,
+        "term_key_offsets": term_key_offsets,
+        "term_values": term_values.tobytes(),
+        "fuzzy_keys": fuzzy_blob,
+        "fuzzy_key_offsets": fuzzy_key_offsets,
+        "fuzzy_value_offsets": fuzzy_value_offsets.tobytes(),
+        "fuzzy_values": fuzzy_values.tobytes(),
+        "title_keys": title_blob,
+        "title_key_offsets": title_key_offsets,
+        "title_docs": title_docs.tobytes(),
+        "postings": data.tobytes(),
+    }
+    avgdl = (sum(doc_lengths) / len(doc_lengths)) if doc_lengths else 1.0
+
+    position = _HEADER.size + _AREA_TABLE.size
+    table = []
+    for name in AREAS:
+        table.extend((position, len(areas[name])))
+        position += len(_pad(areas[name]))
+
+    directory = os.path.dirname(index_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    # 每個程序各自的暫存檔：多個 worker 同時重建時不會寫進同一個檔案，最後一個 replace 的勝出
+    fd, tmp_path = tempfile.mkstemp(
+        dir=directory or ".", prefix=os.path.basename(index_path) + ".", suffix=".tmp"
+    )
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(_HEADER.pack(MAGIC, _BYTE_ORDER_MARK, fingerprint.encode("ascii"), avgdl))
+            f.write(_AREA_TABLE.pack(*table))
+            for name in AREAS:
+                f.write(_pad(areas[name]))
+        os.replace(tmp_path, index_path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+class _KeyTable:
+    """mmap 中排序好的字串表，以二分搜尋查詢 (不需先解碼整個表)"""
+
+    def __init__(self, blob: memoryview, offsets: memoryview):
+        self._blob = blob
+        self._offsets = offsets
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i: int) -> bytes:
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return bytes(self._blob[self._offsets[i] : self._offsets[i + 1]])
+
+    def find(self, key: str) -> Optional[int]:
+        """字串在表中的位置，不存在時返回 None"""
+        encoded = key.encode("utf-8")
+        i = bisect_left(self, encoded)
+        return i if i < len(self) and self[i] == encoded else None
+
+
+class _Sections(Sequence):
+    """章節清單 [(標題, 內容), ...]，用到哪個章節才解碼"""
+
+    def __init__(self, text: memoryview, offsets: memoryview):
+        self._text = text
+        self._offsets = offsets
+
+    def __len__(self) -> int:
+        return (len(self._offsets) - 1) // 2
+
+    def _decode(self, i: int) -> str:
+        return str(self._text[self._offsets[i] : self._offsets[i + 1]], "utf-8")
+
+    def title(self, doc_id: int) -> str:
+        return self._decode(2 * doc_id)
+
+    def body(self, doc_id: int) -> str:
+        return self._decode(2 * doc_id + 1)
+
+    def __getitem__(self, doc_id):
+        if isinstance(doc_id, slice):
+            return [self[i] for i in range(*doc_id.indices(len(self)))]
+        if not 0 <= doc_id < len(self):
+            raise IndexError(doc_id)
+        return self.title(doc_id), self.body(doc_id)
+
+
+class _SectionMap(Mapping):
+    """章節標題 -> 內容 的唯讀對照，查到哪個章節才解碼"""
+
+    def __init__(self, index: "HandbookIndex"):
+        self._index = index
+
+    def __getitem__(self, title: str) -> str:
+        body = self._index.get_section(title)
+        if body is None:
+            raise KeyError(title)
+        return body
+
+    def __iter__(self):
+        for key in self._index._titles:
+            yield key.decode("utf-8")
+
+    def __len__(self) -> int:
+        return len(self._index._titles)
+
+
+class HandbookIndex:
+    """
+    以 mmap 載入的員工手冊索引
+
+    章節、詞表、模糊比對表與 posting list 都留在映射的檔案中，查詢時才解碼用到的部分，
+    載入時間不隨手冊大小增加。
+    """
+
+    def __init__(self, index_path: str):
+        with open(index_path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._mmap) < _HEADER.size + _AREA_TABLE.size or self._mmap[:4] != MAGIC:
+            raise ValueError(f"Not a handbook index: {index_path}")
+        _, byte_order_mark, fingerprint, self._avgdl = _HEADER.unpack_from(self._mmap)
+        if byte_order_mark != _BYTE_ORDER_MARK:
+            raise ValueError("Handbook index was built on a different byte order")
+        table = _AREA_TABLE.unpack_from(self._mmap, _HEADER.size)
+        view = memoryview(self._mmap)
+        areas = {}
+        for i, name in enumerate(AREAS):
+            offset, length = table[2 * i], table[2 * i + 1]
+            area = view[offset : offset + length]
+            areas[name] = area if name in _BYTE_AREAS else area.cast("I")
+
+        self.fingerprint: str = fingerprint.decode("ascii").rstrip("\0")
+        self.sections = _Sections(areas["section_text"], areas["section_offsets"])
+        self._doc_lengths = areas["doc_lengths"]
+        self._terms = _KeyTable(areas["term_keys"], areas["term_key_offsets"])
+        self._term_values = areas["term_values"]
+        self._fuzzy = _KeyTable(areas["fuzzy_keys"], areas["fuzzy_key_offsets"])
+        self._fuzzy_value_offsets = areas["fuzzy_value_offsets"]
+        self._fuzzy_values = areas["fuzzy_values"]
+        self._titles = _KeyTable(areas["title_keys"], areas["title_key_offsets"])
+        self._title_docs = areas["title_docs"]
+        self._postings = areas["postings"]
+
+    def _norm(self, doc_id: int) -> float:
+        """BM25 的文件長度正規化項"""
+        return BM25_K1 * (1 - BM25_B + BM25_B * self._doc_lengths[doc_id] / self._avgdl)
+
+    def _term_entry(self, term: str) -> Optional[Tuple[int, int]]:
+        """詞的 (posting 起點, 文件數)，不在索引中時返回 None"""
+        i = self._terms.find(term)
+        if i is None:
+            return None
+        return self._term_values[2 * i], self._term_values[2 * i + 1]
+
+    def _fuzzy_lookup(self, key: str) -> List[str]:
+        """刪除一個字元後等於 key 的索引詞"""
+        i = self._fuzzy.find(key)
+        if i is None:
+            return []
+        term_ids = self._fuzzy_values[self._fuzzy_value_offsets[i] : self._fuzzy_value_offsets[i + 1]]
+        return [self._terms[term_id].decode("utf-8") for term_id in term_ids]
+
+    def _fuzzy_terms(self, token: str) -> List[str]:
+        """英文詞在索引中找不到時，找出編輯距離 1 的詞"""
+        if not token.isascii() or len(token) <= 3:
+            return []
+        candidates = set(self._fuzzy_lookup(token))  # 查詢詞多打一個字
+        for key in _deletes(token):
+            if self._terms.find(key) is not None:  # 查詢詞少打一個字
+                candidates.add(key)
+            candidates.update(self._fuzzy_lookup(key))  # 打錯一個字
+        return sorted(candidates)
+
+    def _expand(self, query: str) -> Dict[str, float]:
+        """查詢詞 -> 權重 (含同義詞與模糊比對)"""
+        weights: Dict[str, float] = {}
+        lowered = query.lower()
+        query_tokens = tokenize(query)
+        for token in query_tokens:
+            weights[token] = 1.0
+        for group in SYNONYM_GROUPS:
+            if any(word in lowered or _near(word, query_tokens) for word in group):
+                for word in group:
+                    for token in tokenize(word):
+                        weights.setdefault(token, SYNONYM_WEIGHT)
+        for token in list(weights):
+            if self._terms.find(token) is None:
+                for term in self._fuzzy_terms(token):
+                    weights.setdefault(term, FUZZY_WEIGHT)
+        return weights
+
+    def search(self, query: str, limit: int = 3) -> List[Dict]:
+        """
+        查詢員工手冊
+
+        Returns:
+            依分數排序的 [{"title", "score", "snippet"}]
+        """
+        total_docs = len(self.sections)
+        scores: Dict[int, float] = {}
+        matched_terms: Dict[int, List[str]] = {}
+        # 由少見的詞開始算；出現在一半以上章節的常見詞只加分給已命中的章節，不再掃整個 posting list
+        expanded = []
+        for term, weight in self._expand(query).items():
+            entry = self._term_entry(term)
+            if entry is not None:
+                expanded.append((term, weight, entry))
+        expanded.sort(key=lambda item: item[2][1])
+        norms: Dict[int, float] = {}
+        for term, weight, (offset, df) in expanded:
+            idf = math.log(1 + (total_docs - df + 0.5) / (df + 0.5))
+            factor = weight * idf * (BM25_K1 + 1)
+            posting = self._postings[offset : offset + df * 2].tolist()
+            if scores and df * 2 > total_docs:
+                tf_by_doc = dict(zip(posting[::2], posting[1::2]))
+                for doc_id in scores:
+                    tf = tf_by_doc.get(doc_id)
+                    if tf:
+                        scores[doc_id] += factor * tf / (tf + norms[doc_id])
+                        matched_terms[doc_id].append(term)
+                continue
+            for doc_id, tf in zip(posting[::2], posting[1::2]):
+                norm = norms.get(doc_id)
+                if norm is None:
+                    norm = norms[doc_id] = self._norm(doc_id)
+                scores[doc_id] = scores.get(doc_id, 0.0) + factor * tf / (tf + norm)
+                matched_terms.setdefault(doc_id, []).append(term)
+
+        ranked = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+        return [
+            {
+                "title": self.sections.title(doc_id),
+                "score": round(score, 3),
+                "snippet": self._snippet(self.sections.body(doc_id), matched_terms[doc_id]),
+            }
+            for doc_id, score in ranked
+        ]
+
+    def as_mapping(self) -> Mapping:
+        """章節標題 -> 內容 (不會先解碼全部章節)"""
+        return _SectionMap(self)
+
+    def get_section(self, title: str) -> Optional[str]:
+        """依章節標題取得完整內容"""
+        i = self._titles.find(title)
+        return self.sections.body(self._title_docs[i]) if i is not None else None
+
+    @staticmethod
+    def _snippet(text: str, terms: List[str], width: int = 60) -> str:
+        """擷取第一個命中詞附近的文字"""
+        lowered = text.lower()
+        positions = [lowered.find(t) for t in terms if lowered.find(t) >= 0]
+        if not positions or len(text) <= width:
+            return text[:width] + ("…" if len(text) > width else "")
+        start = max(min(positions) - width // 3, 0)
+        end = min(start + width, len(text))
+        return ("…" if start else "") + text[start:end] + ("…" if end < len(text) else "")
+
+
+_index: Optional[HandbookIndex] = None
+_index_lock = threading.Lock()
+# 下次檢查手冊檔變動的時間 (time.monotonic)
+_next_check = 0.0
+
+
+def get_handbook_index(
+    directory: str = settings.HANDBOOK_DIR,
+    index_path: str = settings.HANDBOOK_INDEX_PATH,
+    check_seconds: float = settings.HANDBOOK_CHECK_SECONDS,
+) -> Optional[HandbookIndex]:
+    """
+    取得員工手冊索引；原始檔有變動或索引不存在時先重建。沒有手冊檔時返回 None
+
+    每 check_seconds 秒才重新檢查一次手冊檔 (glob + stat)，其間直接返回已載入的索引。
+    """
+    global _index, _next_check
+    if time.monotonic() < _next_check:
+        return _index
+    with _index_lock:
+        if time.monotonic() < _next_check:
+            return _index
+        fingerprint = _source_fingerprint(directory)
+        if _index is None or _index.fingerprint != fingerprint:
+            _index = _load_or_build(directory, index_path, fingerprint)
+        _next_check = time.monotonic() + check_seconds
+        return _index
+
+
+def _load_or_build(directory: str, index_path: str, fingerprint: str) -> Optional[HandbookIndex]:
+    """載入索引檔，指紋不符或無法讀取時從手冊檔重建"""
+    try:
+        index = HandbookIndex(index_path) if os.path.exists(index_path) else None
+    except (ValueError, OSError):
+        index = None
+    if index is not None and index.fingerprint == fingerprint:
+        return index
+    sections = load_handbook_sections(directory)
+    if not sections:
+        return None
+    build_index(sections, index_path, fingerprint)
+    return HandbookIndex(index_path)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--build":
+        sections = load_handbook_sections()
+        build_index(sections, settings.HANDBOOK_INDEX_PATH, _source_fingerprint(settings.HANDBOOK_DIR))
+        print(f"Indexed {len(sections)} sections -> {settings.HANDBOOK_INDEX_PATH}")
+    else:
+        handbook_index = get_handbook_index()
+        if handbook_index is None:
+            sys.exit(f"No handbook files found in {settings.HANDBOOK_DIR}")
+        query = " ".join(sys.argv[1:]) or "加班"
+        started = time.perf_counter()
+        results = handbook_index.search(query)
+        elapsed = (time.perf_counter() - started) * 1000
+        for result in results:
+            print(f"[{result['score']}] {result['title']}: {result['snippet']}")
+        print(f"{len(results)} results in {elapsed:.3f} ms")
@@ -1,4 +1,10 @@
-from typing import Dict, Optional
+import hashlib
+import json
+from typing import Dict, Mapping, Optional
+
+from services.telemetry import timed_tool
+from tools.checklist_store import CHECKLIST_ITEMS, get_checklist_store
+from tools.handbook_search import get_handbook_index
 
 # HR資料庫
 HR_POLICIES = {
@@ -24,7 +30,36 @@ HR_POLICIES = {
     },
 }
 
+# 員工手冊 (手冊檔不存在時的內建內容，有 data/handbook/*.md 時以手冊檔為準)
+_BUILTIN_HANDBOOK = {
+    "請假": "請假需提前3天申請，病假當日通知主管即可。特休需經主管核准。",
+    "加班": "加班需事前申請，平日加班費為1.33倍，假日為1.66倍。",
+    "出差": "國內出差補助每日1000元，國外出差依地區有不同標準。",
+    "考核": "每半年進行一次績效考核，評分影響年終獎金及升遷。",
+}
+
+
+
+def get_employee_handbook() -> Mapping[str, str]:
+    """
+    目前的員工手冊 (章節標題 -> 內容)
+
+    每次呼叫都取最新的索引，手冊檔變動後不會沿用舊內容；匯入本模組時不載入索引。
+    """
+    index = get_handbook_index()
+    return index.as_mapping() if index else _BUILTIN_HANDBOOK
+
+
+def hr_data_fingerprint() -> str:
+    """HR 政策與員工手冊內容的指紋，內容有任何變動時會改變 (供快取失效判斷)"""
+    index = get_handbook_index()
+    # 手冊檔的指紋由檔名、大小與修改時間組成，不必讀出全部章節
+    handbook = index.fingerprint if index else _BUILTIN_HANDBOOK
+    data = json.dumps([HR_POLICIES, handbook], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()[:16]
+
 
+@timed_tool
 def query_hr_policy(category: str, sub_category: Optional[str] = None) -> str:
     """
     查詢HR政策資訊
@@ -60,9 +95,51 @@ def query_hr_policy(category: str, sub_category: Optional[str] = None) -> str:
         return result
 
 
+@timed_tool
+def calculate_annual_leave(
+    hire_date: str, as_of: Optional[str] = None, used_days: float = 0
+) -> Dict:
+    """
+    依到職日計算員工的特休天數
+
+    Args:
+        hire_date: 到職日，格式 YYYY-MM-DD
+        as_of: 計算基準日，格式 YYYY-MM-DD，預設為今天
+        used_days: 今年已休的特休天數
+
+    Returns:
+        包含在職月數、特休天數與剩餘天數的字典
+
+    Examples:
+        calculate_annual_leave("2023-03-01", "2025-06-30") -> 年資2年，10天特休
+    """
+    # numpy 在第一次計算時才匯入，不拖慢服務啟動
+    from tools.leave_calculator import calculate_leave_balances
+
+    try:
+        result = calculate_leave_balances(
+            [{"hire_date": hire_date, "used_days": used_days}], as_of
+        )[0]
+    except ValueError:
+        return {"status": "error", "message": "日期格式錯誤，請使用 YYYY-MM-DD"}
+    months = result["tenure_months"]
+    if months < 0:
+        return {"status": "error", "message": "到職日晚於計算基準日"}
+    return {
+        "status": "success",
+        "hire_date": hire_date,
+        "as_of": as_of or "today",
+        "tenure": f"{months // 12}年{months % 12}個月",
+        "entitled_days": result["entitled_days"],
+        "used_days": float(used_days),
+        "remaining_days": result["remaining_days"],
+    }
+
+
+@timed_tool
 def get_onboarding_checklist(employee_name: str) -> Dict:
     """
-    取得新員工入職檢查清單
+    取得新員工入職檢查清單 (含目前各項目的完成狀態)
 
     Args:
         employee_name: 新員工姓名
@@ -70,35 +147,80 @@ def get_onboarding_checklist(employee_name: str) -> Dict:
     Returns:
         入職檢查清單字典
     """
+    store = get_checklist_store()
+    checklist = store.get(employee_name)
+    if checklist is None:
+        store.ensure(employee_name)
+        checklist = store.get(employee_name)
+    return checklist
+
+
+@timed_tool
+def update_onboarding_checklist(employee_name: str, item: str, completed: bool = True) -> Dict:
+    """
+    更新新員工入職檢查清單的項目狀態
+
+    Args:
+        employee_name: 新員工姓名
+        item: 檢查清單項目，可選值: "HR政策諮詢"、"IT帳號申請"、"福利申請"、
+              "工作環境設定"、"工作流程熟悉"
+        completed: True 標記為已完成，False 改回未完成
+
+    Returns:
+        更新後的入職檢查清單
+    """
+    if item not in CHECKLIST_ITEMS:
+        return {"success": False, "message": f"未知的項目{item},可用項目{'、'.join(CHECKLIST_ITEMS)}"}
+    store = get_checklist_store()
+    store.mark(employee_name, item, done=completed, source="update_onboarding_checklist")
+    return store.get(employee_name)
+
+
+@timed_tool
+def get_onboarding_progress(dept: Optional[str] = None, group_by: str = "dept") -> Dict:
+    """
+    查詢新進員工整體入職進度
+
+    Args:
+        dept: 只看某部門的未完成員工，預設全部
+        group_by: 梯次彙總方式，"dept" (依部門) 或 "month" (依建立入職清單的月份，非到職日)
+
+    Returns:
+        各梯次完成比例，以及還有未完成項目的員工清單
+    """
+    store = get_checklist_store()
+    try:
+        cohorts = store.cohort_progress(group_by)
+    except ValueError:
+        return {"success": False, "message": "group_by 只能是 dept 或 month"}
     return {
-        "employee": employee_name,
-        "checklist": [
-            {"item": "HR政策諮詢", "status": "未完成"},
-            {"item": "IT帳號申請", "status": "未完成"},
-            {"item": "福利申請", "status": "未完成"},
-            {"item": "工作環境設定", "status": "未完成"},
-            {"item": "工作流程熟悉", "status": "未完成"},
-        ],
+        "cohorts": cohorts,
+        "pending_employees": store.pending_employees(dept=dept, limit=50),
     }
 
 
+@timed_tool
 def search_employee_handbook(keyword: str) -> str:
     """
     搜尋員工手冊
 
     Args:
-        keyword: 搜尋關鍵字,例如 "請假", "加班", "出差"
+        keyword: 搜尋關鍵字或問題,例如 "請假", "加班費怎麼算", "差旅補助"
 
     Returns:
-        相關規定說明
+        相關規定說明 (關鍵字剛好是章節標題時返回整個章節，否則返回最相關的段落)
     """
-    handbook = {
-        "請假": "請假需提前3天申請，病假當日通知主管即可。特休需經主管核准。",
-        "加班": "加班需事前申請，平日加班費為1.33倍，假日為1.66倍。",
-        "出差": "國內出差補助每日1000元，國外出差依地區有不同標準。",
-        "考核": "每半年進行一次績效考核，評分影響年終獎金及升遷。",
-    }
-    if keyword in handbook:
-        return handbook[keyword]
-    else:
-        return f"未找到關鍵字{keyword}的手冊,可用關鍵字{'、'.join(handbook.keys())}"
+    index = get_handbook_index()
+    if index is None:
+        if keyword in _BUILTIN_HANDBOOK:
+            return _BUILTIN_HANDBOOK[keyword]
+        return f"未找到關鍵字{keyword}的手冊,可用關鍵字{'、'.join(_BUILTIN_HANDBOOK.keys())}"
+
+    section = index.get_section(keyword)
+    if section is not None:
+        return section
+    results = index.search(keyword)
+    if not results:
+        titles = [index.sections.title(i) for i in range(min(len(index.sections), 20))]
+        return f"未找到關鍵字{keyword}的手冊,可用章節{'、'.join(titles)}"
+    return "\n".join(f"【{r['title']}】{r['snippet']}" for r in results)
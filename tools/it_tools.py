@@ -1,147 +1,84 @@
 """IT部門專用工具函式"""
 
-import os
 import random
+import sqlite3
 import string
-from typing import Dict, List
+from concurrent.futures import Future
+from typing import Dict, List, Optional
 
-import gspread
-from dotenv import load_dotenv
+from services.telemetry import timed_tool
+from tools.account_store import (
+    QUERY_FIELDS,
+    QUERY_MAX_LIMIT,
+    SharedAccountStore,
+    SheetAccountStore,
+    get_account_store,
+)
+from tools.checklist_store import get_checklist_store
+from tools.sheet_writer import STATUS_PENDING, STATUS_SYNCED
 
-load_dotenv()
+# 帳號資料存取層 (由 ACCOUNT_STORE 設定 Google Sheet 或 SQLite 後端)
+ACCOUNT_STORE = get_account_store()
 
+# 模擬IT帳號資料庫 (Sheet 後端的記憶體快取；異動請透過 ACCOUNT_STORE 以維護索引)
+EMPLOYEE_ACCOUNTS: Dict[str, Dict] = (
+    ACCOUNT_STORE.accounts if isinstance(ACCOUNT_STORE, SheetAccountStore) else {}
+)
 
-def _get_credentials_path() -> str:
-    """取得 credentials.json 的絕對路徑"""
-    service_account_file = os.getenv("SERVICE_ACCOUNT_FILE")
-    if not service_account_file:
-        return ""
 
-    # 如果已經是絕對路徑，直接返回
-    if os.path.isabs(service_account_file):
-        return service_account_file
+def _load_employee_data_from_sheet() -> Dict:
+    """從 Google Sheet 載入全部員工資料 (整表同步)"""
+    if isinstance(ACCOUNT_STORE, SheetAccountStore):
+        return ACCOUNT_STORE.load_from_sheet()
+    return {}
 
-    # 否則相對於專案根目錄（.env 所在的目錄，即 tools 的上層目錄）
-    current_file = os.path.abspath(__file__)  # 取得當前檔案的絕對路徑
-    project_root = os.path.dirname(os.path.dirname(current_file))  # tools 的上層
-    return os.path.join(project_root, service_account_file)
 
+def start_employee_data_load() -> Optional[Future]:
+    """在背景開始載入員工資料（只會啟動一次）"""
+    return ACCOUNT_STORE.start_loading()
 
-def _load_employee_data_from_sheet() -> Dict:
-    """從 Google Sheet 載入員工資料"""
-    try:
-        service_account_file = _get_credentials_path()
-        sheet_id = os.getenv("SHEET_ID")
-        sheet_name = os.getenv("SHEET_NAME")
-        worksheet_name = os.getenv("WORKSHEET_NAME")
-
-        if not service_account_file:
-            print("Warning: Google Sheet credentials not found in .env")
-            return {}
-
-        gc = gspread.service_account(filename=service_account_file)
-
-        if sheet_id:
-            sh = gc.open_by_key(sheet_id)
-        elif sheet_name:
-            sh = gc.open(sheet_name)
-        else:
-            print("Warning: Neither SHEET_ID nor SHEET_NAME found in .env")
-            return {}
-
-        # 嘗試開啟指定的工作表，如果沒指定則開第一個
-        if worksheet_name:
-            worksheet = sh.worksheet(worksheet_name)
-        else:
-            worksheet = sh.sheet1
-
-        records = worksheet.get_all_records()
-
-        accounts = {}
-        for row in records:
-            # 假設 Sheet 欄位: username, email, password, vpn, permissions
-            email = row.get("email")
-            if not email:
-                continue
-
-            permissions_str = row.get("permissions", "")
-            permissions = (
-                [p.strip() for p in permissions_str.split(",")]
-                if permissions_str
-                else []
-            )
-
-            accounts[email] = {
-                "username": row.get("username"),
-                "email": email,
-                "password": row.get("password"),
-                "vpn": row.get("vpn"),
-                "permissions": permissions,
-            }
-        return accounts
-    except Exception as e:
-        print(f"Error loading data from Google Sheet: {e}")
-        return {}
-
-
-def _append_to_sheet(employee_data: Dict) -> bool:
-    """將新員工資料寫入 Google Sheet"""
+
+def _ensure_accounts_loaded(email: Optional[str] = None) -> str:
+    """等待帳號資料可用 (Sheet 後端最多等 EMPLOYEE_LOAD_TIMEOUT 秒，逾時改用本地快照)"""
+    return ACCOUNT_STORE.wait_ready(email)
+
+
+def get_load_status() -> Dict:
+    """取得員工資料載入狀態（供 readiness 檢查使用）"""
+    return ACCOUNT_STORE.get_status()
+
+
+def _mark_checklist(
+    email: str,
+    item: str,
+    source: str,
+    employee_name: Optional[str] = None,
+    dept: Optional[str] = None,
+) -> None:
+    """把入職檢查清單的項目標記為完成 (找不到員工姓名時略過)，失敗不影響工具結果"""
     try:
-        # 讀取環境變數
-        service_account_file = _get_credentials_path()
-        sheet_id = os.getenv("SHEET_ID")
-        sheet_name = os.getenv("SHEET_NAME")
-        worksheet_name = os.getenv("WORKSHEET_NAME")
-
-        # 檢查環境變數是否設定
-        if not service_account_file:
-            print("Warning: Google Sheet credentials not found in .env")
-            return False
-
-        gc = gspread.service_account(filename=service_account_file)
-
-        if sheet_id:
-            sh = gc.open_by_key(sheet_id)
-        elif sheet_name:
-            sh = gc.open(sheet_name)
-        else:
-            print("Warning: Neither SHEET_ID nor SHEET_NAME found in .env")
-            return False
-
-        if worksheet_name:
-            worksheet = sh.worksheet(worksheet_name)
-        else:
-            worksheet = sh.sheet1
-
-        # 將 permissions 轉換為逗號分隔的字串
-        permissions_str = ",".join(employee_data.get("permissions", []))
-
-        # 準備要寫入的資料行（對應 Sheet 欄位順序）
-        row_data = [
-            employee_data.get("username", ""),
-            employee_data.get("email", ""),
-            employee_data.get("password", ""),
-            employee_data.get("vpn", ""),
-            permissions_str,
-        ]
-
-        # 附加到 Sheet 的最後一行
-        worksheet.append_row(row_data)
-        print(
-            f"Successfully added employee {employee_data.get('email')} to Google Sheet"
-        )
-        return True
-
-    except Exception as e:
-        print(f"Error writing to Google Sheet: {e}")
-        return False
-
-
-# 模擬IT帳號資料庫 (改為從 Sheet 讀取)
-EMPLOYEE_ACCOUNTS = _load_employee_data_from_sheet()
+        store = get_checklist_store()
+        if employee_name is None:
+            account = ACCOUNT_STORE.get(email) or {}
+            employee_name = account.get("employee_name") or store.find_employee_by_email(email)
+        if employee_name:
+            store.mark(employee_name, item, source=source, dept=dept, email=email)
+    except sqlite3.Error as e:
+        print(f"Error updating onboarding checklist: {e}")
+
+
+def _username_for(employee_name: str) -> str:
+    """由員工姓名產生使用者名稱"""
+    return employee_name.strip().lower().replace(" ", "_")
+
+
+def _generate_temp_password() -> str:
+    """產生臨時密碼"""
+    return "".join(random.choices(string.ascii_letters + string.digits, k=8)) + "!"
 
 
 # 建立員工郵件帳號
+@timed_tool
 def create_email_acount(employee_name: str, dept: str) -> Dict:
     """
     為新員工建立公司郵件帳號
@@ -158,40 +95,44 @@ def create_email_acount(employee_name: str, dept: str) -> Dict:
         -> {"email": "xiaoming.zhang@company.com", "initial_password": "Temp1234!"}
     """
 
-    username = employee_name.lower().replace(" ", "_")
+    _ensure_accounts_loaded()
+
+    username = _username_for(employee_name)
     email = f"{username}@company.com"
-    temp_password = (
-        "".join(random.choices(string.ascii_letters + string.digits, k=8)) + "!"
-    )
+    temp_password = _generate_temp_password()
 
     # 準備新帳號資料
     new_account = {
         "username": username,
+        "employee_name": employee_name,
         "email": email,
         "password": temp_password,
+        "dept": dept,
         "status": "active",
         "permissions": [],
     }
 
-    # 寫入 Google Sheet
-    sheet_success = _append_to_sheet(new_account)
-
-    # 同時更新記憶體中的資料（使用 email 作為 key）
-    EMPLOYEE_ACCOUNTS[email] = new_account
+    # 寫入帳號資料層 (Sheet 後端先更新記憶體並排入寫入佇列，立即回應)
+    sync_status = ACCOUNT_STORE.create(new_account)
+    _mark_checklist(email, "IT帳號申請", "create_email_acount", employee_name=employee_name, dept=dept)
 
     return {
         "email": email,
         "initial_password": temp_password,
+        "sync_status": sync_status,
         "message": "Account created successfully"
         + (
-            " and synced to Google Sheet"
-            if sheet_success
+            " (Google Sheet sync pending)"
+            if sync_status == STATUS_PENDING
+            else " and saved"
+            if sync_status == STATUS_SYNCED
             else " (failed to sync to sheet)"
         ),
     }
 
 
 # 權限分配工具
+@timed_tool
 def assign_system_permission(email: str, systems: List[str]) -> Dict:
     """
     分配系統存取權限
@@ -203,13 +144,14 @@ def assign_system_permission(email: str, systems: List[str]) -> Dict:
     Returns:
         權限分配結果
     """
-    if email not in EMPLOYEE_ACCOUNTS:
+    _ensure_accounts_loaded(email)
+    if ACCOUNT_STORE.update(email, permissions=systems) is None:
         return {
             "success": False,
             "message": "Employee not found, please create account first",
         }
+    _mark_checklist(email, "工作環境設定", "assign_system_permission")
 
-    EMPLOYEE_ACCOUNTS[email]["permissions"] = systems
     return {
         "success": True,
         "email": email,
@@ -218,6 +160,7 @@ def assign_system_permission(email: str, systems: List[str]) -> Dict:
     }
 
 
+@timed_tool
 def setup_vpn_access(email: str) -> Dict:
     """
     設定VPN遠端存取權限
@@ -228,7 +171,8 @@ def setup_vpn_access(email: str) -> Dict:
     Returns:
         VPN設定指引
     """
-    if email not in EMPLOYEE_ACCOUNTS:
+    _ensure_accounts_loaded(email)
+    if email not in ACCOUNT_STORE:
         return {"success": False, "message": "郵件帳號不存在"}
 
     vpn_config = {
@@ -245,10 +189,11 @@ def setup_vpn_access(email: str) -> Dict:
         ],
     }
 
-    EMPLOYEE_ACCOUNTS[email]["vpn_enabled"] = True
+    ACCOUNT_STORE.update(email, vpn_enabled=True, vpn="enabled")
     return vpn_config
 
 
+@timed_tool
 def reset_password(email: str) -> Dict:
     """
     重設帳號密碼
@@ -259,14 +204,11 @@ def reset_password(email: str) -> Dict:
     Returns:
         新的臨時密碼
     """
-    if email not in EMPLOYEE_ACCOUNTS:
+    _ensure_accounts_loaded(email)
+    new_temp_password = _generate_temp_password()
+    if ACCOUNT_STORE.update(email, password=new_temp_password) is None:
         return {"success": False, "message": "郵件帳號不存在"}
 
-    new_temp_password = (
-        "".join(random.choices(string.ascii_letters + string.digits, k=8)) + "!"
-    )
-    EMPLOYEE_ACCOUNTS[email]["password"] = new_temp_password
-
     return {
         "success": True,
         "email": email,
@@ -275,6 +217,77 @@ def reset_password(email: str) -> Dict:
     }
 
 
+@timed_tool
+def get_account_sync_status(email: str) -> Dict:
+    """
+    查詢帳號異動是否已同步到 Google Sheet
+
+    Args:
+        email: 員工郵件地址
+
+    Returns:
+        同步狀態: "pending" (排隊中) / "synced" (已同步)
+    """
+    _ensure_accounts_loaded(email)
+    status = ACCOUNT_STORE.sync_status(email)
+    if status is None:
+        return {"success": False, "message": "郵件帳號不存在"}
+    return {"email": email, "sync_status": status}
+
+
+@timed_tool
+def query_employee_accounts(
+    email: Optional[str] = None,
+    username_prefix: Optional[str] = None,
+    dept: Optional[str] = None,
+    permission: Optional[str] = None,
+    vpn_enabled: Optional[bool] = None,
+    fields: Optional[List[str]] = None,
+    cursor: Optional[str] = None,
+    limit: int = 20,
+) -> Dict:
+    """
+    查詢員工帳號 (條件之間為 AND，依 email 排序分頁，不會返回密碼)
+
+    Args:
+        email: 員工郵件地址
+        username_prefix: 使用者名稱開頭，例如 "amy" 可找到 amy、amy_chen
+        dept: 部門名稱
+        permission: 擁有的系統權限，例如 "GitLab"
+        vpn_enabled: True 只找已開通 VPN，False 只找未開通 VPN
+        fields: 要返回的欄位，可選 "email"、"username"、"employee_name"、"dept"、
+                "status"、"permissions"、"vpn_enabled"，預設全部
+        cursor: 上一次查詢返回的 next_cursor，用來取得下一頁
+        limit: 每頁筆數 (最多 100)
+
+    Returns:
+        {"accounts": 帳號清單, "count": 本頁筆數, "next_cursor": 下一頁游標 (沒有下一頁時為 None)}
+    """
+    unknown = [f for f in fields or [] if f not in QUERY_FIELDS]
+    if unknown:
+        return {
+            "success": False,
+            "message": f"不支援的欄位 {'、'.join(unknown)}，可用欄位 {'、'.join(QUERY_FIELDS)}",
+        }
+
+    _ensure_accounts_loaded(email)
+    if isinstance(ACCOUNT_STORE, (SheetAccountStore, SharedAccountStore)):
+        # 快取超過 TTL 時只從 Google Sheet 同步新增的資料列
+        ACCOUNT_STORE.roster.ensure_fresh()
+    accounts, next_cursor = ACCOUNT_STORE.query(
+        email=email,
+        username_prefix=username_prefix,
+        dept=dept,
+        permission=permission,
+        vpn_enabled=vpn_enabled,
+        after=cursor,
+        limit=max(1, min(limit, QUERY_MAX_LIMIT)),
+        fields=fields or QUERY_FIELDS,
+    )
+    return {"accounts": accounts, "count": len(accounts), "next_cursor": next_cursor}
+
+
+@timed_tool
 def get_it_support_info(issue_type: str) -> str:
     """
     取得IT支援資訊
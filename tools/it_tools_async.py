@@ -0,0 +1,97 @@
+"""IT 工具的 async 版本 (IT 專員的 A2A 服務使用)
+
+同步的工具直接在 event loop 上執行時，一次慢的 Google Sheet 或資料庫呼叫會卡住
+同一個 worker 的所有請求。這裡把 tools.it_tools 的工具放到有上限的執行緒池執行：
+    - 同一個 email 的異動依序執行 (asyncio.Lock)，更新帳號與勾選檢查清單視為同一個步驟
+    - 不同 email 的呼叫可以平行；帳號資料層的更新本身是原子的讀-改-寫，version 每次加一
+工具名稱、說明與參數都和同步版本相同，模型看到的工具定義不變。
+"""
+
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Callable, Dict, Optional
+
+from config.settings import settings
+from tools import bulk_onboarding, it_tools
+
+_executor = ThreadPoolExecutor(max_workers=settings.IT_TOOL_WORKERS, thread_name_prefix="it-tool")
+
+
+async def run_blocking(func: Callable, *args, **kwargs):
+    """在工具執行緒池執行 func (沿用目前的 contextvars，trace span 可接續)"""
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(_executor, functools.partial(context.run, func, *args, **kwargs))
+
+
+class KeyedLocks:
+    """依鍵 (email) 分開的 asyncio.Lock，沒有人使用時自動移除"""
+
+    def __init__(self):
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._waiters: Dict[str, int] = {}
+
+    @asynccontextmanager
+    async def hold(self, key: Optional[str]):
+        if not key:
+            yield
+            return
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = self._locks[key] = asyncio.Lock()
+        self._waiters[key] = self._waiters.get(key, 0) + 1
+        try:
+            async with lock:
+                yield
+        finally:
+            self._waiters[key] -= 1
+            if not self._waiters[key]:
+                del self._waiters[key]
+                del self._locks[key]
+
+    def __len__(self) -> int:
+        return len(self._locks)
+
+
+account_locks = KeyedLocks()
+
+
+def _email_of(kwargs: Dict) -> Optional[str]:
+    return kwargs.get("email")
+
+
+def _new_email_of(kwargs: Dict) -> Optional[str]:
+    name = kwargs.get("employee_name")
+    return f"{it_tools._username_for(name)}@company.com" if name else None
+
+
+def async_tool(sync_tool: Callable, lock_key: Optional[Callable[[Dict], Optional[str]]] = None) -> Callable:
+    """
+    把同步工具包成 async 工具
+
+    Args:
+        sync_tool: tools.it_tools 中的工具函式
+        lock_key: 由呼叫參數取得要上鎖的 email；None 表示唯讀工具，不上鎖
+    """
+
+    @functools.wraps(sync_tool)
+    async def tool(**kwargs):
+        async with account_locks.hold(lock_key(kwargs) if lock_key else None):
+            return await run_blocking(sync_tool, **kwargs)
+
+    return tool
+
+
+create_email_acount = async_tool(it_tools.create_email_acount, _new_email_of)
+assign_system_permission = async_tool(it_tools.assign_system_permission, _email_of)
+setup_vpn_access = async_tool(it_tools.setup_vpn_access, _email_of)
+reset_password = async_tool(it_tools.reset_password, _email_of)
+get_account_sync_status = async_tool(it_tools.get_account_sync_status)
+query_employee_accounts = async_tool(it_tools.query_employee_accounts)
+bulk_onboard_employees = async_tool(bulk_onboarding.bulk_onboard_employees)
+get_bulk_onboarding_results = async_tool(bulk_onboarding.get_bulk_onboarding_results)
+# 純查表，不需要離開 event loop
+get_it_support_info = it_tools.get_it_support_info
@@ -0,0 +1,196 @@
+"""特休天數計算
+
+依 HR_POLICIES["annual_leave"] 的規定，由到職日與計算基準日算出特休天數：
+    - 未滿 3 個月: 0 天
+    - 滿 3 個月未滿 1 年: 7 天依在職月數比例計算 (以半天為單位無條件捨去)
+    - 滿 1 年: 7 天；滿 2 年: 10 天；滿 3 年未滿 5 年: 14 天
+    - 滿 5 年以上: 每年增加 1 天 (5 年 15 天)，最多 30 天
+
+整批計算以 NumPy 陣列一次算完整份名冊，供薪資結算使用。
+
+用法:
+    python -m tools.leave_calculator roster.csv --as-of 2025-12-31 -o leave.csv
+    python -m tools.leave_calculator --benchmark 50000
+"""
+
+import argparse
+import csv
+import datetime
+import sys
+import time
+from typing import Dict, Iterable, List, Optional, Union
+
+import numpy as np
+
+DateLike = Union[str, datetime.date]
+
+# 規定中的門檻與天數
+MIN_MONTHS = 3
+FIRST_YEAR_DAYS = 7
+TENURE_DAYS = {1: 7, 2: 10, 3: 14, 4: 14}  # 滿 N 年 (未滿 5 年) 的天數
+SENIOR_YEARS = 5
+SENIOR_BASE_DAYS = 10  # 滿 5 年以上: 年資 + 10 天
+MAX_DAYS = 30
+
+
+def _to_date(value: DateLike) -> datetime.date:
+    if isinstance(value, datetime.date):
+        return value
+    return datetime.date.fromisoformat(value.strip())
+
+
+def tenure_months(hire_dates: np.ndarray, as_of: np.datetime64) -> np.ndarray:
+    """
+    計算滿幾個月 (到職日當月的同一天起算，未到當天不算滿月)
+
+    Args:
+        hire_dates: datetime64[D] 陣列
+        as_of: 計算基準日 (datetime64[D])
+
+    Returns:
+        int 陣列，基準日早於到職日時為負數
+    """
+    hire_months = hire_dates.astype("datetime64[M]")
+    hire_day = (hire_dates - hire_months.astype("datetime64[D]")).astype(np.int64)
+    as_of_month = np.datetime64(as_of, "M")
+    as_of_day = (np.datetime64(as_of, "D") - as_of_month.astype("datetime64[D]")).astype(np.int64)
+    months = (as_of_month - hire_months).astype(np.int64)
+    return months - (as_of_day < hire_day)
+
+
+def annual_leave_days(hire_dates: Iterable[DateLike], as_of: Optional[DateLike] = None) -> np.ndarray:
+    """
+    整批計算特休天數
+
+    Args:
+        hire_dates: 到職日 (ISO 格式字串、date 或 datetime64 陣列)
+        as_of: 計算基準日，預設為今天
+
+    Returns:
+        float 陣列，與 hire_dates 順序相同
+    """
+    hire = np.asarray(hire_dates, dtype="datetime64[D]")
+    as_of_date = np.datetime64(_to_date(as_of) if as_of is not None else datetime.date.today(), "D")
+    months = tenure_months(hire, as_of_date)
+    years = months // 12
+
+    pro_rated = np.floor(FIRST_YEAR_DAYS * months / 12 * 2) / 2
+    by_tenure = np.select(
+        [years >= SENIOR_YEARS, years >= 3, years == 2, years == 1],
+        [np.minimum(years + SENIOR_BASE_DAYS, MAX_DAYS), TENURE_DAYS[3], TENURE_DAYS[2], TENURE_DAYS[1]],
+        default=0,
+    )
+    return np.where(
+        months < MIN_MONTHS,
+        0.0,
+        np.where(years < 1, pro_rated, by_tenure.astype(np.float64)),
+    )
+
+
+def annual_leave_days_scalar(hire_date: DateLike, as_of: Optional[DateLike] = None) -> float:
+    """逐筆計算特休天數 (作為整批計算的對照版本)"""
+    hire = _to_date(hire_date)
+    today = _to_date(as_of) if as_of is not None else datetime.date.today()
+    months = (today.year - hire.year) * 12 + (today.month - hire.month)
+    if today.day < hire.day:
+        months -= 1
+    if months < MIN_MONTHS:
+        return 0.0
+    years = months // 12
+    if years < 1:
+        return int(FIRST_YEAR_DAYS * months / 12 * 2) / 2
+    if years >= SENIOR_YEARS:
+        return float(min(years + SENIOR_BASE_DAYS, MAX_DAYS))
+    return float(TENURE_DAYS[years])
+
+
+def calculate_leave_balances(
+    rows: List[Dict], as_of: Optional[DateLike] = None
+) -> List[Dict]:
+    """
+    整批計算名冊的特休額度與剩餘天數
+
+    Args:
+        rows: 每筆需有 hire_date，可選 used_days (已休天數)，其餘欄位原樣保留
+        as_of: 計算基準日，預設為今天
+
+    Returns:
+        加上 tenure_months、entitled_days、remaining_days 欄位的新列表
+    """
+    if not rows:
+        return []
+    hire = np.array([row["hire_date"] for row in rows], dtype="datetime64[D]")
+    used = np.array([float(row.get("used_days") or 0) for row in rows])
+    as_of_date = _to_date(as_of) if as_of is not None else datetime.date.today()
+    months = tenure_months(hire, np.datetime64(as_of_date, "D"))
+    entitled = annual_leave_days(hire, as_of_date)
+    remaining = np.maximum(entitled - used, 0.0)
+    return [
+        {
+            **row,
+            "tenure_months": int(m),
+            "entitled_days": float(e),
+            "remaining_days": float(r),
+        }
+        for row, m, e, r in zip(rows, months, entitled, remaining)
+    ]
+
+
+def _benchmark(count: int) -> None:
+    """以隨機到職日比對整批計算與逐筆計算的結果及耗時"""
+    rng = np.random.default_rng(0)
+    as_of = datetime.date(2025, 12, 31)
+    offsets = rng.integers(-30, 40 * 365, size=count)
+    hire = np.datetime64(as_of, "D") - offsets.astype("timedelta64[D]")
+    hire_strings = hire.astype(str).tolist()
+
+    started = time.perf_counter()
+    vectorized = annual_leave_days(hire, as_of)
+    vectorized_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    scalar = [annual_leave_days_scalar(h, as_of) for h in hire_strings]
+    scalar_seconds = time.perf_counter() - started
+
+    mismatches = int(np.count_nonzero(vectorized != np.array(scalar)))
+    print(f"employees:   {count}")
+    print(f"vectorized:  {vectorized_seconds * 1000:.2f} ms")
+    print(f"scalar:      {scalar_seconds * 1000:.2f} ms")
+    print(f"speedup:     {scalar_seconds / vectorized_seconds:.1f}x")
+    print(f"mismatches:  {mismatches}")
+    if mismatches:
+        sys.exit(1)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="整批計算特休天數")
+    parser.add_argument("roster", nargs="?", help="名冊 CSV (需有 hire_date 欄，可選 used_days)")
+    parser.add_argument("--as-of", help="計算基準日 (YYYY-MM-DD)，預設為今天")
+    parser.add_argument("-o", "--output", help="輸出 CSV 路徑，預設輸出到 stdout")
+    parser.add_argument("--benchmark", type=int, metavar="N", help="以 N 筆隨機資料比對整批與逐筆計算")
+    args = parser.parse_args(argv)
+
+    if args.benchmark:
+        _benchmark(args.benchmark)
+        return
+    if not args.roster:
+        parser.error("roster is required unless --benchmark is given")
+
+    with open(args.roster, "r", encoding="utf-8-sig", newline="") as f:
+        rows = list(csv.DictReader(f))
+    results = calculate_leave_balances(rows, args.as_of)
+    if not results:
+        return
+
+    out = open(args.output, "w", encoding="utf-8", newline="") if args.output else sys.stdout
+    try:
+        writer = csv.DictWriter(out, fieldnames=list(results[0].keys()))
+        writer.writeheader()
+        writer.writerows(results)
+    finally:
+        if args.output:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
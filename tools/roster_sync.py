@@ -0,0 +1,427 @@
+"""員工名冊快取：依 TTL 增量同步 Google Sheet，不必每次重抓整張表
+
+讀取名冊時同時記下每個 email 所在的列號 (SheetRowIndex)，寫入佇列就地更新帳號欄位
+時不必重讀整張表。
+"""
+
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from config.settings import settings
+from tools.sheet_client import SheetSession, get_sheet_session
+
+# 預設欄位 (Sheet 沒有標題列時使用；既有 Sheet 缺少的欄位在第一次寫入時補在標題列最後)
+DEFAULT_HEADER = ["username", "email", "password", "vpn", "permissions", "dept"]
+
+# 帳號欄位 -> Sheet 欄位 (就地更新時只寫入有異動的欄位)
+FIELD_COLUMNS = {
+    "username": "username",
+    "password": "password",
+    "vpn": "vpn",
+    "vpn_enabled": "vpn",
+    "permissions": "permissions",
+    "dept": "dept",
+}
+
+
+def rowcol_to_a1(row: int, column: int) -> str:
+    """列、欄 (從 1 開始) 轉成 A1 表示法；gspread 在第一次用到時才匯入，不拖慢服務啟動"""
+    from gspread.utils import rowcol_to_a1 as _rowcol_to_a1
+
+    return _rowcol_to_a1(row, column)
+
+
+def account_to_row(employee_data: Dict) -> List:
+    """將帳號資料轉成 Google Sheet 的資料列"""
+    # 將 permissions 轉換為逗號分隔的字串
+    permissions_str = ",".join(employee_data.get("permissions", []))
+    vpn = "enabled" if employee_data.get("vpn_enabled") else employee_data.get("vpn", "")
+
+    # 準備要寫入的資料行（對應 Sheet 欄位順序）
+    return [
+        employee_data.get("username", ""),
+        employee_data.get("email", ""),
+        employee_data.get("password", ""),
+        vpn or "",
+        permissions_str,
+        employee_data.get("dept", ""),
+    ]
+
+
+def changed_columns(account: Dict, fields: Iterable[str]) -> Dict[str, str]:
+    """有異動的帳號欄位在 Sheet 中的新值 (欄位名稱 -> 值)，不在 Sheet 中的欄位略過"""
+    row = dict(zip(DEFAULT_HEADER, account_to_row(account)))
+    return {FIELD_COLUMNS[f]: row[FIELD_COLUMNS[f]] for f in fields if f in FIELD_COLUMNS}
+
+
+def parse_account_row(row: Dict) -> Optional[Dict]:
+    """將 Sheet 的一列 (欄位名稱 -> 值) 轉成帳號資料，沒有 email 的列返回 None"""
+    # 假設 Sheet 欄位: username, email, password, vpn, permissions, dept
+    email = row.get("email")
+    if not email:
+        return None
+
+    permissions_str = row.get("permissions", "")
+    permissions = (
+        [p.strip() for p in permissions_str.split(",")] if permissions_str else []
+    )
+
+    vpn = row.get("vpn")
+    return {
+        "username": row.get("username"),
+        "email": email,
+        "password": row.get("password"),
+        "vpn": vpn,
+        "vpn_enabled": str(vpn).strip().lower() in ("enabled", "true", "yes", "1"),
+        "permissions": permissions,
+        "dept": row.get("dept"),
+    }
+
+
+class RosterCache:
+    """
+    員工名冊的增量同步器
+
+    第一次 (以及每隔 full_refresh_seconds) 讀取整張表；其餘時間只在 TTL 到期後
+    讀取「上次已知列數之後」的新資料列，並透過 merge 回呼合併進既有的字典。
+    """
+
+    def __init__(
+        self,
+        merge: Callable[[Dict[str, Dict]], None],
+        ttl_seconds: float = settings.ROSTER_TTL_SECONDS,
+        full_refresh_seconds: float = settings.ROSTER_FULL_REFRESH_SECONDS,
+        session: Optional[SheetSession] = None,
+    ):
+        self._merge = merge
+        self._ttl = ttl_seconds
+        self._full_refresh_seconds = full_refresh_seconds
+        self._session = session or get_sheet_session()
+        self._lock = threading.Lock()
+        self._header: List[str] = []
+        self._known_rows = 0  # 已讀過的列數 (含標題列)
+        self._last_refresh: Optional[float] = None
+        self._last_full_refresh: Optional[float] = None
+        self._stats = {
+            "full_refreshes": 0,
+            "incremental_refreshes": 0,
+            "rows_fetched": 0,
+            "last_refresh_latency": None,
+            "total_refresh_latency": 0.0,
+            "refresh_errors": 0,
+        }
+
+    def _rows_to_accounts(self, rows: List[List]) -> Dict[str, Dict]:
+        accounts = {}
+        for values in rows:
+            row = dict(zip(self._header, values))
+            account = parse_account_row(row)
+            if account is not None:
+                accounts[account["email"]] = account
+        return accounts
+
+    def _record_rows(self, rows: List[List], first_row: int, replace: bool = False) -> None:
+        """記下每個 email 所在的列號"""
+        column = self._header.index("email") if "email" in self._header else None
+        if column is None:
+            return
+        positions = {
+            values[column]: first_row + i
+            for i, values in enumerate(rows)
+            if len(values) > column and values[column]
+        }
+        row_index = get_row_index()
+        row_index.set_header(self._header)
+        if replace:
+            row_index.replace(positions)
+        else:
+            row_index.record_many(positions)
+
+    def _fetch_all(self, worksheet) -> Dict[str, Dict]:
+        values = worksheet.get_all_values()
+        if not values:
+            self._header = list(DEFAULT_HEADER)
+            self._known_rows = 0
+            return {}
+        self._header = values[0]
+        self._known_rows = len(values)
+        self._stats["rows_fetched"] += len(values) - 1
+        self._record_rows(values[1:], 2, replace=True)
+        return self._rows_to_accounts(values[1:])
+
+    def _fetch_new_rows(self, worksheet) -> Dict[str, Dict]:
+        # 寫入佇列可能已補上缺少的標題欄位 (例如 dept)，改用較寬的標題
+        header = get_row_index().header()
+        if len(header) > len(self._header) and header[: len(self._header)] == self._header:
+            self._header = header
+        # 只讀取上次已知列數之後的範圍，例如 "A42:E"
+        first_row = self._known_rows + 1
+        last_col = rowcol_to_a1(1, len(self._header)).rstrip("0123456789")
+        rows = worksheet.get_values(f"A{first_row}:{last_col}")
+        if not rows:
+            return {}
+        self._record_rows(rows, first_row)
+        self._known_rows += len(rows)
+        self._stats["rows_fetched"] += len(rows)
+        return self._rows_to_accounts(rows)
+
+    def refresh(self, full: bool = False) -> Dict[str, Dict]:
+        """
+        與 Google Sheet 同步並合併結果
+
+        Args:
+            full: True 時重新讀取整張表，否則只讀新增的資料列
+
+        Returns:
+            本次讀到的帳號 (email -> 帳號資料)；未設定 Sheet 時為空字典
+        """
+        with self._lock:
+            now = time.time()
+            full = (
+                full
+                or self._known_rows == 0
+                or self._last_full_refresh is None
+                or now - self._last_full_refresh >= self._full_refresh_seconds
+            )
+            started = time.perf_counter()
+            try:
+                fetch = self._fetch_all if full else self._fetch_new_rows
+                accounts = self._session.call(fetch)
+            except Exception:
+                self._stats["refresh_errors"] += 1
+                raise
+            if accounts is None:
+                # 未設定 Sheet：同樣記下同步時間，TTL 內不再重試
+                self._last_refresh = now
+                return {}
+
+            self._merge(accounts)
+            latency = time.perf_counter() - started
+            self._last_refresh = now
+            if full:
+                self._last_full_refresh = now
+                self._stats["full_refreshes"] += 1
+            else:
+                self._stats["incremental_refreshes"] += 1
+            self._stats["last_refresh_latency"] = round(latency, 4)
+            self._stats["total_refresh_latency"] += latency
+            return accounts
+
+    def is_stale(self) -> bool:
+        """距離上次同步是否已超過 TTL"""
+        return self._last_refresh is None or time.time() - self._last_refresh >= self._ttl
+
+    def ensure_fresh(self) -> bool:
+        """TTL 到期時才同步，返回是否有實際同步"""
+        if not self.is_stale():
+            return False
+        try:
+            self.refresh()
+        except Exception as e:
+            print(f"Error refreshing employee roster: {e}")
+            return False
+        return True
+
+    def get_stats(self) -> Dict:
+        """取得同步統計 (資料新鮮度、同步延遲、讀取列數)"""
+        with self._lock:
+            stats = dict(self._stats)
+            refreshes = stats["full_refreshes"] + stats["incremental_refreshes"]
+            total_latency = stats.pop("total_refresh_latency")
+            stats["avg_refresh_latency"] = (
+                round(total_latency / refreshes, 4)
+                if refreshes
+                else None
+            )
+            stats["staleness_seconds"] = (
+                round(time.time() - self._last_refresh, 1)
+                if self._last_refresh is not None
+                else None
+            )
+            stats["known_rows"] = self._known_rows
+            stats["ttl_seconds"] = self._ttl
+            return stats
+
+
+class SheetRowIndex:
+    """
+    email -> Sheet 列號的索引 (執行緒安全)
+
+    讀取名冊時建立，寫入佇列 append 後依 API 回傳的 updatedRange 補上新列。
+    就地更新前以 resolve() 確認目標列的 email 仍相符 (一次 batch_get)；不相符或
+    查不到時讀一次 email 欄重建索引。每批更新的 API 呼叫數與工作表大小無關。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rows: Dict[str, int] = {}
+        self._header: List[str] = list(DEFAULT_HEADER)
+        self._header_checked = False
+        self._stats = {"verified": 0, "conflicts": 0, "relocations": 0}
+
+    def set_header(self, header: List[str]) -> None:
+        if header:
+            with self._lock:
+                self._header = list(header)
+                self._header_checked = all(name in header for name in DEFAULT_HEADER)
+
+    def header(self) -> List[str]:
+        with self._lock:
+            return list(self._header)
+
+    def ensure_header(self, call: Callable) -> None:
+        """
+        確認 Sheet 的標題列包含所有預設欄位，缺少的欄位補在最後 (例如舊表沒有 dept)
+
+        資料列依 DEFAULT_HEADER 的順序寫出；不補標題時，多出的欄位在下次讀取時會被略過。
+        已確認過的標題不再呼叫 API。
+
+        Args:
+            call: 以工作表執行函式的方法 (SheetSession.call)
+        """
+        with self._lock:
+            if self._header_checked:
+                return
+
+        def add_missing_columns(worksheet):
+            header = list(worksheet.row_values(1))
+            while header and not header[-1]:
+                header.pop()
+            missing = [name for name in DEFAULT_HEADER if name not in header]
+            if missing:
+                start = rowcol_to_a1(1, len(header) + 1)
+                end = rowcol_to_a1(1, len(header) + len(missing))
+                worksheet.update(values=[missing], range_name=f"{start}:{end}", value_input_option="RAW")
+            return header + missing
+
+        header = call(add_missing_columns)
+        if header is None:
+            return
+        with self._lock:
+            self._header = header
+            self._header_checked = True
+
+    def replace(self, rows: Dict[str, int]) -> None:
+        """以整表讀取的結果取代索引"""
+        with self._lock:
+            self._rows = dict(rows)
+
+    def record_many(self, rows: Dict[str, int]) -> None:
+        with self._lock:
+            self._rows.update(rows)
+
+    def record_append(self, emails: List[str], response: Optional[Dict]) -> None:
+        """
+        依 append_rows 的回應記下新列的列號
+
+        Args:
+            emails: 依 append 順序排列的 email
+            response: API 回應，updates.updatedRange 例如 "Sheet1!A12:F14"
+        """
+        updated_range = ((response or {}).get("updates") or {}).get("updatedRange")
+        if not updated_range:
+            return
+        start = updated_range.rsplit("!", 1)[-1].split(":")[0]
+        from gspread.utils import a1_to_rowcol
+
+        try:
+            first_row = a1_to_rowcol(start)[0]
+        except Exception:
+            return
+        self.record_many({email: first_row + i for i, email in enumerate(emails)})
+
+    def get(self, email: str) -> Optional[int]:
+        with self._lock:
+            return self._rows.get(email)
+
+    def _column_letter(self, name: str) -> Optional[str]:
+        with self._lock:
+            if name not in self._header:
+                return None
+            column = self._header.index(name) + 1
+        return rowcol_to_a1(1, column).rstrip("0123456789")
+
+    def ranges(self, row: int, values: Dict[str, str]) -> List[Dict]:
+        """把一列的欄位新值轉成 batch_update 的範圍 (相鄰欄位合併成一個範圍)"""
+        with self._lock:
+            columns = sorted(
+                (self._header.index(name) + 1, value)
+                for name, value in values.items()
+                if name in self._header
+            )
+        data: List[Dict] = []
+        run: List[Tuple[int, str]] = []
+        for column, value in columns + [(0, "")]:
+            if run and column != run[-1][0] + 1:
+                start = rowcol_to_a1(row, run[0][0])
+                end = rowcol_to_a1(row, run[-1][0])
+                data.append({"range": f"{start}:{end}", "values": [[v for _, v in run]]})
+                run = []
+            if column:
+                run.append((column, value))
+        return data
+
+    def resolve(self, emails: Iterable[str], call: Callable) -> Dict[str, int]:
+        """
+        找出每個 email 目前所在的列
+
+        Args:
+            emails: 要更新的 email
+            call: 以工作表執行函式的方法 (SheetSession.call)
+
+        Returns:
+            email -> 列號，工作表中找不到的 email 不在結果中
+        """
+        emails = list(dict.fromkeys(emails))
+        letter = self._column_letter("email")
+        if letter is None or not emails:
+            return {}
+
+        resolved: Dict[str, int] = {}
+        known = {email: self.get(email) for email in emails}
+        candidates = {email: row for email, row in known.items() if row}
+        if candidates:
+
+            def batch_get(worksheet):
+                return worksheet.batch_get([f"{letter}{row}" for row in candidates.values()])
+
+            found = call(batch_get) or []
+            for (email, row), value_range in zip(candidates.items(), found):
+                value = value_range[0][0] if value_range and value_range[0] else ""
+                if value == email:
+                    resolved[email] = row
+
+        missing = [email for email in emails if email not in resolved]
+        with self._lock:
+            self._stats["verified"] += len(resolved)
+            self._stats["conflicts"] += sum(1 for email in missing if known[email])
+        if not missing:
+            return resolved
+
+        # 列被移動、刪除或尚未記錄：讀一次 email 欄重建索引
+        def get_values(worksheet):
+            return worksheet.get_values(f"{letter}2:{letter}")
+
+        column = call(get_values) or []
+        rows = {values[0]: i + 2 for i, values in enumerate(column) if values and values[0]}
+        self.replace(rows)
+        with self._lock:
+            self._stats["relocations"] += 1
+        resolved.update({email: rows[email] for email in missing if email in rows})
+        return resolved
+
+    def get_stats(self) -> Dict:
+        """取得索引統計 (已知列數、確認成功、列號不符與重建次數)"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["rows"] = len(self._rows)
+            return stats
+
+
+_row_index = SheetRowIndex()
+
+
+def get_row_index() -> SheetRowIndex:
+    """取得全域共用的列號索引"""
+    return _row_index
@@ -0,0 +1,280 @@
+"""Google Sheets 連線管理 (所有 IT 工具共用同一個長駐連線)"""
+
+import os
+import threading
+import time
+from typing import TYPE_CHECKING, Callable, Dict, Optional
+
+import config.settings  # noqa: F401  載入 .env (SHEET_ID 等設定在呼叫時才讀取)
+from services import telemetry
+from tools.sheet_scheduler import PRIORITY_READ, RETRYABLE_STATUS, SheetScheduler, error_status
+
+# gspread (連帶 google-auth 與 requests) 在第一次連線時才匯入，不拖慢服務啟動
+if TYPE_CHECKING:
+    import gspread
+
+# 背景刷新 access token 的間隔（秒），Google 的 token 預設 1 小時過期
+TOKEN_REFRESH_INTERVAL = int(os.getenv("SHEET_TOKEN_REFRESH_INTERVAL", "2700"))
+
+
+def _get_credentials_path() -> str:
+    """取得 credentials.json 的絕對路徑"""
+    service_account_file = os.getenv("SERVICE_ACCOUNT_FILE")
+    if not service_account_file:
+        return ""
+
+    # 如果已經是絕對路徑，直接返回
+    if os.path.isabs(service_account_file):
+        return service_account_file
+
+    # 否則相對於專案根目錄（.env 所在的目錄，即 tools 的上層目錄）
+    current_file = os.path.abspath(__file__)  # 取得當前檔案的絕對路徑
+    project_root = os.path.dirname(os.path.dirname(current_file))  # tools 的上層
+    return os.path.join(project_root, service_account_file)
+
+
+class SheetSession:
+    """
+    長駐的 Google Sheet 連線
+
+    只在第一次使用時認證，之後重複使用快取的 client、試算表與工作表 handle，
+    並由背景執行緒定期刷新 access token。所有方法皆為執行緒安全。
+    每次 API 呼叫都經過 SheetScheduler 限速，配額不足或暫時性錯誤時退避重試。
+    """
+
+    def __init__(
+        self,
+        refresh_interval: int = TOKEN_REFRESH_INTERVAL,
+        scheduler: Optional[SheetScheduler] = None,
+    ):
+        self._lock = threading.RLock()
+        self.scheduler = scheduler or SheetScheduler()
+        self._refresh_interval = refresh_interval
+        self._client: Optional["gspread.Client"] = None
+        self._spreadsheet: Optional["gspread.Spreadsheet"] = None
+        self._worksheets: Dict[str, "gspread.Worksheet"] = {}
+        self._refresh_thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+        self._stats = {
+            "cache_hits": 0,
+            "cache_misses": 0,
+            "reconnects": 0,
+            "token_refreshes": 0,
+            "token_refresh_errors": 0,
+        }
+
+    def _connect(self) -> Optional["gspread.Spreadsheet"]:
+        """建立 client 並開啟試算表（呼叫端需持有鎖）"""
+        service_account_file = _get_credentials_path()
+        sheet_id = os.getenv("SHEET_ID")
+        sheet_name = os.getenv("SHEET_NAME")
+
+        if not service_account_file:
+            print("Warning: Google Sheet credentials not found in .env")
+            return None
+        if not sheet_id and not sheet_name:
+            print("Warning: Neither SHEET_ID nor SHEET_NAME found in .env")
+            return None
+
+        import gspread
+
+        self._client = gspread.service_account(filename=service_account_file)
+        if sheet_id:
+            self._spreadsheet = self._client.open_by_key(sheet_id)
+        else:
+            self._spreadsheet = self._client.open(sheet_name)
+        self._worksheets = {}
+        self._start_token_refresher()
+        return self._spreadsheet
+
+    def is_configured(self) -> bool:
+        """是否已在 .env 設定憑證與試算表"""
+        return bool(
+            _get_credentials_path() and (os.getenv("SHEET_ID") or os.getenv("SHEET_NAME"))
+        )
+
+    def get_worksheet(self, worksheet_name: Optional[str] = None) -> Optional["gspread.Worksheet"]:
+        """
+        取得工作表 handle（已快取則直接返回）
+
+        Args:
+            worksheet_name: 工作表名稱，未指定時使用 .env 的 WORKSHEET_NAME，再沒有則開第一個
+
+        Returns:
+            gspread.Worksheet，未設定憑證或試算表時返回 None
+        """
+        if worksheet_name is None:
+            worksheet_name = os.getenv("WORKSHEET_NAME") or ""
+
+        with self._lock:
+            worksheet = self._worksheets.get(worksheet_name)
+            if worksheet is not None:
+                self._stats["cache_hits"] += 1
+                return worksheet
+
+            self._stats["cache_misses"] += 1
+            spreadsheet = self._spreadsheet or self._connect()
+            if spreadsheet is None:
+                return None
+
+            # 嘗試開啟指定的工作表，如果沒指定則開第一個
+            if worksheet_name:
+                worksheet = spreadsheet.worksheet(worksheet_name)
+            else:
+                worksheet = spreadsheet.sheet1
+            self._worksheets[worksheet_name] = worksheet
+            return worksheet
+
+    def reset(self) -> None:
+        """丟棄快取的連線，下次使用時重新認證"""
+        with self._lock:
+            if self._client is not None:
+                self._stats["reconnects"] += 1
+            self._client = None
+            self._spreadsheet = None
+            self._worksheets = {}
+
+    def call(
+        self,
+        func: Callable[["gspread.Worksheet"], object],
+        worksheet_name: Optional[str] = None,
+        priority: str = PRIORITY_READ,
+        idempotent: bool = True,
+    ):
+        """
+        以快取的工作表執行 func (依配額排程)，失敗時重新連線再試一次
+
+        Args:
+            func: 接收 worksheet 的函式，例如 lambda ws: ws.get_all_records()
+            worksheet_name: 工作表名稱 (同 get_worksheet)
+            priority: PRIORITY_READ 或 PRIORITY_WRITE (背景寫入，讓讀取先走)
+            idempotent: 重送是否安全；False (例如 append_rows) 時只在 429 後重試
+
+        Returns:
+            func 的回傳值；未設定試算表時返回 None
+        """
+        if not self.is_configured():
+            # 不會呼叫 API，不必占用配額
+            return None
+        operation = getattr(func, "__name__", "call").lstrip("_")
+        started = time.perf_counter()
+        try:
+            with telemetry.span(f"sheet {operation}", operation=operation):
+                return self.scheduler.run(
+                    lambda: self._invoke(func, worksheet_name, idempotent), priority, operation, idempotent
+                )
+        except Exception:
+            telemetry.SHEET_ERRORS.inc(operation=operation)
+            raise
+        finally:
+            telemetry.SHEET_LATENCY.observe(time.perf_counter() - started, operation=operation)
+
+    def _invoke(
+        self,
+        func: Callable[["gspread.Worksheet"], object],
+        worksheet_name: Optional[str] = None,
+        idempotent: bool = True,
+    ):
+        worksheet = self.get_worksheet(worksheet_name)
+        if worksheet is None:
+            return None
+        import gspread
+        import requests
+
+        try:
+            return func(worksheet)
+        except (gspread.exceptions.APIError, requests.exceptions.ConnectionError) as e:
+            # 配額不足與伺服器錯誤交給排程退避重試，不需要重新連線
+            if error_status(e) in RETRYABLE_STATUS:
+                raise
+            # 連線中斷時請求可能已送達，非冪等的呼叫不重送
+            if not idempotent and isinstance(e, requests.exceptions.ConnectionError):
+                self.reset()
+                raise
+            # token 失效或連線中斷：重建連線後再試一次，仍失敗就交給呼叫端處理
+            print(f"Google Sheet call failed ({e}), reconnecting")
+            self.reset()
+            worksheet = self.get_worksheet(worksheet_name)
+            if worksheet is None:
+                return None
+            return func(worksheet)
+
+    def _credentials(self):
+        """取得 client 使用的 google-auth 憑證 (相容 gspread 5/6)"""
+        client = self._client
+        if client is None:
+            return None
+        http_client = getattr(client, "http_client", client)
+        return getattr(http_client, "auth", None)
+
+    def refresh_token(self) -> bool:
+        """立即刷新 access token"""
+        from google.auth.transport.requests import Request
+
+        with self._lock:
+            credentials = self._credentials()
+        if credentials is None:
+            return False
+
+        # 刷新時不持有鎖，避免阻塞其他執行緒取得快取的工作表
+        try:
+            credentials.refresh(Request())
+        except Exception as e:
+            with self._lock:
+                self._stats["token_refresh_errors"] += 1
+            print(f"Error refreshing Google Sheet token: {e}")
+            return False
+        with self._lock:
+            self._stats["token_refreshes"] += 1
+        return True
+
+    def _start_token_refresher(self) -> None:
+        if self._refresh_thread is not None and self._refresh_thread.is_alive():
+            return
+        if self._refresh_interval <= 0:
+            return
+        self._stop_event.clear()
+        self._refresh_thread = threading.Thread(
+            target=self._refresh_loop, name="sheet-token-refresher", daemon=True
+        )
+        self._refresh_thread.start()
+
+    def _refresh_loop(self) -> None:
+        while not self._stop_event.wait(self._refresh_interval):
+            self.refresh_token()
+
+    def close(self) -> None:
+        """停止背景刷新並丟棄連線"""
+        self._stop_event.set()
+        with self._lock:
+            self._client = None
+            self._spreadsheet = None
+            self._worksheets = {}
+
+    def get_stats(self) -> Dict:
+        """取得連線統計 (快取命中、重新連線、token 刷新次數) 與配額排程統計"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["connected"] = self._client is not None
+            stats["cached_worksheets"] = len(self._worksheets)
+        stats["scheduler"] = self.scheduler.get_stats()
+        return stats
+
+
+_session: Optional[SheetSession] = None
+_session_lock = threading.Lock()
+
+
+def get_sheet_session() -> SheetSession:
+    """取得全域共用的 SheetSession"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = SheetSession()
+    return _session
+
+
+def preload_client_library() -> None:
+    """預先載入模式在 fork worker 前匯入 gspread (不連線)，worker 不必各自匯入"""
+    import gspread  # noqa: F401
@@ -0,0 +1,241 @@
+"""Google Sheets API 的配額排程 (所有 gspread 呼叫都經過 SheetSession.call 進到這裡)
+
+- 權杖桶 (token bucket) 依 SHEET_QUOTA_PER_MINUTE 限速，允許 SHEET_QUOTA_BURST 次的突發
+- 讀取優先：有讀取在等待時，背景寫入 (寫入佇列的 flush) 先讓出權杖
+- 429 與 5xx 以指數退避加隨機抖動 (full jitter) 重試，有 Retry-After 時以它為下限；
+  收到 429 時所有呼叫一起暫停，並把速率減半，之後每次成功慢慢恢復
+- 非冪等的呼叫 (append_rows) 只在 429 時重試：5xx 與連線中斷時請求可能已經生效，
+  直接交給呼叫端確認，避免重複新增資料列
+- 等待中的呼叫數、等待時間、被限流與重試次數都記到 /metrics
+"""
+
+import random
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+from config.settings import settings
+from services import telemetry
+
+# 呼叫優先順序
+PRIORITY_READ = "read"
+PRIORITY_WRITE = "write"
+
+# 可以重試的 HTTP 狀態碼：配額不足與暫時性的伺服器錯誤
+QUOTA_STATUS = 429
+RETRYABLE_STATUS = (QUOTA_STATUS, 500, 502, 503, 504)
+
+# 收到 429 後速率的下限 (占設定速率的比例) 與每次成功恢復的比例
+MIN_RATE_RATIO = 0.1
+RECOVERY_RATIO = 0.05
+
+SHEET_QUEUE_DEPTH = telemetry.registry.gauge("sheet_api_waiting", "Sheets API calls waiting for quota")
+SHEET_WAIT = telemetry.registry.histogram("sheet_api_wait_seconds", "Time spent waiting for Sheets quota")
+SHEET_THROTTLED = telemetry.registry.counter("sheet_api_throttled_total", "Sheets API quota and server errors")
+SHEET_RETRIES = telemetry.registry.counter("sheet_api_retries_total", "Sheets API calls retried")
+
+
+def error_status(error: Exception) -> Optional[int]:
+    """取出 gspread APIError 的 HTTP 狀態碼，其他例外返回 None"""
+    # 只在出錯時才需要，此時 gspread 早已由 SheetSession 匯入
+    import gspread
+
+    if not isinstance(error, gspread.exceptions.APIError):
+        return None
+    status = getattr(error.response, "status_code", None)
+    return status if status is not None else getattr(error, "code", None)
+
+
+def is_retryable(error: Exception) -> bool:
+    """配額不足、暫時性伺服器錯誤或連線中斷"""
+    import requests
+
+    return error_status(error) in RETRYABLE_STATUS or isinstance(
+        error, requests.exceptions.ConnectionError
+    )
+
+
+def _retry_after(error: Exception) -> float:
+    """伺服器要求的等待秒數 (Retry-After 標頭)，沒有時返回 0"""
+    response = getattr(error, "response", None)
+    try:
+        return float(response.headers.get("Retry-After", 0))
+    except (AttributeError, TypeError, ValueError):
+        return 0.0
+
+
+class SheetScheduler:
+    """限速、排序與重試 Sheets API 呼叫 (執行緒安全)"""
+
+    def __init__(
+        self,
+        requests_per_minute: float = settings.SHEET_QUOTA_PER_MINUTE,
+        burst: int = settings.SHEET_QUOTA_BURST,
+        max_retries: int = settings.SHEET_MAX_RETRIES,
+        base_backoff: float = settings.SHEET_RETRY_BASE_SECONDS,
+        max_backoff: float = settings.SHEET_RETRY_MAX_SECONDS,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+        rng: Optional[random.Random] = None,
+    ):
+        # requests_per_minute <= 0 表示不限速 (仍會重試)
+        self._rate_limit = requests_per_minute / 60.0
+        self._rate = self._rate_limit
+        self._capacity = max(1, burst)
+        self._tokens = float(self._capacity)
+        self._max_retries = max_retries
+        self._base_backoff = base_backoff
+        self._max_backoff = max_backoff
+        self._clock = clock
+        self._sleep = sleep
+        self._rng = rng or random.Random()
+
+        self._cond = threading.Condition()
+        self._updated = clock()
+        self._paused_until = 0.0
+        self._waiting = {PRIORITY_READ: 0, PRIORITY_WRITE: 0}
+        self._stats = {
+            "calls": 0,
+            "throttled": 0,
+            "retries": 0,
+            "gave_up": 0,
+            "wait_seconds": 0.0,
+        }
+
+    # ---- 權杖桶 ----
+
+    def _refill(self, now: float) -> None:
+        """依經過時間補充權杖（呼叫端需持有鎖）"""
+        if self._rate > 0:
+            self._tokens = min(self._capacity, self._tokens + (now - self._updated) * self._rate)
+        self._updated = now
+
+    def _wait_time(self, now: float, priority: str) -> Optional[float]:
+        """
+        還要等多久才能取得權杖（呼叫端需持有鎖）
+
+        Returns:
+            0 表示現在就可以；None 表示等到其他呼叫通知
+        """
+        if now < self._paused_until:
+            return self._paused_until - now
+        if priority == PRIORITY_WRITE and self._waiting[PRIORITY_READ]:
+            # 讓讀取先走，讀取取得權杖後會通知
+            return None
+        if self._rate_limit <= 0 or self._tokens >= 1:
+            return 0.0
+        return (1 - self._tokens) / self._rate
+
+    def acquire(self, priority: str = PRIORITY_READ) -> float:
+        """等待並取得一個權杖，返回等待的秒數"""
+        started = self._clock()
+        with self._cond:
+            self._waiting[priority] += 1
+            SHEET_QUEUE_DEPTH.inc(priority=priority)
+            try:
+                while True:
+                    now = self._clock()
+                    self._refill(now)
+                    wait = self._wait_time(now, priority)
+                    if wait is not None and wait <= 0:
+                        if self._rate_limit > 0:
+                            self._tokens -= 1
+                        break
+                    self._cond.wait(wait)
+            finally:
+                self._waiting[priority] -= 1
+                SHEET_QUEUE_DEPTH.dec(priority=priority)
+                self._cond.notify_all()
+            waited = self._clock() - started
+            self._stats["wait_seconds"] += waited
+        SHEET_WAIT.observe(waited, priority=priority)
+        return waited
+
+    # ---- 限流與恢復 ----
+
+    def _throttle(self, delay: float) -> None:
+        """收到 429：所有呼叫暫停 delay 秒，速率減半"""
+        with self._cond:
+            self._paused_until = max(self._paused_until, self._clock() + delay)
+            self._tokens = 0.0
+            if self._rate_limit > 0:
+                self._rate = max(self._rate_limit * MIN_RATE_RATIO, self._rate / 2)
+
+    def _recover(self) -> None:
+        with self._cond:
+            if self._rate < self._rate_limit:
+                self._rate = min(self._rate_limit, self._rate + self._rate_limit * RECOVERY_RATIO)
+
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        """第 attempt 次重試前的等待秒數：上限內的隨機值 (full jitter)，不少於 Retry-After"""
+        ceiling = min(self._max_backoff, self._base_backoff * (2 ** attempt))
+        return max(_retry_after(error), self._rng.uniform(0, ceiling))
+
+    # ---- 執行 ----
+
+    def run(
+        self,
+        func: Callable[[], object],
+        priority: str = PRIORITY_READ,
+        operation: str = "call",
+        idempotent: bool = True,
+    ):
+        """
+        取得配額後執行 func，遇到可重試的錯誤時退避重試
+
+        Args:
+            func: 實際呼叫 Sheets API 的函式
+            priority: PRIORITY_READ (工具等待中的讀取) 或 PRIORITY_WRITE (背景寫入)
+            operation: 指標標籤
+            idempotent: False 時只重試 429 (請求未被執行)，其他錯誤直接拋出
+
+        Returns:
+            func 的回傳值；重試 SHEET_MAX_RETRIES 次仍失敗時拋出最後的例外
+        """
+        attempt = 0
+        while True:
+            self.acquire(priority)
+            with self._cond:
+                self._stats["calls"] += 1
+            try:
+                result = func()
+            except Exception as e:
+                if not is_retryable(e):
+                    raise
+                status = error_status(e)
+                reason = str(status) if status is not None else "connection"
+                SHEET_THROTTLED.inc(operation=operation, reason=reason)
+                if not idempotent and status != QUOTA_STATUS:
+                    with self._cond:
+                        self._stats["throttled"] += 1
+                        self._stats["gave_up"] += 1
+                    raise
+                delay = self._backoff(attempt, e)
+                with self._cond:
+                    self._stats["throttled"] += 1
+                    if attempt >= self._max_retries:
+                        self._stats["gave_up"] += 1
+                if status == QUOTA_STATUS:
+                    self._throttle(delay)
+                if attempt >= self._max_retries:
+                    raise
+                attempt += 1
+                with self._cond:
+                    self._stats["retries"] += 1
+                SHEET_RETRIES.inc(operation=operation)
+                print(f"Google Sheet {operation} failed ({e}), retry {attempt} in {delay:.1f}s")
+                # 429 已由 _throttle 讓 acquire 等待；其他錯誤在這裡等待
+                if status != QUOTA_STATUS:
+                    self._sleep(delay)
+                continue
+            self._recover()
+            return result
+
+    def get_stats(self) -> Dict:
+        """取得排程統計 (呼叫、限流、重試次數，目前速率與等待中的呼叫數)"""
+        with self._cond:
+            stats = dict(self._stats)
+            stats["rate_per_minute"] = round(self._rate * 60, 2)
+            stats["waiting"] = dict(self._waiting)
+            stats["paused_seconds"] = max(0.0, self._paused_until - self._clock())
+            return stats
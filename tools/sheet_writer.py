@@ -0,0 +1,518 @@
+"""Google Sheet 非同步寫入佇列 (write-behind)
+
+工具呼叫只把異動寫進本地 spool 檔與記憶體佇列就立即返回，
+背景執行緒再依批次大小或時間窗把多筆異動合併成一次 append_rows / batch_update。
+程式中途崩潰時，下次啟動會從 spool 檔重新送出尚未同步的異動。
+
+帳號欄位的就地更新 (enqueue_row_update) 在寫出時才以 email -> 列號索引找到目標列，
+先確認該列的 email 仍相符再寫入，列被移動時重新定位。
+
+append_rows 不是冪等的，排程不會在 5xx 或連線中斷後重送；這些資料列標記為結果不明，
+下次 flush 先讀 email 欄確認，已寫入的不再 append。
+"""
+
+import atexit
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows：只支援單一程序
+    fcntl = None
+
+from config.settings import settings
+from tools.roster_sync import SheetRowIndex, get_row_index
+from tools.sheet_client import SheetSession, get_sheet_session
+from tools.sheet_scheduler import PRIORITY_WRITE, error_status
+
+# 同步狀態
+STATUS_PENDING = "pending"
+STATUS_SYNCED = "synced"
+STATUS_NOT_CONFIGURED = "not_configured"
+STATUS_CONFLICT = "conflict"
+
+# 就地更新找不到目標列時，最多在幾次寫出中重試 (例如新增的列還在其他程序的佇列中)
+ROW_UPDATE_MAX_ATTEMPTS = 5
+
+# 連續失敗時的最長退避時間（秒）
+MAX_BACKOFF_SECONDS = 60.0
+
+
+class SheetWriteQueue:
+    """合併寫入 Google Sheet 的背景佇列（執行緒安全）"""
+
+    def __init__(
+        self,
+        spool_path: str = settings.SHEET_SPOOL_PATH,
+        batch_size: int = settings.SHEET_FLUSH_BATCH_SIZE,
+        flush_interval: float = settings.SHEET_FLUSH_INTERVAL,
+        session: Optional[SheetSession] = None,
+        row_index: Optional[SheetRowIndex] = None,
+    ):
+        self._spool_path = spool_path
+        self._rows = row_index or get_row_index()
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._session = session or get_sheet_session()
+
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._pending: List[Dict] = []
+        self._status: Dict[str, str] = {}
+        self._next_id = 1
+        self._failures = 0
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = False
+        self._paused = 0
+        self._stats = {
+            "enqueued": 0,
+            "flushed_ops": 0,
+            "api_calls": 0,
+            "flush_errors": 0,
+            "recovered_from_spool": 0,
+            "row_conflicts": 0,
+            "unconfirmed_appends": 0,
+        }
+        self.last_error: Optional[str] = None
+
+        self._load_spool()
+        self._spool = self._open_spool()
+        # 未設定 Sheet 時 spool 中的異動留到設定後再送出
+        if self._pending and self._session.is_configured():
+            self._ensure_started()
+
+    # ---- spool 檔 ----
+
+    def _load_spool(self) -> None:
+        """讀回上次未同步的異動"""
+        if not os.path.exists(self._spool_path):
+            return
+        with open(self._spool_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    op = json.loads(line)
+                except json.JSONDecodeError:
+                    # 崩潰時最後一行可能只寫了一半，直接略過
+                    continue
+                self._pending.append(op)
+                self._status[op["key"]] = STATUS_PENDING
+                self._next_id = max(self._next_id, op["id"] + 1)
+        self._stats["recovered_from_spool"] = len(self._pending)
+        if self._pending:
+            print(f"Recovered {len(self._pending)} unsynced sheet writes from spool")
+
+    def _open_spool(self):
+        directory = os.path.dirname(self._spool_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        return open(self._spool_path, "a", encoding="utf-8")
+
+    def _write_spool_line(self, op: Dict) -> None:
+        self._spool.write(json.dumps(op, ensure_ascii=False) + "\n")
+        self._spool.flush()
+        os.fsync(self._spool.fileno())
+
+    def _rewrite_spool(self) -> None:
+        """只保留尚未同步的異動（呼叫端需持有鎖）"""
+        self._spool.close()
+        tmp_path = self._spool_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for op in self._pending:
+                f.write(json.dumps(op, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self._spool_path)
+        self._spool = self._open_spool()
+
+    # ---- 排入異動 ----
+
+    def _enqueue(self, op: Dict) -> str:
+        if not self._session.is_configured():
+            return STATUS_NOT_CONFIGURED
+
+        with self._lock:
+            op["id"] = self._next_id
+            op["queued_at"] = time.time()
+            self._next_id += 1
+            self._write_spool_line(op)
+            self._pending.append(op)
+            self._status[op["key"]] = STATUS_PENDING
+            self._stats["enqueued"] += 1
+            if len(self._pending) >= self._batch_size:
+                self._wakeup.notify()
+        self._ensure_started()
+        return STATUS_PENDING
+
+    def enqueue_append(self, key: str, row: List) -> str:
+        """
+        排入一筆新增資料列
+
+        Args:
+            key: 資料列識別 (員工 email)
+            row: 依 Sheet 欄位順序排列的值
+
+        Returns:
+            同步狀態 ("pending" 或 "not_configured")
+        """
+        return self._enqueue({"op": "append", "key": key, "row": row})
+
+    def enqueue_update(self, key: str, cell_range: str, values: List[List]) -> str:
+        """
+        排入一筆儲存格範圍更新，同一範圍在同一批次內只保留最後一次的值
+
+        Args:
+            key: 資料列識別 (員工 email)
+            cell_range: A1 表示法範圍，例如 "C5:E5"
+            values: 二維陣列的新值
+
+        Returns:
+            同步狀態 ("pending" 或 "not_configured")
+        """
+        return self._enqueue(
+            {"op": "update", "key": key, "range": cell_range, "values": values}
+        )
+
+    def enqueue_row_update(self, key: str, values: Dict[str, str]) -> str:
+        """
+        排入一筆帳號欄位的就地更新 (寫出時依 email 找到目前所在的列)
+
+        Args:
+            key: 員工 email
+            values: Sheet 欄位名稱 -> 新值，例如 {"password": "...", "vpn": "enabled"}
+
+        Returns:
+            同步狀態 ("pending" 或 "not_configured")
+        """
+        return self._enqueue({"op": "update_row", "key": key, "values": values, "attempts": 0})
+
+    def enqueue_append_many(self, items: Iterable[Tuple[str, List]]) -> str:
+        """
+        一次排入多筆新增資料列 (只寫一次 spool 檔並 fsync 一次)
+
+        Args:
+            items: (資料列識別, 資料列) 的序列
+
+        Returns:
+            同步狀態 ("pending" 或 "not_configured")
+        """
+        if not self._session.is_configured():
+            return STATUS_NOT_CONFIGURED
+
+        with self._lock:
+            now = time.time()
+            ops = []
+            for key, row in items:
+                ops.append(
+                    {"op": "append", "key": key, "row": row, "id": self._next_id, "queued_at": now}
+                )
+                self._next_id += 1
+            if not ops:
+                return STATUS_PENDING
+            self._spool.write("".join(json.dumps(op, ensure_ascii=False) + "\n" for op in ops))
+            self._spool.flush()
+            os.fsync(self._spool.fileno())
+            self._pending.extend(ops)
+            for op in ops:
+                self._status[op["key"]] = STATUS_PENDING
+            self._stats["enqueued"] += len(ops)
+            if len(self._pending) >= self._batch_size:
+                self._wakeup.notify()
+        self._ensure_started()
+        return STATUS_PENDING
+
+    @contextmanager
+    def paused(self):
+        """
+        暫停背景寫出 (異動仍會寫入 spool 檔)，離開時一次寫出
+
+        大量匯入時使用，讓整批資料合併成一次 append_rows。
+        """
+        with self._lock:
+            self._paused += 1
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self._paused -= 1
+                self._wakeup.notify()
+            if not self._paused:
+                self.flush()
+
+    def get_status(self, key: str) -> Optional[str]:
+        """取得某筆資料的同步狀態，從未排入過則返回 None"""
+        with self._lock:
+            return self._status.get(key)
+
+    # ---- 寫出 ----
+
+    def flush(self) -> int:
+        """
+        立即把佇列中的異動寫入 Google Sheet
+
+        Returns:
+            成功同步的異動筆數
+        """
+        with self._flush_lock:
+            with self._lock:
+                batch = list(self._pending)
+            if not batch:
+                return 0
+
+            append_ops = [op for op in batch if op["op"] == "append"]
+            update_ops = [op for op in batch if op["op"] != "append"]
+
+            def append_rows(worksheet):
+                return worksheet.append_rows([op["row"] for op in append_ops], value_input_option="RAW")
+
+            # 新增與更新分成兩次呼叫，排程重試更新時不會重複新增資料列
+            done: List[Dict] = []
+            dropped: List[Dict] = []
+            calls = 0
+            try:
+                self._rows.ensure_header(lambda func: self._session.call(func, priority=PRIORITY_WRITE))
+                if any(op.get("unconfirmed") for op in append_ops):
+                    written, append_ops, check_calls = self._confirm_appends(append_ops)
+                    done.extend(written)
+                    calls += check_calls
+                if append_ops:
+                    try:
+                        response = self._session.call(append_rows, priority=PRIORITY_WRITE, idempotent=False)
+                    except Exception as e:
+                        if error_status(e) is None or error_status(e) >= 500:
+                            self._mark_unconfirmed(append_ops)
+                        raise
+                    if response is None:
+                        return 0
+                    self._rows.record_append([op["key"] for op in append_ops], response)
+                    done.extend(append_ops)
+                    calls += 1
+                if update_ops:
+                    applied, dropped, update_calls = self._write_updates(update_ops)
+                    if applied is None:
+                        return len(done)
+                    done.extend(applied)
+                    done.extend(dropped)
+                    calls += update_calls
+            except Exception as e:
+                self._complete(done, calls, dropped)
+                with self._lock:
+                    self._failures += 1
+                    self._stats["flush_errors"] += 1
+                    self.last_error = str(e)
+                print(f"Error flushing writes to Google Sheet: {e}")
+                return len(done)
+            if not done:
+                return 0
+
+            self._complete(done, calls, dropped)
+            with self._lock:
+                self._failures = 0
+                self.last_error = None
+            print(f"Synced {len(done)} queued writes to Google Sheet in {calls} API call(s)")
+            return len(done)
+
+    def _mark_unconfirmed(self, ops: List[Dict]) -> None:
+        """append_rows 回 5xx 或連線中斷：資料列可能已寫入，下次 flush 前先確認"""
+        with self._lock:
+            for op in ops:
+                op["unconfirmed"] = True
+            self._stats["unconfirmed_appends"] += len(ops)
+            self._rewrite_spool()
+
+    def _confirm_appends(self, ops: List[Dict]) -> Tuple[List[Dict], List[Dict], int]:
+        """
+        查詢上次結果不明的 append 是否已寫入 Sheet (讀一次 email 欄)
+
+        Returns:
+            (已在 Sheet 中的異動, 仍需 append 的異動, API 呼叫數)
+        """
+        session_calls = []
+
+        def call(func):
+            session_calls.append(func)
+            return self._session.call(func, priority=PRIORITY_WRITE)
+
+        keys = [op["key"] for op in ops if op.get("unconfirmed")]
+        rows = self._rows.resolve(keys, call)
+        written = [op for op in ops if op.get("unconfirmed") and op["key"] in rows]
+        remaining = [op for op in ops if op not in written]
+        for op in remaining:
+            op.pop("unconfirmed", None)
+        return written, remaining, len(session_calls)
+
+    def _write_updates(self, ops: List[Dict]) -> Tuple[Optional[List[Dict]], List[Dict], int]:
+        """
+        以一次 batch_update 寫出範圍更新與帳號欄位的就地更新
+
+        Returns:
+            (已寫出的異動, 放棄的異動, API 呼叫數)；未設定 Sheet 時已寫出的異動為 None
+        """
+        calls = 0
+        updates: Dict[str, List[List]] = {}
+        row_values: Dict[str, Dict[str, str]] = {}
+        for op in ops:
+            if op["op"] == "update":
+                updates[op["range"]] = op["values"]
+            else:
+                row_values.setdefault(op["key"], {}).update(op["values"])
+
+        applied = [op for op in ops if op["op"] == "update"]
+        dropped: List[Dict] = []
+        if row_values:
+            session_calls = []
+
+            def call(func):
+                session_calls.append(func)
+                return self._session.call(func, priority=PRIORITY_WRITE)
+
+            rows = self._rows.resolve(row_values, call)
+            calls += len(session_calls)
+            for email, values in row_values.items():
+                if email in rows:
+                    for item in self._rows.ranges(rows[email], values):
+                        updates[item["range"]] = item["values"]
+            for op in ops:
+                if op["op"] != "update_row":
+                    continue
+                if op["key"] in rows:
+                    applied.append(op)
+                    continue
+                # 找不到目標列：留在佇列下次再試，超過次數就放棄並記為衝突
+                op["attempts"] = op.get("attempts", 0) + 1
+                if op["attempts"] >= ROW_UPDATE_MAX_ATTEMPTS:
+                    dropped.append(op)
+                    print(f"Giving up sheet update for {op['key']}: row not found")
+            with self._lock:
+                self._stats["row_conflicts"] += len(row_values) - len(rows)
+
+        if updates:
+
+            def batch_update(worksheet):
+                return worksheet.batch_update([{"range": r, "values": v} for r, v in updates.items()])
+
+            if self._session.call(batch_update, priority=PRIORITY_WRITE) is None:
+                return None, [], calls
+            calls += 1
+        return applied, dropped, calls
+
+    def _complete(self, done: List[Dict], calls: int, dropped: Iterable[Dict] = ()) -> None:
+        """把已寫入 (或放棄) 的異動移出佇列並改寫 spool 檔"""
+        if not done:
+            return
+        flushed_ids = {op["id"] for op in done}
+        dropped_ids = {op["id"] for op in dropped}
+        with self._lock:
+            self._pending = [op for op in self._pending if op["id"] not in flushed_ids]
+            still_pending = {op["key"] for op in self._pending}
+            for op in done:
+                if op["key"] not in still_pending:
+                    self._status[op["key"]] = (
+                        STATUS_CONFLICT if op["id"] in dropped_ids else STATUS_SYNCED
+                    )
+            self._rewrite_spool()
+            self._stats["flushed_ops"] += len(done)
+            self._stats["api_calls"] += calls
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None or self._stopped:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(
+                target=self._run, name="sheet-write-behind", daemon=True
+            )
+            self._thread.start()
+
+    def _run(self) -> None:
+        stalled = False
+        while True:
+            with self._lock:
+                # 時間窗到期或累積到批次大小就寫出；連續失敗時指數退避，
+                # 上次沒寫出任何異動 (例如未設定 Sheet) 時也等滿時間窗，避免空轉
+                timeout = min(
+                    self._flush_interval * (2 ** self._failures), MAX_BACKOFF_SECONDS
+                )
+                if (
+                    len(self._pending) < self._batch_size
+                    or self._failures
+                    or self._paused
+                    or stalled
+                ):
+                    self._wakeup.wait(timeout)
+                if self._stopped:
+                    return
+                has_pending = bool(self._pending) and not self._paused
+            stalled = has_pending and self.flush() == 0
+
+    def stop(self, flush: bool = True) -> None:
+        """停止背景執行緒，預設先把剩餘的異動寫出 (已停止時不做事)"""
+        with self._lock:
+            if self._stopped:
+                return
+            self._stopped = True
+            self._wakeup.notify()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        if flush:
+            self.flush()
+
+    def get_stats(self) -> Dict:
+        """取得佇列統計 (待同步筆數、API 呼叫次數、錯誤次數)"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["pending"] = len(self._pending)
+            stats["oldest_pending_age"] = (
+                time.time() - self._pending[0]["queued_at"] if self._pending else 0.0
+            )
+            stats["last_error"] = self.last_error
+            return stats
+
+
+_queue: Optional[SheetWriteQueue] = None
+_queue_lock = threading.Lock()
+# 本程序持有的 spool 檔鎖 (程序結束時由作業系統釋放)
+_spool_lock_file = None
+
+
+def claim_spool_path(base_path: str = settings.SHEET_SPOOL_PATH, max_slots: int = 64) -> str:
+    """
+    為本程序取得專用的 spool 檔
+
+    多個 worker 程序共用同一份設定時，各自以檔案鎖占用一個編號：第一個程序使用
+    base_path，其餘使用 base_path.1、base_path.2…；worker 重啟後接手同一個編號，
+    會把前一個程序未送出的異動重新送出。
+    """
+    global _spool_lock_file
+    if fcntl is None:
+        return base_path
+    directory = os.path.dirname(base_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    for slot in range(max_slots):
+        path = base_path if slot == 0 else f"{base_path}.{slot}"
+        lock_file = open(path + ".lock", "a")
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            continue
+        _spool_lock_file = lock_file
+        return path
+    raise RuntimeError(f"No free sheet spool slot for {base_path}")
+
+
+def get_write_queue() -> SheetWriteQueue:
+    """取得全域共用的寫入佇列 (程式結束前會自動寫出剩餘異動)"""
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                _queue = SheetWriteQueue(spool_path=claim_spool_path())
+                atexit.register(_queue.stop)
+    return _queue